@@ -0,0 +1,121 @@
+"""
+Per-request server overhead: lean HTTP API (SSE) vs. the Gradio path.
+
+Both servers run locally with a fake Pixelizer that yields four pre-encoded
+full-size frames instantly, so the measured time is pure server/transport
+overhead (upload, validation, resize, frame delivery).
+
+    python -m benchmarks.bench_api_overhead [requests]
+"""
+
+import io
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+import numpy as np
+import uvicorn
+from PIL import Image
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _frames():
+    rng = np.random.default_rng(0)
+    frames = []
+    for _ in range(4):
+        arr = np.full((1536, 1024, 3), 211, dtype=np.uint8)
+        arr[300:1200, 300:700] = rng.integers(0, 256, (900, 400, 3), dtype=np.uint8)
+        buf = io.BytesIO()
+        Image.fromarray(arr).save(buf, format="PNG", compress_level=1)
+        frames.append(buf.getvalue())
+    return frames
+
+
+class FakePixelizer:
+    def __init__(self, frames):
+        self.frames = frames
+
+    def pixelize(self, target, output_path=None, **kwargs):
+        yield from self.frames
+
+
+def _photo():
+    buf = io.BytesIO()
+    Image.new("RGB", (1200, 1600), (120, 90, 60)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def _summary(name, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(
+        f"{name:8s} median {statistics.median(samples) * 1000:7.1f} ms   "
+        f"p95 {p95 * 1000:7.1f} ms"
+    )
+
+
+def bench_api(photo, frames, n):
+    import pixelizer_api
+
+    pixelizer_api.pixelizer = FakePixelizer(frames)
+    port = _free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(pixelizer_api.app, port=port, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    samples = []
+    with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+        for _ in range(n):
+            start = time.perf_counter()
+            resp = client.post("/pixelize", files={"image": ("in.jpg", photo)})
+            assert resp.text.count("event: frame") == len(frames)
+            samples.append(time.perf_counter() - start)
+    server.should_exit = True
+    return samples
+
+
+def bench_gradio(photo, frames, n):
+    from gradio_client import Client, handle_file
+
+    import pixelizer_ci
+
+    pixelizer_ci.pixelizer = FakePixelizer(frames)
+    port = _free_port()
+    pixelizer_ci.pixelator.launch(
+        server_port=port, prevent_thread_lock=True, quiet=True
+    )
+    client = Client(f"http://127.0.0.1:{port}/", verbose=False)
+    with tempfile.NamedTemporaryFile(suffix=".jpg") as f:
+        f.write(photo)
+        f.flush()
+        samples = []
+        for _ in range(n):
+            start = time.perf_counter()
+            job = client.submit(handle_file(f.name), api_name="/process_image")
+            job.result()
+            assert len(job.outputs()) == len(frames)
+            samples.append(time.perf_counter() - start)
+    pixelizer_ci.pixelator.close()
+    return samples
+
+
+def main(n=20):
+    photo, frames = _photo(), _frames()
+    _summary("api/sse", bench_api(photo, frames, n))
+    _summary("gradio", bench_gradio(photo, frames, n))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,162 @@
+"""
+Balancing over several Azure deployments, against local stub servers with
+different latencies (scaled down: 1 s here ~ 1 min of real generation).
+
+Each stub generates at most CAPACITY images at once and queues the rest,
+like a deployment at its quota. Compares single-deployment routing, plain
+round robin and the weighted least-outstanding-requests pool; one extra
+stub answers 429 to everything.
+
+    python -m benchmarks.bench_deployment_pool [requests] [concurrency]
+"""
+
+import base64
+import contextlib
+import io
+import itertools
+import json
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from PIL import Image
+
+from gpt_model.pixelizer_model import Pixelizer
+from util.deployment_pool import Deployment
+
+# (Name, Latenz in s, Kontingent erschöpft)
+STUBS = (("schnell", 0.2, False), ("mittel", 0.4, False), ("langsam", 0.8, False))
+THROTTLED = ("leer", 0.0, True)
+CAPACITY = 2
+
+
+def _png(color, size=(8, 8)):
+    buf = io.BytesIO()
+    Image.new("RGBA", size, color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _stub(latency_s, throttle):
+    event = {
+        "type": "image_edit.completed",
+        "b64_json": base64.b64encode(_png((0, 0, 255, 255))).decode(),
+        "created_at": 1,
+    }
+    ok = f"event: image_edit.completed\ndata: {json.dumps(event)}\n\n".encode()
+    slots = threading.Semaphore(CAPACITY)
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            if throttle:
+                body = b'{"error": {"message": "quota", "code": "429"}}'
+                self.send_response(429)
+                self.send_header("Retry-After", "60")
+            else:
+                with slots:
+                    time.sleep(latency_s)
+                body = ok
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class RoundRobin:
+    """Baseline: deployments strictly in turn, no load, latency or 429 feedback."""
+
+    def __init__(self, backends):
+        self._turns = itertools.cycle(backends)
+        self._lock = threading.Lock()
+
+    def pixelize(self, target_image):
+        with self._lock:
+            backend = next(self._turns)
+        return backend.pixelize(target_image)
+
+
+def _run(px, requests, concurrency):
+    target = _png((255, 0, 0, 255), (64, 96))
+    latencies = []
+
+    def one(_):
+        start = time.perf_counter()
+        try:
+            list(px.pixelize(io.BytesIO(target)))
+        except Exception:
+            return False
+        latencies.append(time.perf_counter() - start)
+        return True
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        ok = sum(executor.map(one, range(requests)))
+    wall = time.perf_counter() - start
+    return ok, wall, latencies
+
+
+def main(requests=120, concurrency=8):
+    servers = [_stub(latency, throttle) for _, latency, throttle in STUBS]
+    servers.append(_stub(*THROTTLED[1:]))
+    names = [name for name, _, _ in STUBS] + [THROTTLED[0]]
+    deployments = [
+        Deployment(f"http://127.0.0.1:{s.server_port}", "key", "gpt-image-1", name=n)
+        for s, n in zip(servers, names)
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(2):
+            Image.new("RGBA", (40, 60), (40 * i, 80, 120, 255)).save(
+                Path(tmp) / f"ref{i + 1}.png"
+            )
+
+        def backend(entries):
+            return Pixelizer(ref_dir=tmp, ref_count=2, deployments=entries)
+
+        # Erst beim Lauf anlegen: die Auslastung zählt ab Erzeugung des Pools
+        setups = {
+            "einzeln": lambda: backend(deployments[:1]),
+            "round robin": lambda: RoundRobin([backend([d]) for d in deployments]),
+            "pool": lambda: backend(deployments),
+        }
+
+        print(f"{requests} requests, {concurrency} concurrent")
+        for label, setup in setups.items():
+            px = setup()
+            # Die Event-Ausgaben des Pixelizers unterdrücken
+            with contextlib.redirect_stdout(io.StringIO()):
+                ok, wall, latencies = _run(px, requests, concurrency)
+            p95 = statistics.quantiles(latencies, n=20)[-1] if latencies else 0
+            print(
+                f"{label:12s} {ok:4d} ok  {ok / wall:5.1f} req/s  "
+                f"mean {statistics.mean(latencies or [0]):5.2f} s  p95 {p95:5.2f} s"
+            )
+            if label == "pool":
+                for s in px.stats()["deployments"]:
+                    print(
+                        f"    {s['name']:8s} {s['completed']:4d} done  "
+                        f"latency {s['latency_s']:5.2f} s  "
+                        f"utilization {s['utilization']:5.1%}  "
+                        f"throttled {s['throttled']}"
+                    )
+    for server in servers:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 120,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 8,
+    )
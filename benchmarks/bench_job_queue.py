@@ -0,0 +1,57 @@
+"""
+Submit / claim+complete throughput of the SQLite job queue.
+
+    python -m benchmarks.bench_job_queue [jobs] [worker_processes]
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from util.job_queue import JobQueue
+
+TARGET_BYTES = 300 * 1024  # vorverarbeitetes Ziel (400x765 PNG)
+FRAME_BYTES = 1500 * 1024  # finaler Frame
+
+
+def _drain(db_path, frame):
+    queue = JobQueue(db_path)
+    worker_id = f"bench-{os.getpid()}"
+    done = 0
+    while (job := queue.claim(worker_id)) is not None:
+        queue.add_frame(job.id, worker_id, frame)
+        queue.complete(job.id, worker_id)
+        done += 1
+    return done
+
+
+def main(jobs=500, processes=4):
+    target = os.urandom(TARGET_BYTES)
+    frame = os.urandom(FRAME_BYTES)
+    with tempfile.TemporaryDirectory() as tmp:
+        for procs in sorted({1, processes}):
+            db_path = os.path.join(tmp, f"bench-{procs}.sqlite3")
+            queue = JobQueue(db_path)
+
+            start = time.perf_counter()
+            for _ in range(jobs):
+                queue.submit(target, {"quality": "medium"})
+            submit_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            with multiprocessing.Pool(procs) as pool:
+                done = sum(pool.starmap(_drain, [(db_path, frame)] * procs))
+            complete_s = time.perf_counter() - start
+            assert done == jobs
+
+            print(
+                f"{procs} worker process(es): submit {jobs / submit_s:7.0f} jobs/s, "
+                f"claim+frame+complete {jobs / complete_s:7.0f} jobs/s"
+            )
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*args)
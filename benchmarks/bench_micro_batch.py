@@ -0,0 +1,133 @@
+"""
+Micro-batching of the FLUX backend against a local images/edits stub.
+
+The stub models a non-streaming deployment dominated by fixed per-call
+overhead: every call costs CALL_OVERHEAD_S plus PER_PERSON_S per character,
+and at most CAPACITY calls run at once. Requests arrive as a Poisson process.
+
+    python -m benchmarks.bench_micro_batch [requests] [rate_per_s]
+"""
+
+import base64
+import io
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+from openai import OpenAI
+from PIL import Image
+
+from gpt_model.pixelizer_model_flux import Pixelizer
+
+CALL_OVERHEAD_S = 0.8
+PER_PERSON_S = 0.1
+CAPACITY = 2
+SETUPS = (("ohne Batching", 1, 0.0), ("3 / 250 ms", 3, 0.25), ("3 / 500 ms", 3, 0.5))
+
+
+def _row(count, panel=256, height=448):
+    img = Image.new("RGB", (panel * count, height), (211, 211, 211))
+    for i in range(count):
+        img.paste(Image.new("RGB", (96, 192), (60 * i, 200, 90)), (i * panel + 80, 128))
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _stub():
+    calls = []
+    slots = threading.Semaphore(CAPACITY)
+    rows = {n: base64.b64encode(_row(n)).decode() for n in range(1, 9)}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            match = re.search(rb"shows (\d+) real people", body)
+            count = int(match.group(1)) if match else 1
+            calls.append(count)
+            with slots:
+                time.sleep(CALL_OVERHEAD_S + PER_PERSON_S * count)
+            data = json.dumps({"created": 1, "data": [{"b64_json": rows[count]}]})
+            data = data.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, calls
+
+
+def _target():
+    buf = io.BytesIO()
+    Image.new("RGBA", (300, 500), (255, 0, 0, 255)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _run(px, requests, rate, seed=0):
+    gaps = np.random.default_rng(seed).exponential(1 / rate, size=requests)
+    target = _target()
+    latencies = []
+
+    def one():
+        start = time.perf_counter()
+        px.pixelize(io.BytesIO(target))
+        latencies.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(requests) as executor:
+        for gap in gaps:
+            time.sleep(gap)
+            executor.submit(one)
+    return latencies
+
+
+def main(requests=60, rate=4.0):
+    # Der Konstruktor legt einen Azure-Client an; ersetzt durch den Stub-Client
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    server, calls = _stub()
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+    print(
+        f"{requests} requests at {rate:.1f}/s; stub: {CALL_OVERHEAD_S:.1f} s/call "
+        f"+ {PER_PERSON_S:.1f} s/person, {CAPACITY} calls at once"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(4):
+            Image.new("RGBA", (200, 380), (40 * i, 80, 120, 255)).save(
+                Path(tmp) / f"ref{i + 1}.png"
+            )
+        for label, batch_size, window_s in SETUPS:
+            px = Pixelizer(ref_dir=tmp, batch_size=batch_size, batch_window_s=window_s)
+            px.client = OpenAI(api_key="stub", base_url=base_url)
+            calls.clear()
+            latencies = _run(px, requests, rate)
+            wait = px.batcher.stats()["mean_wait_s"] if px.batcher else 0.0
+            print(
+                f"{label:14s} {len(calls):3d} calls  "
+                f"mean {statistics.mean(latencies):5.2f} s  "
+                f"p95 {statistics.quantiles(latencies, n=20)[-1]:5.2f} s  "
+                f"batch wait {wait * 1000:4.0f} ms"
+            )
+            if px.batcher:
+                px.batcher.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 60,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 4.0,
+    )
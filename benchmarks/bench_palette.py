@@ -0,0 +1,81 @@
+"""
+Palette quantizer: extraction from the reference set, lookup-table build and
+mapping of full-size (1024x1536) outputs, against a brute-force nearest-colour
+search and PIL's Image.quantize.
+
+    python -m benchmarks.bench_palette [runs]
+"""
+
+import io
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.bench_sprite_export import synthetic_output
+from util.palette import Palette, denoise, extract_palette
+
+REF_DIR = Path("input")
+
+
+def _timed(fn, runs):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(runs):
+        result = fn()
+    return (time.perf_counter() - start) / runs, result
+
+
+def _brute_force(rgb, colors):
+    """Nearest palette colour per pixel via full (N, K) distance matrix."""
+    flat = rgb.reshape(-1, 3).astype(np.float32)
+    c = colors.astype(np.float32)
+    d = (flat * flat).sum(1)[:, None] - 2 * flat @ c.T + (c * c).sum(1)[None, :]
+    return d.argmin(axis=1).astype(np.uint8).reshape(rgb.shape[:2])
+
+
+def main(runs=10):
+    refs = [Image.open(path) for path in sorted(REF_DIR.glob("ref*.png"))]
+    for ref in refs:
+        ref.load()
+    image = Image.open(io.BytesIO(synthetic_output()))
+    image.load()
+    rgb = np.asarray(image.convert("RGB"))
+    megapixels = image.width * image.height / 1e6
+
+    extract_t, colors = _timed(lambda: extract_palette(refs, n_colors=32), 3)
+    lut_t, palette = _timed(lambda: Palette(colors), 3)
+    print(f"palette:       {len(colors)} colours from {len(refs)} references")
+    print(f"k-means:       {extract_t * 1000:7.1f} ms (once per style)")
+    print(f"LUT build:     {lut_t * 1000:7.1f} ms, {palette.nbytes / 2**20:.0f} MiB")
+
+    lut_map_t, lut_idx = _timed(lambda: palette.indices(image), runs)
+    brute_t, brute_idx = _timed(lambda: _brute_force(rgb, colors), max(1, runs // 5))
+    pil_palette = Image.new("P", (1, 1))
+    pil_palette.putpalette(colors.tobytes())
+    pil_t, _ = _timed(
+        lambda: image.convert("RGB").quantize(palette=pil_palette, dither=0), runs
+    )
+    for name, t in (
+        ("LUT mapping", lut_map_t),
+        ("brute force", brute_t),
+        ("PIL quantize", pil_t),
+    ):
+        print(f"{name + ':':<15}{t * 1000:7.1f} ms/frame ({megapixels / t:6.1f} MP/s)")
+    print(f"LUT == exact:  {(lut_idx == brute_idx).mean() * 100:7.2f} % of pixels")
+
+    quantize_t, _ = _timed(lambda: palette.quantize_png_bytes(image), runs)
+    print(f"quantize+PNG:  {quantize_t * 1000:7.1f} ms/frame")
+
+    target = Image.open(REF_DIR / "target.jpg")
+    target.thumbnail((400, 765))
+    denoise_t, _ = _timed(lambda: denoise(target), runs)
+    print(
+        f"denoise:       {denoise_t * 1000:7.1f} ms/target ({target.size[0]}x{target.size[1]})"
+    )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
@@ -0,0 +1,100 @@
+"""
+Bulk atlas export of full-size (1024x1536) results.
+
+    python -m benchmarks.bench_sprite_atlas [count] [processes]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.bench_sprite_export import synthetic_output
+from util.palette import Palette
+from util.sprite_atlas import build_atlases, export_atlases, load_sprites
+
+
+def _write_inputs(directory, count, distinct=8):
+    # Wenige verschiedene Bilder, kopiert: Dekodieren kostet gleich viel
+    originals = []
+    for seed in range(distinct):
+        path = directory / f"pixelized_{seed:04d}.png"
+        path.write_bytes(synthetic_output(seed=seed))
+        originals.append(path)
+    for i in range(distinct, count):
+        shutil.copyfile(originals[i % distinct], directory / f"pixelized_{i:04d}.png")
+    return sorted(directory.glob("*.png"))
+
+
+def main(count=300, processes=None):
+    processes = processes or os.cpu_count()
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp) / "output"
+        src.mkdir()
+        paths = _write_inputs(src, count)
+
+        sample = paths[: max(8, count // 10)]
+        start = time.perf_counter()
+        for path in sample:
+            with Image.open(path) as image:
+                image.load()
+        decode = (time.perf_counter() - start) / len(sample)
+
+        start = time.perf_counter()
+        load_sprites(sample, processes=1)
+        serial = (time.perf_counter() - start) / len(sample)
+
+        start = time.perf_counter()
+        loaded, _, _ = load_sprites(paths, processes=processes)
+        pooled = time.perf_counter() - start
+
+        samples = np.concatenate([sample for _, _, _, sample in loaded])
+        start = time.perf_counter()
+        palette = Palette.from_images(
+            [Image.fromarray(samples[None], "RGB")], n_colors=255
+        )
+        palette_s = time.perf_counter() - start
+        sprites = [(path, sprite) for path, _, sprite, _ in loaded]
+        render = {}
+        for n in sorted({1, processes}):
+            start = time.perf_counter()
+            build_atlases(sprites, palette=palette, processes=n)
+            render[n] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index = export_atlases(paths, Path(tmp) / "atlas", processes=processes)
+        total = time.perf_counter() - start
+
+        atlas_bytes = sum(
+            (Path(tmp) / "atlas" / a["file"]).stat().st_size for a in index["atlases"]
+        )
+        sprite_px = sum(s.width * s.height for _, _, s, _ in loaded)
+        atlas_px = sum(a["width"] * a["height"] for a in index["atlases"])
+
+    print(f"inputs:        {count} x 1024x1536, {processes} processes")
+    print(f"decode only:   {decode * 1000:7.1f} ms/file  (PNG inflate)")
+    print(f"crop serial:   {serial * 1000:7.1f} ms/file")
+    print(
+        f"crop pool:     {pooled / count * 1000:7.1f} ms/file  "
+        f"({pooled:5.2f} s total, {serial * count / pooled:4.1f}x)"
+    )
+    print(
+        f"export total:  {total:7.2f} s  "
+        f"({len(index['atlases'])} atlases, {sprite_px / atlas_px:5.1%} filled, "
+        f"{atlas_bytes / 1024**2:5.1f} MiB)"
+    )
+    print(f"palette:       {palette_s:7.2f} s  (k-means + lookup table, serial)")
+    for n, t in render.items():
+        print(f"render x{n:<3}    {t:7.2f} s  (compose, index, encode)")
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 300,
+        int(sys.argv[2]) if len(sys.argv) > 2 else None,
+    )
@@ -0,0 +1,63 @@
+"""
+Throughput of the background keying on full-size (1024x1536) outputs.
+
+    python -m benchmarks.bench_sprite_export [runs]
+"""
+
+import io
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from util.sprite_export import extract_sprite
+
+
+def synthetic_output(width=1024, height=1536, seed=0):
+    """Grey background with slight drift/noise and a blocky 40x80-pixel figure."""
+    rng = np.random.default_rng(seed)
+    img = np.full((height, width, 3), (209, 212, 210), dtype=np.int16)
+    img += rng.integers(-4, 5, size=img.shape, dtype=np.int16)
+    block = 12
+    top, left = (height - 80 * block) // 2, (width - 40 * block) // 2
+    colors = rng.integers(0, 256, size=(80, 40, 3))
+    figure = np.repeat(np.repeat(colors, block, axis=0), block, axis=1)
+    img[top : top + 80 * block, left : left + 40 * block] = figure
+    buf = io.BytesIO()
+    Image.fromarray(img.clip(0, 255).astype(np.uint8), "RGB").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _encode(img):
+    buf = io.BytesIO()
+    start = time.perf_counter()
+    img.save(buf, format="PNG")
+    return len(buf.getvalue()), time.perf_counter() - start
+
+
+def main(runs=20):
+    data = synthetic_output()
+    image = Image.open(io.BytesIO(data))
+    image.load()
+
+    extract_sprite(image)  # warm-up
+    start = time.perf_counter()
+    for _ in range(runs):
+        sprite = extract_sprite(image)
+    per_frame = (time.perf_counter() - start) / runs
+
+    megapixels = image.width * image.height / 1e6
+    full_size, full_t = _encode(image.convert("RGBA"))
+    sprite_size, sprite_t = _encode(sprite)
+    print(
+        f"keying:        {per_frame * 1000:7.1f} ms/frame  "
+        f"({megapixels / per_frame:5.1f} MP/s, {1 / per_frame:5.1f} frames/s)"
+    )
+    print(f"sprite size:   {sprite.size[0]}x{sprite.size[1]}")
+    print(f"PNG full:      {full_size / 1024:7.0f} KiB in {full_t * 1000:6.1f} ms")
+    print(f"PNG sprite:    {sprite_size / 1024:7.0f} KiB in {sprite_t * 1000:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,73 @@
+"""
+Export generated characters as sprite-sheet atlases.
+
+Crops every result image to its figure, packs the sprites into atlases and
+writes indexed-colour PNGs plus a JSON and a CSV coordinate index.
+
+By default only the characters themselves are exported: the keyed copies
+written with EXPORT_SPRITES=1 and the group lineups in the same output
+store are left out (``--kinds character,sprite,lineup`` takes everything,
+``--kinds sprite`` e.g. a folder of already keyed sprites).
+
+    python export_atlas.py output --out atlas --max-size 4096 --colors 255
+"""
+
+import argparse
+import logging
+import time
+from pathlib import Path
+
+from util.sprite_atlas import MAX_ATLAS_SIZE, export_atlases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("inputs", nargs="+", help="PNG files or directories")
+    parser.add_argument("--out", default="atlas")
+    parser.add_argument("--prefix", default="atlas")
+    parser.add_argument("--max-size", type=int, default=MAX_ATLAS_SIZE)
+    parser.add_argument("--padding", type=int, default=2)
+    parser.add_argument(
+        "--colors", type=int, default=255, help="palette size, 0 = RGBA atlases"
+    )
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument(
+        "--kinds",
+        default="character",
+        help="comma-separated entry kinds: character, sprite, lineup",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    paths = []
+    for entry in map(Path, args.inputs):
+        paths.extend(sorted(entry.rglob("*.png")) if entry.is_dir() else [entry])
+    root = Path(args.inputs[0]) if len(args.inputs) == 1 else None
+    root = root if root is not None and root.is_dir() else None
+
+    start = time.perf_counter()
+    index = export_atlases(
+        paths,
+        args.out,
+        prefix=args.prefix,
+        max_size=args.max_size,
+        padding=args.padding,
+        n_colors=args.colors,
+        processes=args.processes,
+        root=root,
+        kinds=set(args.kinds.split(",")),
+    )
+    sprites = sum(len(atlas["sprites"]) for atlas in index["atlases"])
+    logging.info(
+        "%d Sprites in %d Atlanten nach %s (%.1f s, %d übersprungen, %d ausgelassen)",
+        sprites,
+        len(index["atlases"]),
+        args.out,
+        time.perf_counter() - start,
+        len(index["skipped"]),
+        sum(index["excluded"].values()),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+"""
+Backend selection shared by the UI, the REST API and the job worker.
+
+``PIXELIZER_BACKEND=litellm`` sends requests through the LiteLLM proxy
+(caching, retries, routing); any other value uses the Azure deployments
+directly.
+"""
+
+import os
+
+from gpt_model.pixelizer_model import Pixelizer
+from gpt_model.pixelizer_model_litellm import Pixelizer as LiteLLMPixelizer
+
+PIXELIZER_BACKEND = os.environ.get("PIXELIZER_BACKEND", "azure")
+
+
+def pixelizer_class(backend=None):
+    """Pixelizer class for ``backend`` (default: ``PIXELIZER_BACKEND``)."""
+    return (
+        LiteLLMPixelizer if (backend or PIXELIZER_BACKEND) == "litellm" else Pixelizer
+    )
+
+
+def create_pixelizer(backend=None, **kwargs):
+    """Instantiate the selected backend with the Pixelizer keyword arguments."""
+    return pixelizer_class(backend)(**kwargs)
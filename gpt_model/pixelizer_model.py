@@ -1,11 +1,34 @@
 import base64
+import io
+import logging
 import os
+import uuid
+from pathlib import Path
+from util.deployment_pool import (
+    AZURE_API_VERSION,
+    AllThrottled,
+    DeploymentPool,
+    load_deployments,
+    retry_after_s,
+)
 from util.image_operations import load_and_resize, concatenate_images
+from util.output_store import atomic_write
 from dotenv import load_dotenv
-from openai import OpenAI, AzureOpenAI
+from openai import (
+    APIConnectionError,
+    AzureOpenAI,
+    InternalServerError,
+    OpenAI,
+    RateLimitError,
+)
+
+logger = logging.getLogger(__name__)
 
 
 class Pixelizer:
+    # DeploymentPool when several Azure deployments are configured
+    pool = None
+
     def __init__(
         self,
         ref_dir="input",
@@ -14,22 +37,45 @@ class Pixelizer:
         model="gpt-image-1",
         quality="auto",
         size="1024x1536",
+        store=None,
+        debug_dir=None,
+        styles=None,
+        deployments=None,
+        cooldown_s=60.0,
     ):
+        """
+        :param store: optional OutputStore; final frames are persisted there
+            asynchronously instead of being written on the streaming path.
+        :param debug_dir: if set (or PIXELIZER_DEBUG_DIR), per-request debug
+            dumps (composite input, completion event) are written below it.
+        :param styles: optional StyleRegistry for per-request ``style``
+            selection. The references and prompt given here are registered
+            there as the default style unless it already defines one.
+        :param deployments: Deployment entries to balance requests over
+            (default: AZURE_OPENAI_DEPLOYMENTS, see load_deployments). Without
+            any, all requests go to the single default endpoint.
+        :param cooldown_s: pause of a deployment after a 429 without
+            Retry-After.
+        """
         load_dotenv()
-        self.client = AzureOpenAI(
-            api_key=os.getenv("OPENAI_API_KEY"),
-            api_version="2025-04-01-preview",
-            azure_endpoint="https://cidd-aifoundry-pl.openai.azure.com",
-        )
+        if deployments is None and os.getenv("AZURE_OPENAI_DEPLOYMENTS"):
+            deployments = load_deployments(os.environ["AZURE_OPENAI_DEPLOYMENTS"])
+        if deployments:
+            self.pool = DeploymentPool(
+                deployments, self._create_deployment_client, cooldown_s=cooldown_s
+            )
+            self.client = self.pool.client(deployments[0])
+        else:
+            self.client = self._create_client()
         self.model = model
         self.quality = quality
         self.size = size
-        self.ref_images = []
-        for i in range(ref_count):
-            image_path = f"{ref_dir}/{ref_prefix}{i + 1}.png"
-            self.ref_images.append(load_and_resize(image_path))
+        self.store = store
+        self.debug_dir = debug_dir or os.getenv("PIXELIZER_DEBUG_DIR")
+        ref_paths = [f"{ref_dir}/{ref_prefix}{i + 1}.png" for i in range(ref_count)]
+        self.ref_images = [load_and_resize(path) for path in ref_paths]
 
-        self.prompt = f"""In the image, {ref_count} pixel characters appear next to a real person.
+        self.prompt_template = """In the image, {ref_count} pixel characters appear next to a real person.
             Convert the real person from the target image into the visual style of the pixel reference images.
             Style description, transfer the style of the reference images as much as possible:
             Pixel art format, the person is exactly 40 large pixels wide × 80 large pixels high
@@ -47,57 +93,160 @@ class Pixelizer:
             Output must contain only one person in the center of the image
             Adjust posture and background to match ref images exactly
             """
+        self.prompt = self.prompt_template.format(ref_count=ref_count)
+        self.styles = styles
+        if styles is not None:
+            styles.register(
+                styles.default, ref_paths, self.prompt_template, replace=False
+            )
+
+    def _create_client(self):
+        return AzureOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            api_version=AZURE_API_VERSION,
+            azure_endpoint="https://cidd-aifoundry-pl.openai.azure.com",
+        )
+
+    def _create_deployment_client(self, deployment):
+        # Keine SDK-Retries: bei 429 sofort auf ein anderes Deployment ausweichen
+        return AzureOpenAI(
+            api_key=deployment.api_key,
+            api_version=deployment.api_version,
+            azure_endpoint=deployment.endpoint,
+            max_retries=0,
+        )
 
-    def pixelize(self, target_image, output_path="output.png"):
+    def pixelize(
+        self,
+        target_image,
+        output_path=None,
+        quality=None,
+        size=None,
+        partial_images=3,
+        ref_count=None,
+        style=None,
+    ):
         """
         Pixelizes the target image using the reference images and prompt.
         :param target_image: loaded image with size <= 1024p.
-        :param output_path: path to save the pixelized image.
-        :return: bytes of the pixelized image.
+        :param output_path: optional path for the final image. Ignored if a
+            store is configured (the store decides the path).
+        :param quality, size: per-request overrides of the instance defaults.
+        :param partial_images: number of partial frames to stream (0-3).
+        :param ref_count: use only the first n reference images.
+        :param style: name of a style in the StyleRegistry; its references
+            and prompt replace the instance's own.
+        :return: generator of image bytes (partial frames, then the final one).
         """
-        target_image.name = "target.png"
-        all_images = [target_image] + self.ref_images
-        concat_images = concatenate_images(all_images)
-        concat_images.seek(0)
-
-        # TODO debug entry
-        with open("test.png", "wb") as f:
-            f.write(concat_images.read())
+        request_id = uuid.uuid4().hex[:12]
+        concat_images, prompt = self._build_request(
+            request_id, target_image, ref_count, style
+        )
 
-        stream = self.client.images.edit(
-            model=self.model,
+        params = dict(
             image=concat_images,
-            prompt=self.prompt,
-            quality=self.quality,
-            size=self.size,
+            prompt=prompt,
+            quality=quality or self.quality,
+            size=size or self.size,
             stream=True,
-            partial_images=3,
+            partial_images=partial_images,
         )
+        if self.pool is None:
+            stream = self.client.images.edit(model=self.model, **params)
+            yield from self._frames(stream, request_id, output_path)
+            return
 
+        # Die Clients wiederholen nicht selbst (max_retries=0): jeder Fehler
+        # vor dem ersten Frame geht an das nächste Deployment.
+        tried = set()
+        error = None
+        while True:
+            try:
+                with self.pool.lease(exclude=tried) as lease:
+                    concat_images.seek(0)
+                    try:
+                        stream = lease.client.images.edit(
+                            model=lease.deployment.deployment, **params
+                        )
+                    except RateLimitError as e:
+                        self.pool.throttle(lease.deployment, retry_after_s(e))
+                        tried.add(lease.deployment)
+                        continue
+                    except (InternalServerError, APIConnectionError) as e:
+                        # 5xx, Verbindungsabbruch oder Timeout (APITimeoutError);
+                        # zählt als fehlgeschlagen (lease.succeeded bleibt False)
+                        logger.warning("%s: %s", lease.deployment.label, e)
+                        tried.add(lease.deployment)
+                        error = e
+                        continue
+                    yield from self._frames(stream, request_id, output_path)
+                    lease.succeeded = True
+                    return
+            except AllThrottled:
+                # Alle durchprobiert: den letzten Serverfehler melden statt
+                # "ausgelastet", falls einer dabei war
+                if error is None:
+                    raise
+                raise error
+
+    def _frames(self, stream, request_id, output_path):
         for event in stream:
-            print(f"Event: {event.type}")
-            # print([attr for attr in dir(event) if not attr.startswith("__")])
+            logger.debug("Event: %s", event.type)
+            image_bytes = base64.b64decode(event.b64_json)
             if event.type == "image_edit.completed":
-                with open("event_log.txt", "w") as f:
-                    f.write("Event attributes:\n")
-                    f.write(
-                        "\n".join(
-                            [
-                                f"{attr}: {getattr(event, attr)}"
-                                for attr in dir(event)
-                                if not attr.startswith("__")
-                            ]
-                        )
-                    )
-            # if event.type == "image_edit.partial_image":
-            image_base64 = event.b64_json
-            image_bytes = base64.b64decode(image_base64)
-            with open(output_path, "wb") as f:
-                f.write(image_bytes)
+                # Only the final frame is persisted; partial frames stay in memory.
+                self._persist(image_bytes, output_path)
+                if self.debug_dir:
+                    self._write_debug(request_id, "event.txt", _describe(event))
             yield image_bytes
 
-        # image_base64 = result.data[0].b64_json
-        # image_bytes = base64.b64decode(image_base64)
-        # with open(output_path, "wb") as f:
-        #     f.write(image_bytes)
-        # return image_bytes
+    def stats(self):
+        """Per-deployment load and utilization (empty without a pool)."""
+        return {"deployments": self.pool.stats() if self.pool is not None else []}
+
+    def _build_request(self, request_id, target_image, ref_count=None, style=None):
+        """Composite input image (target + references) and prompt for one request."""
+        if style is not None:
+            if self.styles is None:
+                raise ValueError("Keine Stile konfiguriert.")
+            prepared = self.styles.prepare(style, ref_count)
+            concat_images, prompt = prepared.composite(target_image), prepared.prompt
+        else:
+            ref_images = self.ref_images
+            prompt = self.prompt
+            if ref_count is not None and ref_count < len(self.ref_images):
+                ref_images = self.ref_images[:ref_count]
+                prompt = self.prompt_template.format(ref_count=ref_count)
+            target_image.name = "target.png"
+            # Shared BytesIO buffers must not be read by concurrent requests at once.
+            ref_images = [io.BytesIO(buf.getvalue()) for buf in ref_images]
+            concat_images = concatenate_images([target_image] + ref_images)
+            concat_images.seek(0)
+
+        if self.debug_dir:
+            self._write_debug(request_id, "composite.png", concat_images.getvalue())
+        return concat_images, prompt
+
+    def _persist(self, image_bytes, output_path):
+        if self.store is not None:
+            self.store.put(image_bytes)
+        elif output_path:
+            atomic_write(output_path, image_bytes)
+
+    def _write_debug(self, request_id, name, data):
+        path = Path(self.debug_dir) / request_id / name
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if self.store is not None:
+            self.store.write_file(path, data)
+        else:
+            atomic_write(path, data)
+
+
+def _describe(event):
+    """Text dump of all public event attributes except the (huge) image payload."""
+    return "Event attributes:\n" + "\n".join(
+        f"{attr}: {getattr(event, attr)}"
+        for attr in dir(event)
+        if not attr.startswith("_") and attr != "b64_json"
+    )
@@ -1,9 +1,21 @@
 import base64
+import io
+import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 from util.image_operations import load_and_resize, concatenate_images
+from util.micro_batch import FigureCountMismatch, MicroBatcher, split_row
+from util.output_store import atomic_write
 from dotenv import load_dotenv
 from openai import OpenAI, AzureOpenAI
 
+logger = logging.getLogger(__name__)
+
+
+def _parse_size(size):
+    width, height = size.split("x")
+    return int(width), int(height)
+
 
 class Pixelizer:
     def __init__(
@@ -14,7 +26,23 @@ class Pixelizer:
         model="FLUX.1-Kontext-pro",
         quality="hd",
         size="1024x1792",
+        store=None,
+        batch_size=1,
+        batch_window_s=0.25,
+        batch_image_size="1792x1024",
     ):
+        """
+        :param batch_size: > 1 enables micro-batching: up to this many targets
+            arriving within ``batch_window_s`` share one ``images.edit`` call
+            (one composite, one character per target in the output row).
+            Capped at the number of ``size``-shaped panels that fit side by
+            side into ``batch_image_size``.
+        :param batch_window_s: max. extra wait of a request for its batch.
+        :param batch_image_size: output size of batched calls (landscape, so
+            each panel keeps roughly the aspect of ``size``). Every panel is
+            fitted to ``size``, so batched and single requests get the same
+            frame.
+        """
         load_dotenv()
         self.client = AzureOpenAI(
             api_key=os.getenv("OPENAI_API_KEY"),
@@ -24,6 +52,7 @@ class Pixelizer:
         self.model = model
         self.quality = quality
         self.size = size
+        self.store = store
         self.ref_images = []
         for i in range(ref_count):
             image_path = f"{ref_dir}/{ref_prefix}{i + 1}.png"
@@ -43,30 +72,82 @@ class Pixelizer:
             "Convert everything into the described pixel style\n"
             "Adjust posture and background to match ref images exactly\"
             """
+        self.batch_image_size = batch_image_size
+        width, height = _parse_size(size)
+        batch_width, batch_height = _parse_size(batch_image_size)
+        # Panels in Originalproportion, die nebeneinander ins Batch-Bild passen
+        self.max_panels = max(1, int(batch_width / (batch_height * width / height)))
+        if batch_size > self.max_panels:
+            logger.info(
+                "batch_size %d auf %d begrenzt (%s-Panels in %s)",
+                batch_size,
+                self.max_panels,
+                size,
+                batch_image_size,
+            )
+            batch_size = self.max_panels
+        self.batcher = None
+        if batch_size > 1:
+            self.batcher = MicroBatcher(
+                self._edit_batch, max_batch=batch_size, window_s=batch_window_s
+            )
 
-    def pixelize(self, target_image, output_path="output.png"):
+    def pixelize(self, target_image, output_path=None):
         """
         Pixelizes the target image using the reference images and prompt.
         :param target_image: loaded image with size <= 1024p.
-        :param output_path: path to save the pixelized image.
+        :param output_path: optional path to save the pixelized image
+            (ignored if a store is configured).
         :return: bytes of the pixelized image.
         """
-        all_images = [target_image] + self.ref_images
-        concat_images = concatenate_images(all_images)
+        if self.batcher is not None:
+            image_bytes = self.batcher.submit(target_image).result()
+        else:
+            image_bytes = self._edit_batch([target_image])[0]
+        if self.store is not None:
+            self.store.put(image_bytes)
+        elif output_path:
+            atomic_write(output_path, image_bytes)
+        return image_bytes
 
+    def batch_prompt(self, count):
+        """Prompt for ``count`` targets placed left of the references."""
+        return (
+            f"The image shows {count} real people on the left, followed by the "
+            f"pixel reference characters. Convert each of the {count} people "
+            "separately as described below. Output exactly "
+            f"{count} pixel characters side by side in one row, in the same "
+            "left-to-right order, each centered in its own equal-width column "
+            "on the light grey background, not touching each other.\n\n" + self.prompt
+        )
+
+    def _edit_batch(self, targets):
+        """
+        One images.edit call for all ``targets``; one image per target. If
+        the model draws a different number of figures, the targets are
+        generated one by one instead.
+        """
+        for target in targets:
+            target.seek(0)
+        # Gemeinsame Referenz-Puffer nicht von parallelen Batches lesen lassen
+        refs = [io.BytesIO(buf.getvalue()) for buf in self.ref_images]
+        concat_images = concatenate_images(list(targets) + refs)
         concat_images.seek(0)
-        with open("test.png", "wb") as f:
-            f.write(concat_images.read())
 
+        batched = len(targets) > 1
         result = self.client.images.edit(
             model=self.model,
             image=concat_images,
-            prompt=self.prompt,
+            prompt=self.batch_prompt(len(targets)) if batched else self.prompt,
             quality=self.quality,
-            size=self.size,
+            size=self.batch_image_size if batched else self.size,
         )
-        image_base64 = result.data[0].b64_json
-        image_bytes = base64.b64decode(image_base64)
-        with open(output_path, "wb") as f:
-            f.write(image_bytes)
-        return image_bytes
+        image_bytes = base64.b64decode(result.data[0].b64_json)
+        if not batched:
+            return [image_bytes]
+        try:
+            return split_row(image_bytes, len(targets), _parse_size(self.size))
+        except FigureCountMismatch as e:
+            logger.warning("Batch mit %d Zielen verworfen: %s", len(targets), e)
+        with ThreadPoolExecutor(len(targets)) as executor:
+            return list(executor.map(lambda t: self._edit_batch([t])[0], targets))
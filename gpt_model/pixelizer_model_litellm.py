@@ -0,0 +1,114 @@
+import base64
+import os
+import uuid
+from openai import OpenAI
+
+import config
+from gpt_model.pixelizer_model import Pixelizer as AzurePixelizer
+
+
+class Pixelizer(AzurePixelizer):
+    """
+    Same prompt, references and generator contract as the Azure backend, but
+    requests go through a LiteLLM proxy (``config.LITELLM_API_BASE``).
+
+    ``model`` is a model group on the proxy; the proxy load-balances it over
+    its deployments and retries failed calls (``num_retries``). The client
+    itself does not retry, so one request costs at most ``num_retries + 1``
+    generations. Non-streaming calls can be answered from the proxy's
+    response cache (``cache_ttl_s``): the same composite + prompt + settings
+    then returns the stored image without a new generation. Streaming
+    responses are never cached, so ``stream`` defaults to False;
+    ``pixelize`` then yields a single final frame.
+    """
+
+    def __init__(
+        self,
+        *args,
+        api_base=None,
+        api_key=None,
+        stream=False,
+        cache_ttl_s=24 * 3600,
+        num_retries=2,
+        timeout_s=180,
+        **kwargs,
+    ):
+        self.api_base = (
+            api_base or os.getenv("LITELLM_API_BASE") or config.LITELLM_API_BASE
+        )
+        self.api_key = api_key
+        self.stream = stream
+        self.cache_ttl_s = cache_ttl_s
+        self.num_retries = num_retries
+        self.timeout_s = timeout_s
+        # Der Proxy verteilt selbst; AZURE_OPENAI_DEPLOYMENTS gilt hier nicht
+        kwargs.setdefault("deployments", ())
+        super().__init__(*args, **kwargs)
+
+    def _create_client(self):
+        return OpenAI(
+            api_key=self.api_key or os.getenv("LITELLM_API_KEY"),
+            base_url=self.api_base,
+            # Retries macht allein der Proxy (num_retries); zusätzliche
+            # Client-Retries würden jede Generierung vervielfachen.
+            max_retries=0,
+            timeout=self.timeout_s,
+        )
+
+    def _litellm_params(self):
+        """Proxy-side request options, sent as extra form fields."""
+        params = {"num_retries": self.num_retries}
+        if self.cache_ttl_s:
+            params["cache"] = {"ttl": self.cache_ttl_s}
+        else:
+            params["cache"] = {"no-cache": True}
+        return params
+
+    def pixelize(
+        self,
+        target_image,
+        output_path=None,
+        quality=None,
+        size=None,
+        partial_images=3,
+        ref_count=None,
+        style=None,
+    ):
+        """
+        Pixelizes the target image via the LiteLLM proxy.
+        Same parameters as the Azure backend; with ``stream=False`` the
+        generator yields only the final image.
+        """
+        if self.stream:
+            yield from super().pixelize(
+                target_image,
+                output_path=output_path,
+                quality=quality,
+                size=size,
+                partial_images=partial_images,
+                ref_count=ref_count,
+                style=style,
+            )
+            return
+
+        request_id = uuid.uuid4().hex[:12]
+        concat_images, prompt = self._build_request(
+            request_id, target_image, ref_count, style
+        )
+        result = self.client.images.edit(
+            model=self.model,
+            image=concat_images,
+            prompt=prompt,
+            quality=quality or self.quality,
+            size=size or self.size,
+            extra_body=self._litellm_params(),
+        )
+        image_bytes = base64.b64decode(result.data[0].b64_json)
+        self._persist(image_bytes, output_path)
+        if self.debug_dir:
+            self._write_debug(
+                request_id,
+                "event.txt",
+                f"created: {result.created}\nusage: {getattr(result, 'usage', None)}",
+            )
+        yield image_bytes
@@ -1,8 +1,90 @@
 import base64
+import hashlib
+import json
+import logging
 import os
+import threading
+import time
 from util.image_operations import load_and_resize
+from util.output_store import atomic_write
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import BadRequestError, NotFoundError, OpenAI, OpenAIError
+from openai.types import ImagesResponse
+
+logger = logging.getLogger(__name__)
+
+
+class ReferenceUploads:
+    """
+    Uploads images once via the Files API and remembers their file ids by
+    content hash (sha256), so unchanged references are not sent again.
+
+    Files are created with an expiry of ``ttl_s``; ids are renewed a bit
+    before that (``renew_margin_s``) and whenever the server reports an id as
+    unknown (``invalidate``).
+    """
+
+    def __init__(self, client, ttl_s=7 * 24 * 3600, renew_margin_s=3600):
+        self.client = client
+        self.ttl_s = ttl_s
+        self.renew_margin_s = renew_margin_s
+        self._ids = {}  # sha256 -> (file_id, uploaded_at)
+        self._lock = threading.Lock()
+        self.uploads = 0
+        self.bytes_uploaded = 0
+
+    def file_ids(self, images):
+        """
+        :param images: list of PNG bytes.
+        :return: (file ids in the same order, bytes uploaded by this call)
+        """
+        ids, uploaded = [], 0
+        with self._lock:
+            for i, data in enumerate(images):
+                key = hashlib.sha256(data).hexdigest()
+                entry = self._ids.get(key)
+                if entry is None or self._expiring(entry[1]):
+                    file = self.client.files.create(
+                        file=(f"ref{i + 1}.png", data, "image/png"),
+                        purpose="vision",
+                        expires_after={"anchor": "created_at", "seconds": self.ttl_s},
+                    )
+                    entry = (file.id, time.time())
+                    self._ids[key] = entry
+                    self.uploads += 1
+                    self.bytes_uploaded += len(data)
+                    uploaded += len(data)
+                ids.append(entry[0])
+        return ids, uploaded
+
+    def upload_once(self, data, filename, ttl_s=3600):
+        """
+        Upload a single-use image (not cached) that expires after ``ttl_s``
+        (the Files API minimum is one hour). Returns its file id.
+        """
+        file = self.client.files.create(
+            file=(filename, data, "image/png"),
+            purpose="vision",
+            expires_after={"anchor": "created_at", "seconds": ttl_s},
+        )
+        return file.id
+
+    def delete(self, file_id):
+        """Delete a single-use upload; failures are only logged."""
+        try:
+            self.client.files.delete(file_id)
+        except OpenAIError as e:
+            logger.warning("Upload %s konnte nicht gelöscht werden: %s", file_id, e)
+
+    def invalidate(self, file_ids=None):
+        """Forget the given ids (all if None), so they are uploaded again."""
+        with self._lock:
+            for key, (file_id, _) in list(self._ids.items()):
+                if file_ids is None or file_id in file_ids:
+                    del self._ids[key]
+
+    def _expiring(self, uploaded_at):
+        return time.time() - uploaded_at > self.ttl_s - self.renew_margin_s
 
 
 class Pixelizer:
@@ -14,7 +96,18 @@ class Pixelizer:
         model="gpt-image-1",
         quality="auto",
         size="1024x1536",
+        store=None,
+        reuse_uploads=True,
+        upload_ttl_s=7 * 24 * 3600,
     ):
+        """
+        :param store: optional OutputStore for the results.
+        :param reuse_uploads: upload the references once via the Files API
+            and send only their ids per request (the target is uploaded per
+            request). False sends all images as multipart upload with every
+            request.
+        :param upload_ttl_s: expiry of the uploaded reference files.
+        """
         load_dotenv()
         self.client = OpenAI(
             api_key=os.getenv("OPENAI_API_KEY"),
@@ -22,10 +115,18 @@ class Pixelizer:
         self.model = model
         self.quality = quality
         self.size = size
+        self.store = store
         self.ref_images = []
         for i in range(ref_count):
             image_path = f"{ref_dir}/{ref_prefix}{i + 1}.png"
             self.ref_images.append(load_and_resize(image_path))
+        self.ref_bytes = [buf.getvalue() for buf in self.ref_images]
+        self.reuse_uploads = reuse_uploads
+        self.uploads = ReferenceUploads(self.client, ttl_s=upload_ttl_s)
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.bytes_saved = 0
+        self.reuploads = 0
         self.prompt = (
             "Convert the person from the target image into the visual style of the reference images.\n\n"
             "Style description (from ref images):\n"
@@ -42,23 +143,106 @@ class Pixelizer:
             "Adjust posture and background to match ref images exactly"
         )
 
-    def pixelize(self, target_image, output_path="output.png"):
+    def pixelize(self, target_image, output_path=None):
         """
         Pixelizes the target image using the reference images and prompt.
         :param target_image: loaded image with size <= 1024p.
-        :param output_path: path to save the pixelized image.
+        :param output_path: optional path to save the pixelized image
+            (ignored if a store is configured).
         :return: bytes of the pixelized image.
         """
-        all_images = self.ref_images + [target_image]
-        result = self.client.images.edit(
-            model=self.model,
-            image=all_images,
-            prompt=self.prompt,
-            quality=self.quality,
-            size=self.size,
-        )
+        if self.reuse_uploads:
+            result = self._edit_with_file_ids(target_image)
+        else:
+            result = self.client.images.edit(
+                model=self.model,
+                image=self.ref_images + [target_image],
+                prompt=self.prompt,
+                quality=self.quality,
+                size=self.size,
+            )
         image_base64 = result.data[0].b64_json
         image_bytes = base64.b64decode(image_base64)
-        with open(output_path, "wb") as f:
-            f.write(image_bytes)
+        if self.store is not None:
+            self.store.put(image_bytes)
+        elif output_path:
+            atomic_write(output_path, image_bytes)
         return image_bytes
+
+    def _edit_with_file_ids(self, target_image):
+        """
+        JSON variant of images/edits: references and target as file ids. The
+        target is uploaded raw via the Files API like the references (a
+        base64 data URL would add a third to its size) and deleted again once
+        the edit has finished or failed. An expired or deleted reference id
+        triggers one re-upload.
+        """
+        target_image.seek(0)
+        target = target_image.read()
+        target_id = self.uploads.upload_once(target, "target.png")
+        try:
+            return self._edit_with_target(target, target_id)
+        finally:
+            # Das Foto des Nutzers nicht bis zum Ablauf liegen lassen
+            self.uploads.delete(target_id)
+
+    def _edit_with_target(self, target, target_id):
+        ref_total = sum(len(data) for data in self.ref_bytes)
+        for attempt in range(2):
+            file_ids, uploaded = self.uploads.file_ids(self.ref_bytes)
+            images = [{"file_id": file_id} for file_id in file_ids + [target_id]]
+            try:
+                result = self.client.post(
+                    "/images/edits",
+                    cast_to=ImagesResponse,
+                    body={
+                        "model": self.model,
+                        "images": images,
+                        "prompt": self.prompt,
+                        "quality": self.quality,
+                        "size": self.size,
+                    },
+                )
+            except (NotFoundError, BadRequestError) as e:
+                # Die Referenzen wurden zusammen hochgeladen und laufen
+                # zusammen ab: alle neu hochladen, nicht nur die gemeldete.
+                expired = isinstance(e, NotFoundError) or any(
+                    file_id in str(e) for file_id in file_ids
+                )
+                if attempt or not expired:
+                    raise
+                logger.info("Referenz-Uploads abgelaufen, lade neu: %s", e)
+                self.uploads.invalidate(file_ids)
+                with self._stats_lock:
+                    self.reuploads += 1
+                continue
+            # Bildbytes gegenüber dem Multipart-Upload aller Bilder: das Ziel
+            # wird in beiden Fällen roh gesendet, hier kommen die ids dazu.
+            multipart = ref_total + len(target)
+            sent = uploaded + len(target) + len(json.dumps(images))
+            saved = multipart - sent
+            with self._stats_lock:
+                self.requests += 1
+                self.bytes_saved += saved
+            logger.info(
+                "Upload gespart: %d Bytes (%d statt %d Bytes Bilddaten)",
+                saved,
+                sent,
+                multipart,
+            )
+            return result
+
+    def stats(self):
+        """
+        Upload volume of the references over all requests so far;
+        ``bytes_saved`` is the net image payload saved against sending every
+        image as multipart upload.
+        """
+        return {
+            "requests": self.requests,
+            "ref_bytes_per_request": sum(len(data) for data in self.ref_bytes),
+            "uploads": self.uploads.uploads,
+            "bytes_uploaded": self.uploads.bytes_uploaded,
+            "bytes_saved": self.bytes_saved,
+            "reuploads": self.reuploads,
+        }
@@ -0,0 +1,158 @@
+"""
+Generation worker for the persistent job queue.
+
+Pulls jobs from the SQLite queue (JOB_QUEUE_DB), runs Pixelizer.pixelize and
+writes every streamed frame back to the queue, so results survive UI restarts
+and dropped browser connections.
+
+    python job_worker.py --db jobs.sqlite3 --processes 4
+"""
+
+import argparse
+import io
+import logging
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from util.job_queue import JobQueue
+from util.output_store import OutputStore
+from util.style_registry import StyleRegistry
+
+logger = logging.getLogger(__name__)
+
+# Fertige/fehlgeschlagene Aufträge so lange abrufbar halten (GET /jobs/{id})
+JOB_RETENTION_S = float(os.environ.get("JOB_RETENTION_S", 24 * 3600))
+PURGE_INTERVAL_S = 600.0
+
+
+def _keep_lease(queue, job_id, worker_id, stop_event):
+    """Extend the lease every third of the visibility timeout until stopped."""
+    interval_s = queue.visibility_timeout_s / 3
+    while not stop_event.wait(interval_s):
+        try:
+            if not queue.heartbeat(job_id, worker_id):
+                return  # Lease verloren, add_frame/complete melden es
+        except sqlite3.Error:
+            logger.exception("Heartbeat für Auftrag %s fehlgeschlagen", job_id)
+
+
+def process_job(queue, pixelizer, job, worker_id):
+    """
+    Run one claimed job to completion (or hand it back for a retry). A
+    heartbeat thread keeps the lease while pixelize runs, also between frames.
+    """
+    target = io.BytesIO(job.target)
+    stop_heartbeat = threading.Event()
+    heartbeat = threading.Thread(
+        target=_keep_lease,
+        args=(queue, job.id, worker_id, stop_heartbeat),
+        daemon=True,
+    )
+    heartbeat.start()
+    try:
+        for image_bytes in pixelizer.pixelize(target, **job.params):
+            if not queue.add_frame(job.id, worker_id, image_bytes):
+                # Lease verloren (zu langsam) – ein anderer Worker übernimmt
+                logger.warning("Lease für Auftrag %s verloren", job.id)
+                return False
+        return queue.complete(job.id, worker_id)
+    except Exception as e:
+        logger.exception("Auftrag %s fehlgeschlagen", job.id)
+        queue.fail(job.id, worker_id, e)
+        return False
+    finally:
+        stop_heartbeat.set()
+        heartbeat.join()
+
+
+def run_worker(
+    queue,
+    pixelizer,
+    worker_id=None,
+    poll_s=1.0,
+    stop_event=None,
+    retention_s=JOB_RETENTION_S,
+    purge_interval_s=PURGE_INTERVAL_S,
+):
+    """
+    Claim and process jobs until ``stop_event`` is set. Every
+    ``purge_interval_s`` finished jobs older than ``retention_s`` are deleted.
+    """
+    worker_id = (
+        worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    )
+    stop_event = stop_event or threading.Event()
+    next_purge = time.monotonic()
+    while not stop_event.is_set():
+        if time.monotonic() >= next_purge:
+            next_purge = time.monotonic() + purge_interval_s
+            try:
+                purged = queue.purge(retention_s)
+            except sqlite3.Error:
+                logger.exception("Aufräumen der Auftragsdatenbank fehlgeschlagen")
+            else:
+                if purged:
+                    logger.info("%d alte Aufträge gelöscht", purged)
+        job = queue.claim(worker_id)
+        if job is None:
+            stop_event.wait(poll_s)
+            continue
+        started = time.monotonic()
+        ok = process_job(queue, pixelizer, job, worker_id)
+        logger.info(
+            "Auftrag %s %s nach %.1f s (Versuch %d)",
+            job.id,
+            "fertig" if ok else "abgebrochen",
+            time.monotonic() - started,
+            job.attempts,
+        )
+
+
+def _worker_main(db_path, output_dir, retention_s):
+    # wie UI und API: PIXELIZER_BACKEND wählt Azure oder den LiteLLM-Proxy
+    from gpt_model.backends import create_pixelizer
+
+    logging.basicConfig(level=logging.INFO)
+    store = OutputStore(output_dir)
+    styles = StyleRegistry(os.environ.get("STYLE_DIR", "styles"))
+    pixelizer = create_pixelizer(
+        ref_count=7, quality="medium", store=store, styles=styles
+    )
+    run_worker(JobQueue(db_path), pixelizer, retention_s=retention_s)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", default=os.environ.get("JOB_QUEUE_DB", "jobs.sqlite3"))
+    parser.add_argument("--output-dir", default="output")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument(
+        "--retention-s",
+        type=float,
+        default=JOB_RETENTION_S,
+        help="fertige Aufträge nach so vielen Sekunden löschen",
+    )
+    args = parser.parse_args()
+
+    Path(args.output_dir).mkdir(exist_ok=True)
+    procs = [
+        multiprocessing.Process(
+            target=_worker_main,
+            args=(args.db, args.output_dir, args.retention_s),
+        )
+        for _ in range(args.processes)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+
+if __name__ == "__main__":
+    main()
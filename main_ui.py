@@ -1,17 +1,23 @@
-import uuid
 from pathlib import Path
 from PIL import Image
 import io
+import tempfile
+import uuid
 
 import gradio as gr
 from gpt_model.pixelizer_model import Pixelizer
 from util.image_operations import load_and_resize
-
-# --- Pixelizer unverändert ---
-pixelizer = Pixelizer(ref_count=7, quality="medium")
+from util.output_store import OutputStore
 
 OUTPUT_DIR = Path("output")
 OUTPUT_DIR.mkdir(exist_ok=True)
+output_store = OutputStore(OUTPUT_DIR)
+# Frames gehen als Dateipfad an Gradio, nicht als dekodiertes RGBA‑Bild (~6 MB)
+FRAME_DIR = Path(tempfile.gettempdir()) / "pixelizer_frames"
+FRAME_DIR.mkdir(parents=True, exist_ok=True)
+
+# --- Pixelizer unverändert ---
+pixelizer = Pixelizer(ref_count=7, quality="medium", store=output_store)
 
 
 def process_image(image_file):
@@ -21,12 +27,15 @@ def process_image(image_file):
     buf.seek(0)
     resized = load_and_resize(buf)
 
-    output_name = f"pixelized_{uuid.uuid4().hex[:8]}.png"
-    output_path = OUTPUT_DIR / output_name
-
-    for image_bytes in pixelizer.pixelize(resized, output_path=str(output_path)):
-        img = Image.open(io.BytesIO(image_bytes)).convert("RGBA")
-        yield img
+    request_id = uuid.uuid4().hex[:12]
+    for index, image_bytes in enumerate(pixelizer.pixelize(resized)):
+        path = FRAME_DIR / f"{request_id}_{index}.png"
+        path.write_bytes(image_bytes)
+        try:
+            yield str(path)
+        finally:
+            # Gradio hat den Frame beim Weiterlaufen bereits übernommen.
+            path.unlink(missing_ok=True)
 
 
 # --------------------------------
@@ -115,6 +124,7 @@ with gr.Blocks(theme=dark_theme, css=CSS, analytics_enabled=False) as pixelator:
             with gr.Row(elem_classes=["equal"]):
                 pixel_display = gr.Image(
                     elem_id="img_out",
+                    type="filepath",
                     interactive=False,
                     height=700,
                     width=466,  # feste Fläche, auch leer
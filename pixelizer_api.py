@@ -0,0 +1,283 @@
+"""
+Lean HTTP API for kiosks and the companion app: upload a photo, get the
+partial and final frames streamed back. No Gradio involved.
+
+    python pixelizer_api.py     (PORT, default 8000; drains on SIGTERM)
+    uvicorn pixelizer_api:app --host 0.0.0.0 --port 8000
+
+GET /healthz (liveness), GET /readyz (readiness, 503 while starting/draining)
+
+POST /pixelize (multipart/form-data, field "image")
+
+    ?format=sse (default) -> text/event-stream
+        event: tier     data: {"name", "queue_depth", "predicted_s"}
+        event: frame    data: {"index", "png": <base64>}   (last one = final)
+        event: warning  data: {"message"}                  (skipped frame)
+        event: done     data: {"frames"}
+        event: error    data: {"message"}
+
+    ?format=multipart -> multipart/x-mixed-replace of image/png parts,
+        directly usable as <img src> in kiosk browsers.
+
+    ?style=<name> -> style preset from STYLE_DIR (GET /styles lists them).
+
+GET /deployments -> load, latency and utilization per Azure deployment
+    (AZURE_OPENAI_DEPLOYMENTS)
+
+GET /jobs/{id}?after=<frame index> -> text/event-stream of a job in the
+    persistent queue (JOB_QUEUE_DB, e.g. submitted by the Gradio UI), so a
+    client can pick a job up again after a dropped connection
+        event: status   data: {"status", "attempts"}           (on change)
+        event: frame    data: {"index", "png": <base64>}       (index > after)
+        event: done     data: {"frames"}
+        event: error    data: {"message"}
+"""
+
+import base64
+import io
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from gpt_model.backends import create_pixelizer
+from util.image_operations import load_and_resize
+from util.job_queue import DONE, FAILED, JobQueue
+from util.lifecycle import Draining, Lifecycle, add_health_routes, serve
+from util.load_policy import LoadPolicy
+from util.output_store import OutputStore
+from util.style_registry import StyleRegistry
+from util.validation import (
+    MAX_INPUT_BYTES,
+    check_input_size,
+    prepare_resized_png_bytes,
+    safe_open_image_as_rgba,
+    validate_image_bytes,
+)
+
+OUTPUT_DIR = Path("output")
+OUTPUT_DIR.mkdir(exist_ok=True)
+output_store = OutputStore(
+    OUTPUT_DIR,
+    max_bytes=int(os.environ.get("OUTPUT_MAX_BYTES", 2 * 1024**3)),
+    max_age_s=int(os.environ.get("OUTPUT_MAX_AGE_S", 7 * 24 * 3600)),
+)
+load_policy = LoadPolicy(
+    slo_s=float(os.environ.get("LATENCY_SLO_S", 60)),
+    concurrency=int(os.environ.get("MAX_CONCURRENT_GENERATIONS", 4)),
+)
+style_registry = StyleRegistry(
+    os.environ.get("STYLE_DIR", "styles"),
+    max_bytes=int(os.environ.get("STYLE_CACHE_MAX_BYTES", 256 * 1024**2)),
+)
+
+# PIXELIZER_BACKEND wählt wie in der UI Azure oder den LiteLLM-Proxy
+try:
+    pixelizer = create_pixelizer(
+        ref_count=7, quality="medium", store=output_store, styles=style_registry
+    )
+except Exception:
+    pixelizer = None  # Wird im Handler geprüft
+
+MULTIPART_BOUNDARY = "pixelizer-frame"
+
+# Gemeinsame Auftragsdatenbank mit UI und job_worker.py (optional)
+JOB_QUEUE_DB = os.environ.get("JOB_QUEUE_DB")
+JOB_TIMEOUT_S = float(os.environ.get("JOB_TIMEOUT_S", 600))
+job_queue = JobQueue(JOB_QUEUE_DB) if JOB_QUEUE_DB else None
+
+lifecycle = Lifecycle(drain_timeout_s=float(os.environ.get("DRAIN_TIMEOUT_S", 90)))
+lifecycle.add_check("backend", lambda: pixelizer is not None)
+lifecycle.add_check("references", lambda: bool(getattr(pixelizer, "ref_images", None)))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    lifecycle.mark_ready()
+    yield
+    # Unter "uvicorn pixelizer_api:app" (ohne serve) erst beim Lifespan-Ende
+    await run_in_threadpool(lifecycle.drain)
+
+
+app = FastAPI(title="Pixelizer API", lifespan=lifespan)
+add_health_routes(app, lifecycle)
+
+
+def _preprocess(data: bytes) -> io.BytesIO:
+    """Gleiche Prüfung und Skalierung wie in der Gradio‑Oberfläche."""
+    check_input_size(len(data))
+    image_rgba = safe_open_image_as_rgba(io.BytesIO(data))
+    resized = load_and_resize(prepare_resized_png_bytes(image_rgba))
+    if resized is None:
+        raise ValueError("Bild konnte nicht skaliert/verarbeitet werden.")
+    return resized
+
+
+def _events(resized, style=None):
+    """
+    Runs one generation under the load policy and yields ``(event, payload)``.
+    Frames are passed on as the encoded bytes from the model, never decoded.
+    """
+    try:
+        with lifecycle.track():
+            yield from _generate(resized, style)
+    except Draining as e:
+        yield "error", {"message": str(e)}
+
+
+def _generate(resized, style):
+    with load_policy.admit() as ticket:
+        yield "tier", {
+            "name": ticket.tier.name,
+            "queue_depth": ticket.queue_depth,
+            "predicted_s": round(ticket.predicted_s, 1),
+        }
+        try:
+            count = 0
+            kwargs = ticket.tier.pixelize_kwargs()
+            if style:
+                kwargs["style"] = style
+            frames = pixelizer.pixelize(resized, **kwargs)
+            for index, image_bytes in enumerate(frames):
+                try:
+                    validate_image_bytes(image_bytes)
+                except ValueError as e:
+                    yield "warning", {
+                        "message": f"Ein Zwischenschritt war ungültig: {e}"
+                    }
+                    continue
+                count += 1
+                yield "frame", (index, image_bytes)
+            if not count:
+                yield "error", {"message": "Das Modell hat keine Ausgabe erzeugt."}
+                return
+            ticket.succeeded = True
+            yield "done", {"frames": count}
+        except Exception as e:
+            yield "error", {
+                "message": f"Unerwarteter Fehler bei der Pixelisierung: {e}"
+            }
+
+
+def _job_events(job_id, after=0, poll_s=0.25):
+    """
+    Yields ``(event, payload)`` for a queued job: its status whenever it
+    changes and every frame newer than ``after``, until it is done or failed.
+    """
+    deadline = time.monotonic() + JOB_TIMEOUT_S
+    last_status = None
+    count = 0
+    while True:
+        job = job_queue.get(job_id)
+        if (job.status, job.attempts) != last_status:
+            last_status = job.status, job.attempts
+            yield "status", {"status": job.status, "attempts": job.attempts}
+        # Nach get() lesen, damit bei DONE auch der letzte Frame dabei ist
+        for after, image_bytes in job_queue.frames(job_id, after=after):
+            count += 1
+            yield "frame", (after, image_bytes)
+        if job.status == DONE:
+            yield "done", {"frames": count}
+            return
+        if job.status == FAILED:
+            yield "error", {"message": job.error or "Auftrag fehlgeschlagen."}
+            return
+        if time.monotonic() > deadline:
+            yield "error", {"message": "Der Auftrag ist nicht rechtzeitig fertig."}
+            return
+        time.sleep(poll_s)
+
+
+def _sse(events):
+    for event, payload in events:
+        if event == "frame":
+            index, image_bytes = payload
+            payload = {"index": index, "png": base64.b64encode(image_bytes).decode()}
+        yield f"event: {event}\ndata: {json.dumps(payload)}\n\n".encode()
+
+
+def _multipart(events):
+    for event, payload in events:
+        if event != "frame":
+            continue
+        _, image_bytes = payload
+        yield (
+            f"--{MULTIPART_BOUNDARY}\r\n"
+            f"Content-Type: image/png\r\n"
+            f"Content-Length: {len(image_bytes)}\r\n\r\n"
+        ).encode() + image_bytes + b"\r\n"
+    yield f"--{MULTIPART_BOUNDARY}--\r\n".encode()
+
+
+@app.get("/styles")
+async def list_styles():
+    return {"default": style_registry.default, "styles": style_registry.names()}
+
+
+@app.get("/deployments")
+async def list_deployments():
+    if pixelizer is None:
+        raise HTTPException(
+            503, "Das Pixelizer‑Modell konnte nicht initialisiert werden."
+        )
+    return pixelizer.stats()
+
+
+@app.get("/jobs/{job_id}")
+async def job_stream(job_id: str, after: int = 0):
+    if job_queue is None:
+        raise HTTPException(404, "Keine Auftragswarteschlange konfiguriert.")
+    try:
+        await run_in_threadpool(job_queue.get, job_id)
+    except KeyError:
+        raise HTTPException(404, f"Unbekannter Auftrag: {job_id}")
+    return StreamingResponse(
+        _sse(_job_events(job_id, after)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/pixelize")
+async def pixelize_upload(
+    image: UploadFile = File(...), format: str = "sse", style: str = None
+):
+    if format not in ("sse", "multipart"):
+        raise HTTPException(400, "format muss 'sse' oder 'multipart' sein.")
+    if style and style not in style_registry:
+        raise HTTPException(400, f"Unbekannter Stil: {style}")
+    data = await image.read(MAX_INPUT_BYTES + 1)
+    if len(data) > MAX_INPUT_BYTES:
+        raise HTTPException(413, "Die Datei ist zu groß.")
+    try:
+        resized = await run_in_threadpool(_preprocess, data)
+    except ValueError as e:
+        raise HTTPException(400, f"Eingabefehler: {e}")
+    if pixelizer is None:
+        raise HTTPException(
+            503, "Das Pixelizer‑Modell konnte nicht initialisiert werden."
+        )
+    if not lifecycle.accepting():
+        raise HTTPException(503, "Der Server fährt herunter.")
+
+    if format == "multipart":
+        return StreamingResponse(
+            _multipart(_events(resized, style)),
+            media_type=f"multipart/x-mixed-replace; boundary={MULTIPART_BOUNDARY}",
+        )
+    return StreamingResponse(
+        _sse(_events(resized, style)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    serve(app, lifecycle, host="0.0.0.0", port=int(os.environ.get("PORT", 8000)))
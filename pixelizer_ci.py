@@ -3,107 +3,174 @@ Pixelizer application adapted to Cologne Intelligence corporate design.
 (Hardening/Resilience edition)
 """
 
-import uuid
 from pathlib import Path
-from typing import Generator, Optional, Tuple
-from PIL import Image, UnidentifiedImageError
+from contextlib import nullcontext
+from typing import Generator, Iterable, Iterator, Optional, Tuple
 import io
+import logging
 import os
+import tempfile
+import uuid
 
 import gradio as gr
-from gpt_model.pixelizer_model import Pixelizer
+from PIL import Image
+from fastapi import FastAPI
+from gpt_model.backends import create_pixelizer
+from util.frame_budget import FrameBudget
+from util.group_photo import assemble_lineup, detect_people, generate_all
 from util.image_operations import load_and_resize
+from util.job_queue import JobQueue
+from util.lifecycle import Draining, Lifecycle, add_health_routes, serve
+from util.load_policy import LoadPolicy
+from util.output_store import OutputStore
+from util.palette import denoise
+from util.profiling import start_request_profile
+from util.sprite_export import sprite_png_bytes
+from util.style_registry import StyleRegistry
+
+# Validierung ist mit der HTTP‑API geteilt; alte Namen bleiben hier verfügbar.
+from util.validation import (
+    ALLOWED_EXTS,
+    MAX_INPUT_BYTES,
+    MAX_OUTPUT_BYTES,
+    is_pathlike_image as _is_pathlike_image,
+    prepare_resized_png_bytes as _prepare_resized_png_bytes,
+    safe_open_image_as_rgba as _safe_open_image_as_rgba,
+    safe_save_bytes_to_rgba_image as _safe_save_bytes_to_rgba_image,
+    describe_input,
+    validate_image_bytes as _validate_image_bytes,
+)
+
+OUTPUT_DIR = Path("output")
+OUTPUT_DIR.mkdir(exist_ok=True)
+
+# Ergebnisse: content-addressed, im Hintergrund geschrieben, mit Speicherbudget.
+OUTPUT_MAX_BYTES = int(os.environ.get("OUTPUT_MAX_BYTES", 2 * 1024**3))
+OUTPUT_MAX_AGE_S = int(os.environ.get("OUTPUT_MAX_AGE_S", 7 * 24 * 3600))
+output_store = OutputStore(
+    OUTPUT_DIR, max_bytes=OUTPUT_MAX_BYTES, max_age_s=OUTPUT_MAX_AGE_S
+)
+
+# Lastabhängige Qualität: Ziel-Latenz (Warten + Generierung) pro Anfrage.
+LATENCY_SLO_S = float(os.environ.get("LATENCY_SLO_S", 60))
+MAX_CONCURRENT_GENERATIONS = int(os.environ.get("MAX_CONCURRENT_GENERATIONS", 4))
+load_policy = LoadPolicy(slo_s=LATENCY_SLO_S, concurrency=MAX_CONCURRENT_GENERATIONS)
+
+# Optional: persistente Auftrags‑Warteschlange (SQLite), abgearbeitet von
+# job_worker.py‑Prozessen. Ohne JOB_QUEUE_DB generiert die UI selbst.
+JOB_QUEUE_DB = os.environ.get("JOB_QUEUE_DB")
+JOB_TIMEOUT_S = float(os.environ.get("JOB_TIMEOUT_S", 600))
+job_queue = JobQueue(JOB_QUEUE_DB) if JOB_QUEUE_DB else None
+
+# Stil-Presets (styles/<name>/ref*.png + prompt.txt), zur Laufzeit änderbar.
+STYLE_DIR = os.environ.get("STYLE_DIR", "styles")
+STYLE_CACHE_MAX_BYTES = int(os.environ.get("STYLE_CACHE_MAX_BYTES", 256 * 1024**2))
+style_registry = StyleRegistry(STYLE_DIR, max_bytes=STYLE_CACHE_MAX_BYTES)
 
 # Instantiate Pixelizer with the same settings as the original app.
 # Defensive: Falls Konstruktor scheitert, später im Handler behandeln.
+# PIXELIZER_BACKEND=litellm: über den LiteLLM-Proxy (Caching, Retries, Routing).
 try:
-    pixelizer = Pixelizer(ref_count=7, quality="medium")
+    pixelizer = create_pixelizer(
+        ref_count=7, quality="medium", store=output_store, styles=style_registry
+    )
 except Exception as e:
     pixelizer = None  # Wird im Handler geprüft
 
-OUTPUT_DIR = Path("output")
-OUTPUT_DIR.mkdir(exist_ok=True)
+# Readiness (/readyz) erst mit geladenem Backend; SIGTERM lässt laufende
+# Generierungen bis DRAIN_TIMEOUT_S fertig streamen, bevor der Prozess endet.
+lifecycle = Lifecycle(drain_timeout_s=float(os.environ.get("DRAIN_TIMEOUT_S", 90)))
+lifecycle.add_check("backend", lambda: job_queue is not None or pixelizer is not None)
+lifecycle.add_check(
+    "references",
+    lambda: job_queue is not None or bool(getattr(pixelizer, "ref_images", None)),
+)
+if job_queue is not None:
+    lifecycle.add_check("job_queue", lambda: job_queue.depth() >= 0)
 
-# --- Resilience / Validation configuration (anpassbar) ---
-ALLOWED_EXTS = {".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tiff"}
-MAX_INPUT_BYTES = 25 * 1024 * 1024  # 25 MB, optional
-MAX_OUTPUT_BYTES = 50 * 1024 * 1024  # 50 MB, optional
+# Frames gehen als Dateipfad an Gradio, nie als dekodiertes PIL‑Bild (~6 MB/Frame).
+FRAME_DIR = Path(
+    os.environ.get("FRAME_DIR", Path(tempfile.gettempdir()) / "pixelizer_frames")
+)
+FRAME_DIR.mkdir(parents=True, exist_ok=True)
+MAX_INFLIGHT_FRAME_BYTES = int(
+    os.environ.get("MAX_INFLIGHT_FRAME_BYTES", 256 * 1024 * 1024)
+)
+FRAME_BUDGET_TIMEOUT_S = 30
+frame_budget = FrameBudget(MAX_INFLIGHT_FRAME_BYTES)
 
+# Zusätzlich freigestellte Sprites (transparent, auf die Figur zugeschnitten)
+EXPORT_SPRITES = os.environ.get("EXPORT_SPRITES", "0") == "1"
 
-def _is_pathlike_image(path_str: str) -> bool:
-    if not path_str or not isinstance(path_str, str):
-        return False
-    ext = Path(path_str).suffix.lower()
-    return ext in ALLOWED_EXTS and Path(path_str).exists()
+# Palette der Referenzen auf die Ausgabe anwenden (flache Farben, keine
+# Verläufe) bzw. Zielbilder vor dem Upload auf ihre Hauptfarben reduzieren.
+PALETTE_QUANTIZE = os.environ.get("PALETTE_QUANTIZE", "0") == "1"
+PALETTE_COLORS = int(os.environ.get("PALETTE_COLORS", 32))
+DENOISE_TARGETS = os.environ.get("DENOISE_TARGETS", "0") == "1"
+DENOISE_COLORS = int(os.environ.get("DENOISE_COLORS", 64))
 
+# Gruppenfotos: gleichzeitige Generierungen pro Foto (zusätzlich zu load_policy)
+GROUP_MAX_PARALLEL = int(os.environ.get("GROUP_MAX_PARALLEL", 4))
 
-def _safe_open_image_as_rgba(path_str: str) -> Image.Image:
-    """
-    Öffnet Bild robust, verifiziert es und konvertiert nach RGBA.
-    Raises Exception bei Problemen.
-    """
-    # Optional: Größe prüfen (nur bei lokalen Pfaden sinnvoll)
-    try:
-        if os.path.isfile(path_str):
-            size = os.path.getsize(path_str)
-            if size > MAX_INPUT_BYTES:
-                raise ValueError(
-                    f"Die Datei ist zu groß ({size // (1024 * 1024)} MB). "
-                    f"Maximal erlaubt sind {MAX_INPUT_BYTES // (1024 * 1024)} MB."
-                )
-    except Exception:
-        # Bei Zugriffsfeldern nicht hart abbrechen – wir versuchen trotzdem zu öffnen.
-        pass
 
-    try:
-        with Image.open(path_str) as img_probe:
-            # Korrupte Dateien früh erkennen
-            img_probe.verify()
-        # verify() schließt die Datei; neu öffnen zum eigentlichen Laden
-        img = Image.open(path_str).convert("RGBA")
-        return img
-    except UnidentifiedImageError:
-        raise ValueError("Die angegebene Datei ist kein gültiges Bild.")
-    except OSError:
-        raise ValueError("Das Bild konnte nicht gelesen werden (I/O-Fehler).")
-
-
-def _safe_save_bytes_to_rgba_image(image_bytes: bytes) -> Image.Image:
+def _write_frame(image_bytes: bytes, request_id: str, index: int) -> Path:
     """
-    Bytes -> PIL Image (RGBA) mit defensiver Prüfung.
+    Schreibt einen Frame als Datei, die Gradio direkt ausliefert.
     """
-    try:
-        if image_bytes is None:
-            raise ValueError("Leerer Bild-Chunk vom Modell erhalten.")
-        if len(image_bytes) > MAX_OUTPUT_BYTES:
-            raise ValueError(
-                "Generiertes Bild ist unerwartet groß. Vorgang wird abgebrochen."
-            )
-        bio = io.BytesIO(image_bytes)
-        img = Image.open(bio).convert("RGBA")
-        return img
-    except UnidentifiedImageError:
-        raise ValueError("Ungültige Bilddaten vom Modell erhalten.")
-    except OSError:
-        raise ValueError("Fehler beim Dekodieren der generierten Bilddaten.")
+    path = FRAME_DIR / f"{request_id}_{index}.png"
+    path.write_bytes(image_bytes)
+    return path
 
 
-def _prepare_resized_png_bytes(pil_img_rgba: Image.Image) -> io.BytesIO:
+def _export_sprite(image_bytes: bytes) -> None:
     """
-    Speichert ein PIL‑Bild als PNG in BytesIO (z. B. für load_and_resize).
+    Freigestelltes Sprite (transparenter Hintergrund) zusätzlich im Store ablegen.
+    Fehler hier sollen das bereits gelieferte Ergebnis nicht entwerten.
     """
-    buf = io.BytesIO()
-    pil_img_rgba.save(buf, format="PNG")
-    buf.seek(0)
-    return buf
+    try:
+        output_store.put(sprite_png_bytes(image_bytes))
+    except Exception as e:
+        gr.Warning(f"Sprite-Export fehlgeschlagen: {e}")
 
 
 def process_image(
     image_file: Optional[str],
-) -> Generator[Optional[Image.Image], None, None]:
+    style: Optional[str] = None,
+    group: bool = False,
+    request: gr.Request = None,
+) -> Generator[Optional[str], None, None]:
     """
     Generate a pixelized version of an uploaded image.
 
+    Frames are delivered as PNG file paths (no decoded copies in memory); the
+    encoded bytes held by all handlers together are capped by frame_budget.
+
+    ``style`` selects a preset from style_registry (None: the instance's own
+    references and prompt). With ``group`` every detected person is
+    generated separately and the results are shown as one lineup.
+
+    With PIXELIZER_PROFILE=1, or PIXELIZER_PROFILE=header and the header
+    ``X-Pixelizer-Profile: 1``, the invocation is profiled (see
+    util.profiling). While the process drains
+    for shutdown, new invocations are refused (see util.lifecycle).
+    """
+    try:
+        with lifecycle.track():
+            headers = request.headers if request is not None else None
+            profiler = start_request_profile(headers)
+            try:
+                yield from _process_image(image_file, style, group, profiler)
+            finally:
+                profiler.finish()
+    except Draining:
+        gr.Warning("Der Server wird gerade neu gestartet – bitte erneut versuchen.")
+        yield None
+
+
+def _process_image(
+    image_file: Optional[str], style: Optional[str], group: bool, profiler
+) -> Generator[Optional[str], None, None]:
+    """
     Defensive version:
     - Validiert input
     - Fängt Fehler in load_and_resize und im Pixelizer ab
@@ -121,16 +188,27 @@ def process_image(
         # Versuche dennoch zu öffnen – ggf. handelt es sich um eine temporäre Webcam‑Datei ohne Endung
         # Bei Fehler bricht _safe_open_image_as_rgba mit klarer Meldung ab.
     try:
-        image_rgba = _safe_open_image_as_rgba(image_file)
+        with profiler.stage("open"):
+            if profiler.enabled:
+                profiler.tag(**describe_input(image_file))
+            image_rgba = _safe_open_image_as_rgba(image_file)
     except Exception as e:
         gr.Error(f"Eingabefehler: {e}")
         yield None
         return
 
+    if style and style not in style_registry:
+        gr.Error(f"Unbekannter Stil: {style}")
+        yield None
+        return
+
     # 2) Resize / Pre‑process defensively
     try:
-        buf_png = _prepare_resized_png_bytes(image_rgba)
-        resized = load_and_resize(buf_png)
+        with profiler.stage("resize"):
+            buf_png = _prepare_resized_png_bytes(image_rgba)
+            resized = load_and_resize(buf_png)
+            if DENOISE_TARGETS and resized is not None:
+                resized = _denoise_target(resized)
         if resized is None:
             raise ValueError("Bild konnte nicht skaliert/verarbeitet werden.")
     except Exception as e:
@@ -138,63 +216,276 @@ def process_image(
         yield None
         return
 
-    # 3) Output Pfad vorbereiten
-    try:
-        output_name = f"pixelized_{uuid.uuid4().hex[:8]}.png"
-        output_path = OUTPUT_DIR / output_name
-        # Schreibprobe optional:
-        with open(output_path, "wb") as fp:
-            pass
-        # Datei wieder entfernen – Modell wird sie gleich befüllen.
-        try:
-            output_path.unlink(missing_ok=True)
-        except Exception:
-            pass
-    except Exception:
-        # Fallback: in RAM arbeiten, kein persistentes Ziel
-        output_path = None
-
-    # 4) Pixelizer ausführen (robust)
-    if pixelizer is None:
+    # 3) Pixelizer ausführen (robust)
+    # Das Endergebnis persistiert der Pixelizer über output_store (asynchron).
+    if job_queue is None and pixelizer is None:
         gr.Error("Das Pixelizer‑Modell konnte nicht initialisiert werden.")
         yield None
         return
 
-    try:
-        iterator = pixelizer.pixelize(
-            resized,
-            output_path=str(output_path) if output_path else None,
-        )
+    if group:
+        try:
+            with profiler.stage("detect"):
+                boxes = detect_people(image_rgba)
+        except Exception as e:
+            gr.Error(f"Personenerkennung fehlgeschlagen: {e}")
+            yield None
+            return
+        if len(boxes) > 1:
+            yield from _process_group(image_rgba, boxes, style, profiler)
+            return
+        gr.Info("Keine Gruppe erkannt – das Bild wird als Einzelfoto verarbeitet.")
 
-        # Falls der Pixelizer wider Erwarten nichts liefert, Nutzer informieren
-        got_any = False
-        for image_bytes in iterator:
-            got_any = True
-            try:
-                img = _safe_save_bytes_to_rgba_image(image_bytes)
-            except Exception as chunk_err:
-                # Einzelne fehlerhafte Chunks überspringen; weiter versuchen
-                gr.Warning(f"Ein Zwischenschritt war ungültig: {chunk_err}")
-                continue
-            yield img
-
-        if not got_any:
-            gr.Error("Das Modell hat keine Ausgabe erzeugt.")
+    # Im Queue‑Modus begrenzen die Worker‑Prozesse die Parallelität selbst.
+    admission = nullcontext() if job_queue is not None else load_policy.admit()
+    with admission as ticket:
+        try:
+            if ticket is None:
+                frames = _frames_from_queue(resized, style)
+            else:
+                # Qualitätsstufe abhängig von Warteschlange und Latenz
+                gr.Info(
+                    f"Qualitätsstufe: {ticket.tier.name} "
+                    f"(Warteschlange: {ticket.queue_depth}, "
+                    f"erwartet ~{ticket.predicted_s:.0f} s)"
+                )
+                frames = pixelizer.pixelize(
+                    resized, **_generation_kwargs(ticket.tier, style)
+                )
+
+            if PALETTE_QUANTIZE:
+                frames = _on_palette(frames, style)
+
+            # Der finale Frame bleibt bis zum Sprite-Export im Frame-Budget.
+            with frame_budget.hold() as held:
+                got_any, final_frame = yield from _deliver_frames(
+                    profiler.iterate("generate", frames), held
+                )
+                # Falls der Pixelizer wider Erwarten nichts liefert, Nutzer informieren
+                if got_any:
+                    if ticket is not None:
+                        ticket.succeeded = True
+                    if EXPORT_SPRITES and final_frame is not None:
+                        with profiler.stage("sprite"):
+                            _export_sprite(final_frame)
+                else:
+                    gr.Error("Das Modell hat keine Ausgabe erzeugt.")
+                    yield None
+                    return
+
+        except FileNotFoundError as e:
+            gr.Error(f"Dateifehler während der Pixelisierung: {e}")
+            yield None
+            return
+        except MemoryError:
+            gr.Error("Nicht genügend Speicher während der Verarbeitung.")
             yield None
             return
+        except Exception as e:
+            gr.Error(f"Unerwarteter Fehler bei der Pixelisierung: {e}")
+            yield None
+            return
+
 
-    except FileNotFoundError as e:
-        gr.Error(f"Dateifehler während der Pixelisierung: {e}")
+def _process_group(image_rgba, boxes, style, profiler):
+    """
+    Jede Person einzeln generieren (parallel, höchstens GROUP_MAX_PARALLEL)
+    und nach jeder fertigen Person die bisherige Aufstellung ausliefern.
+    """
+    count = len(boxes)
+    gr.Info(f"Gruppenfoto: {count} Personen erkannt")
+    try:
+        with profiler.stage("resize"):
+            targets = [
+                load_and_resize(_prepare_resized_png_bytes(image_rgba.crop(box)))
+                for box in boxes
+            ]
+    except Exception as e:
+        gr.Error(f"Vorverarbeitung fehlgeschlagen: {e}")
         yield None
         return
-    except MemoryError:
-        gr.Error("Nicht genügend Speicher während der Verarbeitung.")
+
+    # Eine Qualitätsstufe für alle Personen, damit die Figuren zusammenpassen
+    depth = job_queue.depth() if job_queue is not None else None
+    tier, _ = load_policy.select_batch(count, depth)
+    results = [None] * count
+    lineup = None
+    finished = generate_all(
+        targets,
+        lambda target: _generate_person(target, style, tier),
+        GROUP_MAX_PARALLEL,
+    )
+    for index, image_bytes, error in profiler.iterate("generate", finished):
+        if error is not None:
+            gr.Warning(f"Person {index + 1}: Generierung fehlgeschlagen: {error}")
+            continue
+        results[index] = image_bytes
+        done = sum(result is not None for result in results)
+        gr.Info(f"Person {index + 1} fertig ({done}/{count})")
+        try:
+            lineup = assemble_lineup(results)
+        except Exception as e:
+            gr.Warning(f"Aufstellung fehlgeschlagen: {e}")
+            continue
+        yield from _deliver_frames([lineup])
+
+    if lineup is None:
+        gr.Error("Das Modell hat keine Ausgabe erzeugt.")
         yield None
         return
+    output_store.put(lineup)
+
+
+def _generate_person(target: io.BytesIO, style: Optional[str], tier) -> bytes:
+    """
+    Eine Person des Gruppenfotos in der Qualitätsstufe ``tier`` generieren;
+    liefert den finalen Frame.
+    """
+    if job_queue is not None:
+        job_id = job_queue.submit(target.getvalue(), _generation_kwargs(tier, style))
+        final = _final_frame(job_queue.stream(job_id, timeout_s=JOB_TIMEOUT_S))
+    else:
+        with load_policy.admit(tier) as ticket:
+            final = _final_frame(
+                pixelizer.pixelize(target, **_generation_kwargs(tier, style))
+            )
+            ticket.succeeded = True
+    if PALETTE_QUANTIZE:
+        (final,) = _on_palette([final], style)
+    return final
+
+
+def _final_frame(frames: Iterable[bytes]) -> bytes:
+    """Letzter gültiger Frame eines Streams."""
+    final = None
+    for image_bytes in frames:
+        try:
+            _validate_image_bytes(image_bytes)
+        except ValueError:
+            continue
+        final = image_bytes
+    if final is None:
+        raise ValueError("Das Modell hat keine Ausgabe erzeugt.")
+    return final
+
+
+def _denoise_target(resized: io.BytesIO) -> io.BytesIO:
+    """Skaliertes Zielbild auf seine DENOISE_COLORS Hauptfarben reduzieren."""
+    with Image.open(resized) as img:
+        reduced = denoise(img, n_colors=DENOISE_COLORS)
+    return load_and_resize(_prepare_resized_png_bytes(reduced))
+
+
+def _on_palette(frames: Iterable[bytes], style: Optional[str]) -> Iterator[bytes]:
+    """
+    Frames auf die Palette der Referenzen des Stils abbilden. Ohne Palette
+    (z. B. Stil nicht ladbar) werden die Frames unverändert weitergereicht.
+    """
+    try:
+        palette = style_registry.palette(style, n_colors=PALETTE_COLORS)
     except Exception as e:
-        gr.Error(f"Unerwarteter Fehler bei der Pixelisierung: {e}")
-        yield None
+        gr.Warning(f"Palette nicht verfügbar, Ausgabe ungefiltert: {e}")
+        yield from frames
         return
+    for image_bytes in frames:
+        try:
+            yield palette.quantize_png_bytes(image_bytes)
+        except Exception:
+            yield image_bytes  # ungültige Frames meldet _deliver_frames
+
+
+def _generation_kwargs(tier, style: Optional[str]) -> dict:
+    """Pixelizer‑Parameter der Qualitätsstufe, plus Stil falls gewählt."""
+    kwargs = tier.pixelize_kwargs()
+    if style:
+        kwargs["style"] = style
+    return kwargs
+
+
+def _frames_from_queue(resized: io.BytesIO, style: Optional[str]) -> Iterator[bytes]:
+    """
+    Auftrag in die persistente Warteschlange stellen und dessen Frames streamen.
+    Das Ergebnis bleibt unter der Auftrags‑ID abrufbar (GET /jobs/{id} der
+    Pixelizer‑API), auch wenn die Verbindung abbricht.
+    """
+    tier, predicted_s = load_policy.select(job_queue.depth())
+    job_id = job_queue.submit(resized.getvalue(), _generation_kwargs(tier, style))
+    gr.Info(
+        f"Auftrag {job_id}: Qualitätsstufe {tier.name}, erwartet ~{predicted_s:.0f} s"
+        f" (abrufbar unter /jobs/{job_id})"
+    )
+    yield from job_queue.stream(job_id, timeout_s=JOB_TIMEOUT_S)
+
+
+def _deliver_frames(frames: Iterable[bytes], held=None):
+    """
+    Validiert Frames, legt sie als Dateien ab und liefert die Pfade aus.
+    Gibt (got_any, letzter gültiger Frame) zurück.
+
+    ``held`` (aus frame_budget.hold) deckt die gehaltenen Frames ab, auch
+    über das ``yield`` hinweg; der zurückgegebene finale Frame bleibt darin
+    reserviert, bis der Aufrufer den Block verlässt. Ohne ``held`` gilt die
+    Reservierung nur für diesen Aufruf.
+    """
+    if held is None:
+        with frame_budget.hold() as held:
+            return (yield from _deliver_frames(frames, held))
+
+    got_any = False
+    final_frame = None
+    deferred = None  # Frame, für den das Budget nicht rechtzeitig reichte
+    request_id = uuid.uuid4().hex[:12]
+    for index, image_bytes in enumerate(frames):
+        got_any = True
+        deferred = None
+        kept = len(final_frame or b"")
+        try:
+            # Bis zur Prüfung liegen der bisherige und der neue Frame im Speicher
+            held.set(kept + len(image_bytes or b""), timeout=FRAME_BUDGET_TIMEOUT_S)
+        except TimeoutError:
+            # held reserviert weiter den bisherigen Frame. Folgt noch ein
+            # Frame, war dieser nur ein Zwischenschritt und entfällt.
+            deferred = (index, image_bytes)
+            continue
+        if (yield from _deliver_frame(held, image_bytes, request_id, index, kept)):
+            final_frame = image_bytes
+    if deferred is not None:
+        # Das Endergebnis nie wegen des Budgets verwerfen: es liegt ohnehin
+        # im Speicher, die Reservierung darf das Limit kurz überschreiten.
+        index, image_bytes = deferred
+        kept = len(final_frame or b"")
+        held.force(kept + len(image_bytes or b""))
+        if (yield from _deliver_frame(held, image_bytes, request_id, index, kept)):
+            final_frame = image_bytes
+    return got_any, final_frame
+
+
+def _deliver_frame(held, image_bytes, request_id, index, kept):
+    """
+    Prüft einen Frame, dessen Größe ``held`` bereits enthält, legt ihn als
+    Datei ab und liefert den Pfad aus. Gibt zurück, ob er gültig war; danach
+    reserviert ``held`` nur noch den gültigen Frame (bzw. wieder ``kept``).
+    """
+    try:
+        _validate_image_bytes(image_bytes)
+        frame_path = _write_frame(image_bytes, request_id, index)
+    except Exception as chunk_err:
+        held.set(kept)
+        # Einzelne fehlerhafte Chunks überspringen; weiter versuchen
+        gr.Warning(f"Ein Zwischenschritt war ungültig: {chunk_err}")
+        return False
+    held.set(len(image_bytes))
+    try:
+        yield str(frame_path)
+    finally:
+        # Gradio hat den Frame beim Weiterlaufen bereits übernommen.
+        frame_path.unlink(missing_ok=True)
+    return True
+
+
+def _style_choices():
+    """Aktuelle Stil-Liste beim Laden der Seite (neue Stile ohne Neustart)."""
+    return gr.update(choices=style_registry.names())
 
 
 def safe_reset() -> Tuple[None, None]:
@@ -308,6 +599,7 @@ with gr.Blocks(
             with gr.Row(elem_classes=["equal"]):
                 pixel_display = gr.Image(
                     elem_id="img_out",
+                    type="filepath",
                     interactive=False,
                     height=700,
                     width=466,
@@ -315,28 +607,42 @@ with gr.Blocks(
 
     # Controls row beneath the stage (outside of the grid)
     with gr.Row(elem_id="ctrls", elem_classes=["panel"]):
+        style_names = style_registry.names()
+        style_select = gr.Dropdown(
+            choices=style_names,
+            value=(
+                style_registry.default
+                if style_registry.default in style_names
+                else None
+            ),
+            label="Stil",
+            scale=0,
+        )
+        group_mode = gr.Checkbox(label="Gruppenfoto", value=False, scale=0)
         pixelize_btn = gr.Button("Pixelize", variant="primary")
         reset_btn = gr.Button("Reset", variant="secondary")
 
     # Bind actions (robust)
-    pixelize_btn.click(fn=process_image, inputs=orig_display, outputs=pixel_display)
+    # Parallelität begrenzt load_policy selbst, damit es die Warteschlange sieht.
+    pixelize_btn.click(
+        fn=process_image,
+        inputs=[orig_display, style_select, group_mode],
+        outputs=pixel_display,
+        concurrency_limit=None,
+    )
     reset_btn.click(fn=safe_reset, outputs=[orig_display, pixel_display])
+    pixelator.load(fn=_style_choices, outputs=style_select)
 
-# Launch the application when run directly
+# Launch the application when run directly: Gradio unter FastAPI, damit
+# /healthz, /readyz und der Drain bei SIGTERM zur Verfügung stehen.
 if __name__ == "__main__":
-    try:
-        pixelator.launch(
-            share=False,
-            server_name="0.0.0.0",
-            server_port=int(os.environ.get("PORT", 7860)),
-            favicon_path="https://www.cologne-intelligence.de/frontend/favicons/apple-touch-icon.png",
-        )
-    except OSError as e:
-        # Falls Port belegt ist – automatischer Fallback
-        gr.Warning(f"Standardport belegt, weiche auf Port 0 aus: {e}")
-        pixelator.launch(
-            share=False,
-            server_name="0.0.0.0",
-            server_port=0,
-            favicon_path="https://www.cologne-intelligence.de/frontend/favicons/apple-touch-icon.png",
-        )
+    logging.basicConfig(level=logging.INFO)
+    app = FastAPI()
+    add_health_routes(app, lifecycle)
+    app = gr.mount_gradio_app(
+        app,
+        pixelator,
+        path="/",
+        favicon_path="https://www.cologne-intelligence.de/frontend/favicons/apple-touch-icon.png",
+    )
+    serve(app, lifecycle, host="0.0.0.0", port=int(os.environ.get("PORT", 7860)))
@@ -29,12 +29,15 @@ def tiny_png_bytes(tiny_rgba_image):
 @pytest.fixture
 def warnings_sink(monkeypatch):
     """
-    Fängt gr.Warning / gr.Error ab, damit wir sie prüfen können,
+    Fängt gr.Info / gr.Warning / gr.Error ab, damit wir sie prüfen können,
     ohne echte UI‑Toasts zu erzeugen.
     """
     import gradio as gr
 
     msgs = []
+    monkeypatch.setattr(
+        gr, "Info", lambda m: msgs.append(("info", str(m))), raising=False
+    )
     monkeypatch.setattr(
         gr, "Warning", lambda m: msgs.append(("warning", str(m))), raising=False
     )
@@ -0,0 +1,95 @@
+import base64
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from inline_snapshot import snapshot
+
+import pixelizer_api as api
+
+
+def _parse_sse(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture
+def client(monkeypatch, tiny_png_bytes):
+    class FakePixelizer:
+        def pixelize(self, target, output_path=None, **kwargs):
+            yield tiny_png_bytes
+            yield b"not-a-png"
+            yield tiny_png_bytes
+
+    monkeypatch.setattr(api, "pixelizer", FakePixelizer())
+    monkeypatch.setattr(api, "load_policy", api.LoadPolicy(slo_s=60))
+    return TestClient(api.app)
+
+
+def test_sse_streams_frames_and_done(client, tiny_png_bytes):
+    resp = client.post("/pixelize", files={"image": ("in.png", tiny_png_bytes)})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = _parse_sse(resp.text)
+    assert [name for name, _ in events] == snapshot(
+        ["tier", "frame", "warning", "frame", "done"]
+    )
+    assert events[0][1] == snapshot(
+        {"name": "voll", "queue_depth": 0, "predicted_s": 45.0}
+    )
+    assert base64.b64decode(events[3][1]["png"]) == tiny_png_bytes
+    assert events[-1][1] == snapshot({"frames": 2})
+
+
+def test_multipart_stream_contains_png_parts(client, tiny_png_bytes):
+    resp = client.post(
+        "/pixelize?format=multipart", files={"image": ("in.png", tiny_png_bytes)}
+    )
+    assert resp.headers["content-type"] == snapshot(
+        "multipart/x-mixed-replace; boundary=pixelizer-frame"
+    )
+    assert resp.content.count(tiny_png_bytes) == snapshot(2)
+    assert resp.content.endswith(b"--pixelizer-frame--\r\n")
+
+
+def test_invalid_upload_is_rejected_before_generation(client):
+    resp = client.post("/pixelize", files={"image": ("in.png", b"garbage")})
+    assert resp.status_code == snapshot(400)
+    assert "kein gültiges Bild" in resp.json()["detail"]
+
+
+def test_oversized_upload(client, monkeypatch):
+    monkeypatch.setattr(api, "MAX_INPUT_BYTES", 10)
+    resp = client.post("/pixelize", files={"image": ("in.png", b"x" * 11)})
+    assert resp.status_code == snapshot(413)
+
+
+def test_model_not_initialized(client, monkeypatch, tiny_png_bytes):
+    monkeypatch.setattr(api, "pixelizer", None)
+    resp = client.post("/pixelize", files={"image": ("in.png", tiny_png_bytes)})
+    assert resp.status_code == snapshot(503)
+
+
+def test_job_stream_resumes_after_last_frame(monkeypatch, tmp_path, tiny_png_bytes):
+    queue = api.JobQueue(tmp_path / "jobs.sqlite3")
+    monkeypatch.setattr(api, "job_queue", queue)
+    client = TestClient(api.app)
+    job_id = queue.submit(b"target")
+    queue.claim("w")
+    queue.add_frame(job_id, "w", b"partial")
+    queue.add_frame(job_id, "w", tiny_png_bytes)
+    queue.complete(job_id, "w")
+
+    events = _parse_sse(client.get(f"/jobs/{job_id}").text)
+    assert [name for name, _ in events] == snapshot(["status", "frame", "done"])
+    assert events[0][1] == snapshot({"status": "done", "attempts": 1})
+    assert base64.b64decode(events[1][1]["png"]) == tiny_png_bytes
+
+    after = events[1][1]["index"]
+    events = _parse_sse(client.get(f"/jobs/{job_id}?after={after}").text)
+    assert events[-1] == snapshot(("done", {"frames": 0}))
+    assert client.get("/jobs/unbekannt").status_code == snapshot(404)
@@ -0,0 +1,214 @@
+import base64
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from openai import InternalServerError
+from PIL import Image
+from inline_snapshot import snapshot
+
+from gpt_model.pixelizer_model import Pixelizer
+from util.deployment_pool import (
+    AllThrottled,
+    Deployment,
+    DeploymentPool,
+    load_deployments,
+)
+
+
+def _pool(*weights, **kwargs):
+    deployments = [
+        Deployment(f"https://d{i}.example", "key", "gpt-image-1", weight=w)
+        for i, w in enumerate(weights)
+    ]
+    return DeploymentPool(deployments, lambda d: d.endpoint, **kwargs), deployments
+
+
+def test_lease_prefers_least_outstanding_weighted():
+    pool, (a, b) = _pool(2.0, 1.0)
+    with pool.lease() as first, pool.lease() as second, pool.lease() as third:
+        # a hat doppeltes Gewicht: zwei offene Anfragen zählen wie eine bei b
+        assert [first.deployment, second.deployment, third.deployment] == [a, b, a]
+        assert [s["outstanding"] for s in pool.stats()] == [2, 1]
+    assert [s["outstanding"] for s in pool.stats()] == [0, 0]
+
+
+def test_lease_prefers_lower_observed_latency():
+    pool, (a, b) = _pool(1.0, 1.0, prior_latency_s=0.0, alpha=1.0)
+    with pool.lease() as lease:
+        time.sleep(0.05)  # a ist langsam
+        lease.succeeded = True
+    with pool.lease() as lease:
+        lease.succeeded = True
+    with pool.lease() as lease:
+        assert lease.deployment == b
+    stats = pool.stats()
+    assert stats[0]["latency_s"] >= 0.05
+    assert [s["completed"] for s in stats] == [1, 1]
+    assert [s["failed"] for s in stats] == [0, 1]
+
+
+def test_throttled_deployment_cools_down():
+    pool, (a, b) = _pool(1.0, 1.0, cooldown_s=0.1)
+    pool.throttle(a)
+    for _ in range(3):
+        with pool.lease() as lease:
+            assert lease.deployment == b
+    with pytest.raises(AllThrottled):
+        with pool.lease(exclude={b}):
+            pass
+    time.sleep(0.12)
+    with pool.lease(exclude={b}) as lease:
+        assert lease.deployment == a
+    assert pool.stats()[0]["throttled"] == 1
+
+
+def test_load_deployments_reads_keys_from_env(monkeypatch):
+    monkeypatch.setenv("KEY_A", "geheim")
+    spec = json.dumps(
+        [{"endpoint": "https://a.example", "api_key_env": "KEY_A", "deployment": "x"}]
+    )
+    assert load_deployments(spec) == [Deployment("https://a.example", "geheim", "x")]
+    monkeypatch.delenv("KEY_A")
+    with pytest.raises(ValueError):
+        load_deployments(spec)
+
+
+# ---------- Pixelizer gegen lokale Azure-Stubs ----------
+
+
+def _png(color, size=(8, 8)):
+    buf = io.BytesIO()
+    Image.new("RGBA", size, color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+FINAL = _png((0, 0, 255, 255))
+
+
+def _stub(latency_s, throttle=False, fail=False):
+    """
+    Azure images/edits stub streaming one completed event after ``latency_s``;
+    answers 429 with ``throttle`` and 500 with ``fail``.
+    """
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            hits.append(self.path)
+            if throttle:
+                data = json.dumps({"error": {"message": "quota", "code": "429"}})
+                self.send_response(429)
+                self.send_header("Retry-After", "30")
+            elif fail:
+                data = json.dumps({"error": {"message": "internal", "code": "500"}})
+                self.send_response(500)
+            else:
+                time.sleep(latency_s)
+                event = {
+                    "type": "image_edit.completed",
+                    "b64_json": base64.b64encode(FINAL).decode(),
+                    "created_at": 1,
+                }
+                data = f"event: image_edit.completed\ndata: {json.dumps(event)}\n\n"
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+            data = data.encode()
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = f"http://127.0.0.1:{server.server_port}"
+    return server, endpoint, hits
+
+
+@pytest.fixture
+def stubs(tmp_path):
+    servers = []
+
+    def start(*specs):
+        started = [_stub(*spec) for spec in specs]
+        servers.extend(server for server, _, _ in started)
+        return [(endpoint, hits) for _, endpoint, hits in started]
+
+    for i in range(2):
+        Image.new("RGBA", (40, 60), (40 * i, 80, 120, 255)).save(
+            tmp_path / f"ref{i + 1}.png"
+        )
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def _pixelizer(tmp_path, endpoints, **kwargs):
+    deployments = [
+        Deployment(endpoint, "key", f"dep{i}", name=f"d{i}")
+        for i, endpoint in enumerate(endpoints)
+    ]
+    return Pixelizer(
+        ref_dir=str(tmp_path), ref_count=2, deployments=deployments, **kwargs
+    )
+
+
+def test_requests_shift_to_the_faster_deployment(tmp_path, stubs):
+    (fast, fast_hits), (slow, slow_hits) = stubs((0.01,), (0.2,))
+    px = _pixelizer(tmp_path, [fast, slow])
+    px.pool.alpha = 1.0
+
+    def run(_):
+        return list(px.pixelize(io.BytesIO(_png((255, 0, 0, 255)))))
+
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(run, range(24)))
+    assert all(frames == [FINAL] for frames in results)
+    assert fast_hits[0] == snapshot(
+        "/openai/deployments/dep0/images/edits?api-version=2025-04-01-preview"
+    )
+    assert len(fast_hits) > 2 * len(slow_hits)
+    stats = px.stats()["deployments"]
+    assert [s["name"] for s in stats] == ["d0", "d1"]
+    assert sum(s["completed"] for s in stats) == 24
+    assert stats[0]["latency_s"] < stats[1]["latency_s"]
+    assert all(0 < s["utilization"] <= 1 for s in stats)
+
+
+def test_quota_exhausted_deployment_is_skipped(tmp_path, stubs):
+    (full, full_hits), (ok, ok_hits) = stubs((0.0, True), (0.0,))
+    px = _pixelizer(tmp_path, [full, ok])
+
+    for _ in range(3):
+        assert list(px.pixelize(io.BytesIO(_png((255, 0, 0, 255))))) == [FINAL]
+    # Ein 429 (ohne SDK-Retries), danach Pause laut Retry-After
+    assert (len(full_hits), len(ok_hits)) == (1, 3)
+    throttled, _ = px.stats()["deployments"]
+    assert throttled["throttled"] == 1 and throttled["cooldown_s"] > 25
+
+
+def test_server_errors_fail_over_to_the_next_deployment(tmp_path, stubs):
+    (broken, broken_hits), (ok, ok_hits) = stubs((0.0, False, True), (0.0,))
+    px = _pixelizer(tmp_path, [broken, ok])
+
+    assert list(px.pixelize(io.BytesIO(_png((255, 0, 0, 255))))) == [FINAL]
+    # Ein Versuch je Deployment, keine SDK-Retries
+    assert (len(broken_hits), len(ok_hits)) == (1, 1)
+    failed, succeeded = px.stats()["deployments"]
+    assert (failed["failed"], failed["throttled"]) == snapshot((1, 0))
+    assert succeeded["completed"] == snapshot(1)
+
+
+def test_server_error_is_raised_when_every_deployment_fails(tmp_path, stubs):
+    (a, a_hits), (b, b_hits) = stubs((0.0, False, True), (0.0, False, True))
+    px = _pixelizer(tmp_path, [a, b])
+    with pytest.raises(InternalServerError):
+        list(px.pixelize(io.BytesIO(_png((255, 0, 0, 255)))))
+    assert (len(a_hits), len(b_hits)) == (1, 1)
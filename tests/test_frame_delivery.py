@@ -0,0 +1,158 @@
+import io
+import os
+import threading
+import tracemalloc
+
+import pytest
+from PIL import Image
+from inline_snapshot import snapshot
+
+import pixelizer_ci as mod
+from util.frame_budget import FrameBudget
+
+# Budget für Python‑Allokationen pro Anfrage (ohne die Frames selbst, die der
+# Fake‑Pixelizer schon vorher hält). Dekodierte RGBA‑Frames wären je ~6 MB.
+PEAK_BUDGET_BYTES = 2 * 1024 * 1024
+
+
+@pytest.fixture(scope="module")
+def full_size_frames():
+    frames = []
+    for _ in range(2):
+        img = Image.frombytes("RGBA", (1024, 1536), os.urandom(1024 * 1536 * 4))
+        buf = io.BytesIO()
+        img.save(buf, format="PNG", compress_level=1)
+        frames.append(buf.getvalue())
+    return frames
+
+
+@pytest.fixture
+def fake_flow(tmp_path, monkeypatch, tiny_rgba_image, full_size_frames, warnings_sink):
+    src = tmp_path / "in.png"
+    tiny_rgba_image.save(src, format="PNG")
+    monkeypatch.setattr(mod, "load_and_resize", lambda buf: tiny_rgba_image)
+    monkeypatch.setattr(mod, "FRAME_DIR", tmp_path / "frames")
+    (tmp_path / "frames").mkdir()
+
+    class FakePixelizer:
+        def pixelize(self, pil_img, output_path=None, **kwargs):
+            yield from full_size_frames
+
+    monkeypatch.setattr(mod, "pixelizer", FakePixelizer())
+    return src
+
+
+def test_frames_are_delivered_as_files_and_cleaned_up(fake_flow, tmp_path):
+    seen = []
+    for path in mod.process_image(str(fake_flow)):
+        assert isinstance(path, str)
+        with Image.open(path) as im:
+            seen.append(im.size)
+    assert seen == snapshot([(1024, 1536), (1024, 1536)])
+    assert list((tmp_path / "frames").iterdir()) == []
+
+
+def test_peak_memory_per_request_stays_under_budget(fake_flow):
+    """
+    tracemalloc sieht nur Python‑Allokationen (PILs Pixelpuffer nicht), daher
+    prüft der erste Test zusätzlich, dass keine PIL‑Bilder geliefert werden.
+    """
+    tracemalloc.start()
+    try:
+        for _ in mod.process_image(str(fake_flow)):
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < PEAK_BUDGET_BYTES
+
+
+def test_frame_budget_waits_for_release():
+    budget = FrameBudget(100)
+    entered = threading.Event()
+
+    def second():
+        with budget.reserve(60, timeout=5):
+            entered.set()
+
+    with budget.reserve(60):
+        t = threading.Thread(target=second)
+        t.start()
+        assert entered.wait(0.1) == snapshot(False)
+    assert entered.wait(5) == snapshot(True)
+    t.join()
+    assert budget.stats() == snapshot({"used": 0, "peak": 60, "max": 100})
+
+
+def test_frame_budget_admits_oversized_frame_when_idle_and_times_out_otherwise():
+    budget = FrameBudget(10)
+    with budget.reserve(50):
+        with pytest.raises(TimeoutError):
+            with budget.reserve(1, timeout=0.01):
+                pass
+
+
+def test_frame_budget_hold_resizes_and_releases():
+    budget = FrameBudget(100)
+    with budget.hold() as held:
+        held.set(30)
+        held.set(80)
+        assert budget.stats()["used"] == snapshot(80)
+        held.set(20)  # verkleinern wartet nie
+        assert budget.stats()["used"] == snapshot(20)
+    assert budget.stats() == snapshot({"used": 0, "peak": 80, "max": 100})
+
+
+def test_held_frames_block_concurrent_handlers(
+    fake_flow, full_size_frames, monkeypatch
+):
+    # Platz für genau einen Frame: ein zweiter Handler muss warten, solange
+    # der erste seinen Frame (auch über das yield hinweg) noch hält.
+    budget = FrameBudget(len(full_size_frames[0]) * 3 // 2)
+    monkeypatch.setattr(mod, "frame_budget", budget)
+
+    first = mod.process_image(str(fake_flow))
+    assert next(first) is not None
+    assert budget.stats()["used"] == len(full_size_frames[0])
+
+    second_got_frame = threading.Event()
+
+    def second():
+        for path in mod.process_image(str(fake_flow)):
+            if path is not None:
+                second_got_frame.set()
+
+    t = threading.Thread(target=second)
+    t.start()
+    assert second_got_frame.wait(0.3) == snapshot(False)
+
+    for _ in first:
+        pass
+    assert second_got_frame.wait(5) == snapshot(True)
+    t.join(5)
+    assert budget.stats()["used"] == 0
+
+
+def test_held_set_keeps_the_old_reservation_on_timeout():
+    budget = FrameBudget(100)
+    with budget.hold() as held, budget.reserve(60):
+        held.set(30)
+        with pytest.raises(TimeoutError):
+            held.set(50, timeout=0.01)
+        assert (held.nbytes, budget.stats()["used"]) == snapshot((30, 90))
+
+
+def test_budget_timeout_on_the_last_frame_still_delivers_it(
+    fake_flow, full_size_frames, monkeypatch, warnings_sink
+):
+    budget = FrameBudget(len(full_size_frames[0]))
+    monkeypatch.setattr(mod, "frame_budget", budget)
+    monkeypatch.setattr(mod, "FRAME_BUDGET_TIMEOUT_S", 0.01)
+
+    # Ein anderer Handler belegt das ganze Budget: beide Frames laufen in
+    # den Timeout, der Zwischenschritt entfällt, das Ergebnis nicht.
+    with budget.reserve(budget.max_bytes):
+        paths = [path for path in mod.process_image(str(fake_flow)) if path]
+        assert len(paths) == 1
+        assert budget.stats()["used"] == budget.max_bytes
+    assert not [m for kind, m in warnings_sink if kind != "info"]
@@ -0,0 +1,155 @@
+import io
+import threading
+import time
+
+import pytest
+from PIL import Image
+from inline_snapshot import snapshot
+
+import pixelizer_ci as mod
+from util.group_photo import assemble_lineup, generate_all, person_boxes
+
+
+def _character(color, height=60):
+    img = Image.new("RGB", (60, 90), (211, 211, 211))
+    img.paste(color, (20, 90 - height - 5, 40, 85))
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def test_person_boxes_split_between_neighbours():
+    faces = [(100, 50, 40, 40), (10, 60, 40, 40)]
+    assert person_boxes(faces, (200, 300)) == snapshot(
+        [(0, 36, 75, 300), (75, 26, 180, 300)]
+    )
+
+
+def test_generate_all_runs_concurrently_and_reports_each():
+    def generate(item):
+        time.sleep(0.2)
+        if item == "boom":
+            raise RuntimeError(item)
+        return item.upper()
+
+    start = time.perf_counter()
+    results = list(generate_all(["a", "boom", "c", "d"], generate, max_parallel=4))
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.35
+    assert sorted((i, r) for i, r, e in results if e is None) == snapshot(
+        [(0, "A"), (2, "C"), (3, "D")]
+    )
+    assert [str(e) for _, _, e in results if e is not None] == snapshot(["boom"])
+
+
+def test_generate_all_respects_cap():
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def generate(item):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return item
+
+    assert len(list(generate_all(range(6), generate, max_parallel=2))) == 6
+    assert peak[0] == 2
+
+
+def test_lineup_is_bottom_aligned_and_skips_missing():
+    lineup = Image.open(
+        io.BytesIO(
+            assemble_lineup(
+                [_character((255, 0, 0), 60), None, _character((0, 0, 255), 30)],
+                gap=10,
+                margin=5,
+            )
+        )
+    )
+    assert lineup.size == snapshot((60, 70))
+    assert lineup.getpixel((10, 64)) == snapshot((255, 0, 0))
+    assert lineup.getpixel((40, 64)) == snapshot((0, 0, 255))
+    assert lineup.getpixel((40, 10)) == snapshot((211, 211, 211))
+
+
+def test_process_image_group_mode_streams_growing_lineup(
+    tmp_path, monkeypatch, warnings_sink
+):
+    src = tmp_path / "group.png"
+    Image.new("RGB", (300, 200), "white").save(src)
+    boxes = [(0, 0, 100, 200), (100, 0, 200, 200), (200, 0, 300, 200)]
+    monkeypatch.setattr(mod, "detect_people", lambda image: boxes)
+    colors = iter([(255, 0, 0), (0, 255, 0), (0, 0, 255)])
+    lock = threading.Lock()
+
+    class SlowPixelizer:
+        def pixelize(self, target, output_path=None, **kwargs):
+            with lock:
+                color = next(colors)
+            time.sleep(0.2)
+            yield _character(color)
+
+    monkeypatch.setattr(mod, "pixelizer", SlowPixelizer())
+    monkeypatch.setattr(mod, "load_policy", mod.LoadPolicy(concurrency=4))
+
+    widths = []
+    start = time.perf_counter()
+    for frame in mod.process_image(str(src), group=True):
+        with Image.open(frame) as img:
+            widths.append(img.width)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.5
+    assert widths == sorted(widths) and len(widths) == 3
+    infos = [m for k, m in warnings_sink if k == "info"]
+    assert infos[0] == snapshot("Gruppenfoto: 3 Personen erkannt")
+    assert sum("fertig" in m for m in infos) == 3
+
+
+def test_group_members_share_one_tier(tmp_path, monkeypatch, warnings_sink):
+    src = tmp_path / "group.png"
+    Image.new("RGB", (300, 200), "white").save(src)
+    boxes = [(0, 0, 100, 200), (100, 0, 200, 200), (200, 0, 300, 200)]
+    monkeypatch.setattr(mod, "detect_people", lambda image: boxes)
+    qualities = []
+
+    class RecordingPixelizer:
+        def pixelize(self, target, output_path=None, **kwargs):
+            qualities.append(kwargs["quality"])
+            yield _character((255, 0, 0))
+
+    monkeypatch.setattr(mod, "pixelizer", RecordingPixelizer())
+    # Mit nur einem Slot hätte jede Person eine andere Warteschlange gesehen
+    monkeypatch.setattr(mod, "load_policy", mod.LoadPolicy(slo_s=60, concurrency=1))
+    list(mod.process_image(str(src), group=True))
+    assert qualities == snapshot(["low", "low", "low"])
+
+
+def test_process_image_group_mode_falls_back_to_single(
+    tmp_path, monkeypatch, warnings_sink, tiny_png_bytes
+):
+    src = tmp_path / "one.png"
+    Image.new("RGB", (100, 200), "white").save(src)
+    monkeypatch.setattr(mod, "detect_people", lambda image: [(0, 0, 100, 200)])
+
+    class FakePixelizer:
+        def pixelize(self, target, output_path=None, **kwargs):
+            yield tiny_png_bytes
+
+    monkeypatch.setattr(mod, "pixelizer", FakePixelizer())
+    assert len(list(mod.process_image(str(src), group=True))) == 1
+    assert (
+        "info",
+        "Keine Gruppe erkannt – das Bild wird als Einzelfoto verarbeitet.",
+    ) in warnings_sink
+
+
+def test_detect_faces_on_blank_image():
+    pytest.importorskip("cv2")
+    from util.group_photo import detect_people
+
+    assert detect_people(Image.new("RGB", (320, 240), "white")) == []
@@ -0,0 +1,197 @@
+import io
+import threading
+import time
+
+import pytest
+from PIL import Image
+from inline_snapshot import snapshot
+
+from job_worker import process_job, run_worker
+from util.job_queue import JobQueue
+
+
+class FakePixelizer:
+    def __init__(self, frames, fail_times=0):
+        self.frames = frames
+        self.fail_times = fail_times
+        self.calls = []
+
+    def pixelize(self, target, **kwargs):
+        self.calls.append((target.getvalue(), kwargs))
+        if self.fail_times:
+            self.fail_times -= 1
+            raise RuntimeError("API down")
+        yield from self.frames
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(tmp_path / "jobs.sqlite3", retry_delay_s=0)
+
+
+@pytest.fixture
+def worker(queue):
+    threads = []
+    stop = threading.Event()
+
+    def start(pixelizer):
+        t = threading.Thread(
+            target=run_worker,
+            args=(queue, pixelizer),
+            kwargs={"worker_id": "w1", "poll_s": 0.01, "stop_event": stop},
+        )
+        t.start()
+        threads.append(t)
+
+    yield start
+    stop.set()
+    for t in threads:
+        t.join(5)
+
+
+def test_job_roundtrip_streams_frames_and_keeps_final(queue, worker):
+    job_id = queue.submit(b"target", {"quality": "low"})
+    pixelizer = FakePixelizer([b"p1", b"p2", b"final"])
+    worker(pixelizer)
+
+    frames = list(queue.stream(job_id, poll_s=0.01, timeout_s=5))
+    assert frames[-1] == b"final"
+    assert pixelizer.calls == snapshot([(b"target", {"quality": "low"})])
+    job = queue.get(job_id)
+    assert (job.status, job.attempts) == snapshot(("done", 1))
+    # nach Abschluss bleibt nur der finale Frame gespeichert
+    assert [data for _, data in queue.frames(job_id)] == snapshot([b"final"])
+
+
+def test_jobs_survive_reopening_the_database(tmp_path):
+    job_id = JobQueue(tmp_path / "q.sqlite3").submit(b"t")
+    reopened = JobQueue(tmp_path / "q.sqlite3")
+    assert reopened.get(job_id).status == snapshot("queued")
+    assert reopened.claim("w").id == job_id
+
+
+def test_expired_lease_is_reclaimed_by_another_worker(tmp_path):
+    queue = JobQueue(tmp_path / "q.sqlite3", visibility_timeout_s=0.05)
+    job_id = queue.submit(b"t")
+    assert queue.claim("dead-worker").id == job_id
+    assert queue.claim("w2") is None
+    time.sleep(0.1)
+
+    job = queue.claim("w2")
+    assert (job.id, job.attempts) == (job_id, 2)
+    # der alte Worker hat keinen Lease mehr
+    assert queue.add_frame(job_id, "dead-worker", b"x") == snapshot(False)
+    assert queue.add_frame(job_id, "w2", b"x") == snapshot(True)
+
+
+class SlowPixelizer:
+    def __init__(self, delay_s):
+        self.delay_s = delay_s
+
+    def pixelize(self, target, **kwargs):
+        time.sleep(self.delay_s)
+        yield b"final"
+
+
+def test_heartbeat_keeps_the_lease_of_a_slow_job(tmp_path):
+    queue = JobQueue(tmp_path / "q.sqlite3", visibility_timeout_s=0.15)
+    job_id = queue.submit(b"t")
+    job = queue.claim("w1")
+    stolen = []
+
+    def poll_other_worker():
+        for _ in range(10):
+            time.sleep(0.05)
+            stolen.append(queue.claim("w2"))
+
+    t = threading.Thread(target=poll_other_worker)
+    t.start()
+
+    # pixelize dauert doppelt so lange wie der Lease ohne Heartbeat
+    assert process_job(queue, SlowPixelizer(0.3), job, "w1") is True
+    t.join()
+    assert stolen == [None] * 10
+    job = queue.get(job_id)
+    assert (job.status, job.attempts) == ("done", 1)
+
+
+def test_failures_are_retried_until_max_attempts(queue, worker):
+    ok_id = queue.submit(b"a", max_attempts=2)
+    worker(FakePixelizer([b"done"], fail_times=1))
+    assert list(queue.stream(ok_id, poll_s=0.01, timeout_s=5))[-1] == b"done"
+    assert queue.get(ok_id).attempts == snapshot(2)
+
+
+def test_failed_job_raises_in_stream(queue):
+    job_id = queue.submit(b"a", max_attempts=1)
+    queue.claim("w")
+    queue.fail(job_id, "w", "kaputt")
+    with pytest.raises(RuntimeError, match="kaputt"):
+        list(queue.stream(job_id, poll_s=0.01))
+    assert queue.depth() == snapshot(0)
+
+
+def _target_size(queue, job_id):
+    with queue._conn() as conn:
+        return conn.execute(
+            "SELECT LENGTH(target) FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()[0]
+
+
+def test_target_is_dropped_once_finished(queue):
+    done_id = queue.submit(b"target")
+    failed_id = queue.submit(b"target", max_attempts=1)
+    queue.claim("w")
+    queue.add_frame(done_id, "w", b"final")
+    queue.complete(done_id, "w")
+    queue.claim("w")
+    queue.fail(failed_id, "w", "kaputt")
+    assert _target_size(queue, done_id) == snapshot(0)
+    assert _target_size(queue, failed_id) == snapshot(0)
+
+
+def test_worker_purges_old_jobs(queue):
+    old_id = queue.submit(b"a")
+    queue.claim("w")
+    queue.complete(old_id, "w")
+    time.sleep(0.05)
+    new_id = queue.submit(b"b")
+    stop = threading.Event()
+    t = threading.Thread(
+        target=run_worker,
+        args=(queue, FakePixelizer([b"final"]), "w"),
+        kwargs={"poll_s": 0.01, "stop_event": stop, "retention_s": 0.01},
+    )
+    t.start()
+    try:
+        assert list(queue.stream(new_id, poll_s=0.01, timeout_s=5)) == [b"final"]
+    finally:
+        stop.set()
+        t.join(5)
+
+    with pytest.raises(KeyError):
+        queue.get(old_id)
+    assert queue.get(new_id).status == snapshot("done")
+
+
+def test_process_image_via_queue(
+    tmp_path, monkeypatch, queue, worker, tiny_rgba_image, tiny_png_bytes, warnings_sink
+):
+    import pixelizer_ci as mod
+
+    src = tmp_path / "in.png"
+    tiny_rgba_image.save(src, format="PNG")
+    monkeypatch.setattr(mod, "load_and_resize", lambda buf: io.BytesIO(tiny_png_bytes))
+    monkeypatch.setattr(mod, "job_queue", queue)
+    monkeypatch.setattr(mod, "pixelizer", None)
+    pixelizer = FakePixelizer([tiny_png_bytes, tiny_png_bytes])
+    worker(pixelizer)
+
+    sizes = []
+    for path in mod.process_image(str(src)):
+        with Image.open(path) as im:
+            sizes.append(im.size)
+    assert sizes[-1] == (10, 10)
+    assert pixelizer.calls[0][1]["quality"] == snapshot("medium")
+    assert any(k == "info" and "Auftrag" in m for k, m in warnings_sink)
+    assert not any(k == "error" for k, _ in warnings_sink)
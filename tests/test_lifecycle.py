@@ -0,0 +1,168 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from inline_snapshot import snapshot
+
+import pixelizer_api as api
+import pixelizer_ci as mod
+from util.lifecycle import Draining, Lifecycle, add_health_routes
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _hold(lifecycle, seconds):
+    def run():
+        with lifecycle.track():
+            time.sleep(seconds)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    time.sleep(0.05)
+    return thread
+
+
+def test_drain_waits_for_running_requests_and_rejects_new_ones():
+    lifecycle = Lifecycle(drain_timeout_s=5)
+    lifecycle.mark_ready()
+    thread = _hold(lifecycle, 0.3)
+
+    reports = []
+    drainer = threading.Thread(target=lambda: reports.append(lifecycle.drain()))
+    drainer.start()
+    time.sleep(0.1)
+    with pytest.raises(Draining):
+        with lifecycle.track():
+            pass
+    drainer.join()
+    thread.join()
+    report = reports[0]
+
+    assert 0.2 < report["drain_s"] < 1
+    assert {k: v for k, v in report.items() if k != "drain_s"} == snapshot(
+        {"in_flight_at_start": 1, "completed": 1, "dropped": 0, "rejected": 1}
+    )
+
+
+def test_drain_deadline_counts_dropped_requests():
+    lifecycle = Lifecycle(drain_timeout_s=0.1)
+    thread = _hold(lifecycle, 0.5)
+    report = lifecycle.drain()
+    assert report["dropped"] == snapshot(1)
+    assert report["drain_s"] < 0.3
+    thread.join()
+
+
+def test_health_routes_follow_checks_and_drain():
+    lifecycle = Lifecycle()
+    backend = {"loaded": False}
+    lifecycle.add_check("backend", lambda: backend["loaded"])
+    app = FastAPI()
+    add_health_routes(app, lifecycle)
+    client = TestClient(app)
+
+    assert client.get("/readyz").status_code == 503  # startet noch
+    lifecycle.mark_ready()
+    resp = client.get("/readyz")
+    assert (resp.status_code, resp.json()["checks"]) == snapshot(
+        (503, {"backend": "nicht bereit"})
+    )
+    backend["loaded"] = True
+    assert client.get("/readyz").status_code == 200
+
+    lifecycle.stop_accepting()
+    assert client.get("/readyz").status_code == 503
+    assert client.get("/healthz").status_code == 200
+
+
+def test_process_image_refuses_work_while_draining(
+    tmp_path, monkeypatch, warnings_sink
+):
+    lifecycle = Lifecycle()
+    lifecycle.drain()
+    monkeypatch.setattr(mod, "lifecycle", lifecycle)
+    assert list(mod.process_image(str(tmp_path / "x.png"))) == [None]
+    assert warnings_sink == snapshot(
+        [("warning", "Der Server wird gerade neu gestartet – bitte erneut versuchen.")]
+    )
+
+
+def test_api_returns_503_while_draining(monkeypatch, tiny_png_bytes):
+    lifecycle = Lifecycle()
+    lifecycle.drain()
+    monkeypatch.setattr(api, "lifecycle", lifecycle)
+    monkeypatch.setattr(api, "pixelizer", object())
+    resp = TestClient(api.app).post(
+        "/pixelize", files={"image": ("in.png", tiny_png_bytes)}
+    )
+    assert resp.status_code == 503
+
+
+SERVER = """
+import json, sys, time
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from util.lifecycle import Lifecycle, add_health_routes, serve
+
+lifecycle = Lifecycle(drain_timeout_s=5)
+app = FastAPI()
+add_health_routes(app, lifecycle)
+
+def frames():
+    with lifecycle.track():
+        for i in range(4):
+            time.sleep(0.2)
+            yield f"frame {i}\\n"
+
+@app.get("/stream")
+def stream():
+    return StreamingResponse(frames())
+
+report = serve(app, lifecycle, host="127.0.0.1", port=int(sys.argv[1]), log_level="error")
+print(json.dumps(report), flush=True)
+"""
+
+
+@pytest.mark.skipif(os.name != "posix", reason="SIGTERM")
+def test_sigterm_lets_running_stream_finish(tmp_path):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    script = tmp_path / "server.py"
+    script.write_text(SERVER)
+    proc = subprocess.Popen(
+        [sys.executable, str(script), str(port)],
+        cwd=ROOT,
+        env={**os.environ, "PYTHONPATH": str(ROOT)},
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(f"{base}/readyz", timeout=1)
+                break
+            except OSError:
+                time.sleep(0.05)
+        with urllib.request.urlopen(f"{base}/stream", timeout=5) as resp:
+            first = resp.readline()
+            proc.send_signal(signal.SIGTERM)
+            rest = resp.read()
+        assert first + rest == b"frame 0\nframe 1\nframe 2\nframe 3\n"
+        out, _ = proc.communicate(timeout=10)
+    finally:
+        proc.kill()
+    assert proc.returncode == 0
+    report = json.loads(out.strip().splitlines()[-1])
+    assert (report["completed"], report["dropped"]) == snapshot((1, 0))
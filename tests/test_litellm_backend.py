@@ -0,0 +1,138 @@
+import base64
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from openai import InternalServerError
+from PIL import Image
+from inline_snapshot import snapshot
+
+from gpt_model.pixelizer_model_litellm import Pixelizer
+from util.output_store import OutputStore
+
+
+def _png(color):
+    buf = io.BytesIO()
+    Image.new("RGBA", (8, 8), color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+FINAL = _png((0, 0, 255, 255))
+PARTIAL = _png((0, 255, 0, 255))
+
+
+class LiteLLMStub(BaseHTTPRequestHandler):
+    """Minimal LiteLLM-compatible /images/edits endpoint."""
+
+    requests = []
+    fail_next = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        headers = {k.lower(): v for k, v in self.headers.items()}
+        type(self).requests.append((self.path, headers, body))
+        if type(self).fail_next:
+            type(self).fail_next -= 1
+            self.send_response(503)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b'{"error": {"message": "overloaded"}}')
+            return
+
+        if b'name="stream"\r\n\r\ntrue' in body:
+            events = [("image_edit.partial_image", PARTIAL)] * 2 + [
+                ("image_edit.completed", FINAL)
+            ]
+            payload = "".join(
+                f"event: {kind}\ndata: "
+                + json.dumps({"type": kind, "b64_json": base64.b64encode(img).decode()})
+                + "\n\n"
+                for kind, img in events
+            ).encode()
+            content_type = "text/event-stream"
+        else:
+            payload = json.dumps(
+                {"created": 1, "data": [{"b64_json": base64.b64encode(FINAL).decode()}]}
+            ).encode()
+            content_type = "application/json"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@pytest.fixture
+def stub_url():
+    LiteLLMStub.requests = []
+    LiteLLMStub.fail_next = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), LiteLLMStub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/v1"
+    server.shutdown()
+
+
+def _target():
+    buf = io.BytesIO(_png((255, 0, 0, 255)))
+    return buf
+
+
+def test_non_streaming_yields_final_frame_with_proxy_options(stub_url, tmp_path):
+    store = OutputStore(tmp_path)
+    px = Pixelizer(
+        ref_count=1, api_base=stub_url, api_key="sk-test", store=store, cache_ttl_s=600
+    )
+
+    frames = list(px.pixelize(_target(), quality="low"))
+    store.flush()
+
+    assert frames == [FINAL]
+    assert [p.read_bytes() for p in tmp_path.glob("??/??/*.png")] == [FINAL]
+    path, headers, body = LiteLLMStub.requests[0]
+    assert path == snapshot("/v1/images/edits")
+    assert headers["authorization"] == snapshot("Bearer sk-test")
+    assert [
+        field in body
+        for field in (
+            b'name="cache[ttl]"\r\n\r\n600',
+            b'name="num_retries"\r\n\r\n2',
+            b'name="model"\r\n\r\ngpt-image-1',
+            b'name="quality"\r\n\r\nlow',
+        )
+    ] == snapshot([True, True, True, True])
+    store.close()
+
+
+def test_streaming_keeps_partial_frames(stub_url):
+    px = Pixelizer(ref_count=1, api_base=stub_url, api_key="sk-test", stream=True)
+    frames = list(px.pixelize(_target(), partial_images=2))
+    assert frames == [PARTIAL, PARTIAL, FINAL]
+
+
+def test_retries_are_left_to_the_proxy(stub_url):
+    LiteLLMStub.fail_next = 1
+    px = Pixelizer(ref_count=1, api_base=stub_url, api_key="sk-test", num_retries=1)
+    # Der Proxy hat bereits num_retries-mal wiederholt; der Client nicht erneut
+    with pytest.raises(InternalServerError):
+        list(px.pixelize(_target()))
+    ((_, _, body),) = LiteLLMStub.requests
+    assert b'name="num_retries"\r\n\r\n1' in body
+    assert list(px.pixelize(_target())) == [FINAL]
+    assert len(LiteLLMStub.requests) == snapshot(2)
+
+
+def test_backend_is_selected_by_pixelizer_backend(monkeypatch):
+    from gpt_model import backends
+    from gpt_model.pixelizer_model import Pixelizer as AzurePixelizer
+
+    assert backends.pixelizer_class("litellm") is Pixelizer
+    monkeypatch.setattr(backends, "PIXELIZER_BACKEND", "litellm")
+    assert backends.pixelizer_class() is Pixelizer
+    monkeypatch.setattr(backends, "PIXELIZER_BACKEND", "azure")
+    assert backends.pixelizer_class() is AzurePixelizer
@@ -0,0 +1,79 @@
+import threading
+
+from inline_snapshot import snapshot
+
+from util.load_policy import DEFAULT_TIERS, LoadPolicy
+
+
+def test_select_degrades_with_queue_depth():
+    policy = LoadPolicy(slo_s=60, concurrency=2)
+    names = [policy.select(depth)[0].name for depth in (0, 1, 2, 4, 10)]
+    assert names == snapshot(["voll", "voll", "reduziert", "schnell", "schnell"])
+
+
+def test_observed_latency_moves_the_threshold():
+    policy = LoadPolicy(slo_s=60, concurrency=1, alpha=1.0)
+    assert policy.select(0)[0].name == snapshot("voll")
+    policy.record(DEFAULT_TIERS[0], 90.0)
+    assert policy.select(0)[0].name == snapshot("reduziert")
+
+
+def test_select_batch_picks_the_tier_for_the_last_member():
+    policy = LoadPolicy(slo_s=60, concurrency=2)
+    assert policy.select_batch(1)[0].name == snapshot("voll")
+    assert policy.select_batch(3)[0].name == snapshot("reduziert")
+    tier = policy.select_batch(3, queue_depth=3)[0]
+    assert tier.name == snapshot("schnell")
+    with policy.admit(tier) as ticket:
+        assert ticket.tier is tier
+
+
+def test_admit_limits_concurrency_and_counts_waiting():
+    policy = LoadPolicy(slo_s=60, concurrency=1)
+    entered = threading.Event()
+    release = threading.Event()
+    tickets = []
+
+    def first():
+        with policy.admit() as t:
+            tickets.append(t)
+            entered.set()
+            release.wait(5)
+
+    t1 = threading.Thread(target=first)
+    t1.start()
+    entered.wait(5)
+
+    t2 = threading.Thread(target=lambda: tickets.append(policy.admit().__enter__()))
+    t2.start()
+    t2.join(0.2)
+    assert policy.stats()["waiting"] == snapshot(1)
+
+    release.set()
+    t1.join(5)
+    t2.join(5)
+    assert [t.queue_depth for t in tickets] == snapshot([0, 1])
+    assert [t.tier.name for t in tickets] == snapshot(["voll", "reduziert"])
+
+
+def test_successful_requests_feed_the_estimate():
+    policy = LoadPolicy(slo_s=60, alpha=0.5)
+    with policy.admit() as ticket:
+        ticket.succeeded = True
+    assert policy.latency(ticket.tier) < ticket.tier.expected_latency_s
+
+
+def test_slow_tier_recovers_without_new_observations():
+    now = [0.0]
+    policy = LoadPolicy(
+        slo_s=60, concurrency=1, recovery_half_life_s=300, clock=lambda: now[0]
+    )
+    policy.record(DEFAULT_TIERS[0], 150.0)  # ein Ausreißer
+    for _ in range(50):
+        with policy.admit() as ticket:
+            ticket.succeeded = True
+    assert ticket.tier.name == snapshot("reduziert")
+
+    now[0] += 600  # zwei Halbwertszeiten ohne Messung der Stufe "voll"
+    assert policy.latency(DEFAULT_TIERS[0]) < 60
+    assert policy.select(0)[0].name == snapshot("voll")
@@ -0,0 +1,180 @@
+import base64
+import io
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from PIL import Image
+from inline_snapshot import snapshot
+
+from util.micro_batch import FigureCountMismatch, MicroBatcher, split_row
+
+
+def test_items_within_the_window_share_one_batch():
+    batches = []
+
+    def process(items):
+        batches.append(items)
+        return [item * 10 for item in items]
+
+    batcher = MicroBatcher(process, max_batch=4, window_s=0.2)
+    futures = [batcher.submit(i) for i in range(3)]
+    assert [f.result(timeout=2) for f in futures] == [0, 10, 20]
+    assert batches == [[0, 1, 2]]
+    assert batcher.stats()["calls_saved"] == 2
+    batcher.close()
+
+
+def test_full_batch_is_dispatched_without_waiting():
+    batcher = MicroBatcher(lambda items: items, max_batch=2, window_s=10)
+    start = time.monotonic()
+    futures = [batcher.submit(i) for i in range(5)]
+    assert [f.result(timeout=2) for f in futures[:4]] == [0, 1, 2, 3]
+    assert time.monotonic() - start < 1
+    batcher.close()  # Rest ohne Fensterablauf abarbeiten
+    assert futures[4].result(timeout=0) == 4
+    stats = batcher.stats()
+    assert stats.pop("mean_wait_s") >= 0
+    assert stats == snapshot(
+        {
+            "batches": 3,
+            "items": 5,
+            "mean_batch": 1.67,
+            "calls_saved": 2,
+        }
+    )
+
+
+def test_batch_errors_reach_every_request():
+    def process(items):
+        raise RuntimeError("kaputt")
+
+    batcher = MicroBatcher(process, max_batch=2, window_s=0.05)
+    futures = [batcher.submit(i) for i in range(2)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="kaputt"):
+            future.result(timeout=2)
+    batcher.close()
+
+
+def _row(offsets, width=400, height=200, figure=(60, 120)):
+    """Grey row with one coloured figure per panel, shifted by ``offsets``."""
+    img = Image.new("RGB", (width, height), (211, 211, 211))
+    panel = width // len(offsets)
+    for i, dx in enumerate(offsets):
+        left = i * panel + (panel - figure[0]) // 2 + dx
+        img.paste(
+            Image.new("RGB", figure, (50 * i, 200, 100)),
+            (left, (height - figure[1]) // 2),
+        )
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def test_split_row_cuts_between_figures():
+    # Die zweite Figur ragt über die Sollgrenze bei x=200 hinaus
+    panels = split_row(_row([0, -35, 0, 0]), 4)
+    images = [np.asarray(Image.open(io.BytesIO(p))) for p in panels]
+    assert sum(img.shape[1] for img in images) == 400
+    for i, img in enumerate(images):
+        colors = {tuple(c) for c in img.reshape(-1, 3)} - {(211, 211, 211)}
+        assert colors == {(50 * i, 200, 100)}
+        assert (img == (50 * i, 200, 100)).all(axis=2).sum() == 60 * 120
+
+
+def test_split_row_rejects_a_wrong_figure_count():
+    with pytest.raises(FigureCountMismatch, match="3 Figuren"):
+        split_row(_row([0, 0, 0]), 4)
+
+
+def test_split_row_fits_panels_to_the_single_frame():
+    panels = split_row(_row([0, 0]), 2, frame_size=(90, 160))
+    for i, data in enumerate(panels):
+        img = Image.open(io.BytesIO(data)).convert("RGB")
+        assert img.size == (90, 160)
+        # Figur unten bündig, Rand in Hintergrundfarbe
+        assert img.getpixel((0, 0)) == (211, 211, 211)
+        assert (50 * i, 200, 100) in {c for _, c in img.getcolors()}
+
+
+@pytest.fixture
+def flux(tmp_path, monkeypatch):
+    from gpt_model.pixelizer_model_flux import Pixelizer
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    for i in range(2):
+        Image.new("RGBA", (40, 60), (40 * i, 80, 120, 255)).save(
+            tmp_path / f"ref{i + 1}.png"
+        )
+
+    def start(drawn=lambda count: count, **kwargs):
+        calls = []
+
+        def edit(**kwargs):
+            match = re.search(r"shows (\d+) real people", kwargs["prompt"])
+            count = int(match.group(1)) if match else 1
+            calls.append((count, Image.open(kwargs["image"]).size, kwargs["size"]))
+            figures = drawn(count)
+            data = base64.b64encode(_row([0] * figures, width=100 * figures))
+            return SimpleNamespace(data=[SimpleNamespace(b64_json=data.decode())])
+
+        px = Pixelizer(ref_dir=str(tmp_path), ref_count=2, **kwargs)
+        px.client = SimpleNamespace(images=SimpleNamespace(edit=edit))
+        return px, calls
+
+    return start
+
+
+def _concurrent(px, n):
+    barrier = threading.Barrier(n)
+
+    def request(_):
+        barrier.wait()
+        buf = io.BytesIO()
+        Image.new("RGBA", (30, 50), (255, 0, 0, 255)).save(buf, format="PNG")
+        buf.seek(0)
+        return px.pixelize(buf)
+
+    with ThreadPoolExecutor(n) as executor:
+        return list(executor.map(request, range(n)))
+
+
+def test_flux_pixelizer_batches_concurrent_requests(flux):
+    px, calls = flux(batch_size=3, batch_window_s=1)
+    results = _concurrent(px, 3)
+    # Drei Ziele + zwei Referenzen nebeneinander in einem Querformat-Aufruf
+    assert calls == snapshot([(3, (170, 60), "1792x1024")])
+    # Jeder bekommt das Format einer Einzelanfrage
+    assert [Image.open(io.BytesIO(r)).size for r in results] == snapshot(
+        [(1024, 1792), (1024, 1792), (1024, 1792)]
+    )
+    px.batcher.close()
+
+
+def test_flux_batch_size_is_capped_by_the_panel_count(flux):
+    px, _ = flux(batch_size=8)
+    assert (px.max_panels, px.batcher.max_batch) == snapshot((3, 3))
+    px.batcher.close()
+
+
+def test_flux_wrong_figure_count_falls_back_to_single_calls(flux):
+    # Das Modell zeichnet eine Figur zu wenig
+    px, calls = flux(
+        drawn=lambda count: count - 1 if count > 1 else 1,
+        batch_size=3,
+        batch_window_s=1,
+    )
+    results = _concurrent(px, 3)
+    assert sorted(count for count, _, _ in calls) == snapshot([1, 1, 1, 3])
+    assert sorted(size for _, _, size in calls) == snapshot(
+        ["1024x1792", "1024x1792", "1024x1792", "1792x1024"]
+    )
+    assert [Image.open(io.BytesIO(r)).size for r in results] == snapshot(
+        [(100, 200), (100, 200), (100, 200)]
+    )
+    px.batcher.close()
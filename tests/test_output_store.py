@@ -0,0 +1,126 @@
+import hashlib
+import os
+import threading
+import time
+from types import SimpleNamespace
+import base64
+import io
+
+from PIL import Image
+from inline_snapshot import snapshot
+
+from util.output_store import OutputStore, atomic_write
+from gpt_model.pixelizer_model import Pixelizer
+
+
+def test_atomic_write_creates_parents_and_leaves_no_temp(tmp_path):
+    target = tmp_path / "a" / "b" / "out.png"
+    atomic_write(target, b"data")
+    assert target.read_bytes() == b"data"
+    assert sorted(p.name for p in target.parent.iterdir()) == snapshot(["out.png"])
+
+
+def test_put_is_content_addressed_and_sharded(tmp_path):
+    store = OutputStore(tmp_path)
+    path = store.put(b"hello")
+    again = store.put(b"hello")
+    store.flush()
+
+    key = hashlib.sha256(b"hello").hexdigest()
+    assert path == again == tmp_path / key[:2] / key[2:4] / f"{key}.png"
+    assert path.read_bytes() == b"hello"
+    assert store.stats()["entries"] == snapshot(1)
+    store.close()
+
+
+def test_byte_budget_evicts_oldest(tmp_path):
+    store = OutputStore(tmp_path, max_bytes=25)
+    paths = [store.put(bytes([i]) * 10) for i in range(3)]
+    store.flush()
+
+    assert [p.exists() for p in paths] == snapshot([False, True, True])
+    assert store.stats()["bytes"] == snapshot(20)
+    store.close()
+
+
+def test_age_eviction_applies_to_files_from_previous_runs(tmp_path):
+    store = OutputStore(tmp_path)
+    old = store.put(b"old")
+    store.close()
+    past = time.time() - 3600
+    os.utime(old, (past, past))
+
+    store = OutputStore(tmp_path, max_age_s=60)
+    store.flush()
+    assert old.exists() == snapshot(False)
+    store.close()
+
+
+def test_leftover_temp_files_are_not_indexed(tmp_path):
+    store = OutputStore(tmp_path)
+    path = store.put(b"kept")
+    store.close()
+    stale = path.parent / ".tmp-abc.png"
+    fresh = path.parent / ".tmp-def.png"
+    stale.write_bytes(b"x" * 100)
+    fresh.write_bytes(b"y" * 100)
+    past = time.time() - 2 * 3600
+    os.utime(stale, (past, past))
+
+    store = OutputStore(tmp_path, max_bytes=50)
+    store.flush()
+    assert store.stats()["entries"] == snapshot(1)
+    assert store.stats()["bytes"] == snapshot(4)
+    assert (path.exists(), stale.exists(), fresh.exists()) == snapshot(
+        (True, False, True)
+    )
+    store.close()
+
+
+def test_concurrent_puts(tmp_path):
+    store = OutputStore(tmp_path)
+    threads = [
+        threading.Thread(target=lambda i=i: store.put(str(i).encode()))
+        for i in range(50)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    store.flush()
+    assert len(list(tmp_path.glob("??/??/*.png"))) == snapshot(50)
+    store.close()
+
+
+def test_pixelize_persists_only_final_frame(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    frames = [b"partial-1", b"partial-2", b"final"]
+
+    class FakeImages:
+        def edit(self, **kwargs):
+            for i, data in enumerate(frames):
+                kind = "completed" if i == len(frames) - 1 else "partial_image"
+                yield SimpleNamespace(
+                    type=f"image_edit.{kind}",
+                    b64_json=base64.b64encode(data).decode(),
+                )
+
+    store = OutputStore(tmp_path / "output")
+    px = Pixelizer.__new__(Pixelizer)
+    px.client = SimpleNamespace(images=FakeImages())
+    px.model, px.quality, px.size, px.prompt = "m", "low", "1024x1536", "p"
+    px.ref_images = []
+    px.store = store
+    px.debug_dir = None
+
+    target = io.BytesIO()
+    Image.new("RGBA", (4, 4)).save(target, format="PNG")
+    target.seek(0)
+
+    assert list(px.pixelize(target)) == frames
+    store.flush()
+    stored = [p.read_bytes() for p in (tmp_path / "output").glob("??/??/*.png")]
+    assert stored == snapshot([b"final"])
+    # keine festen Debug-Dateien mehr im Arbeitsverzeichnis
+    assert sorted(p.name for p in tmp_path.iterdir()) == snapshot(["output"])
+    store.close()
@@ -0,0 +1,125 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+from inline_snapshot import snapshot
+
+import pixelizer_ci as mod
+from util.palette import Palette, denoise, extract_palette
+from util.style_registry import StyleRegistry
+
+
+def _noisy_blocks(colors, noise=6, size=32, seed=0):
+    """Side-by-side flat blocks with per-pixel noise (off-palette shades)."""
+    rng = np.random.default_rng(seed)
+    blocks = [np.full((size, size, 3), c, dtype=np.int16) for c in colors]
+    img = np.concatenate(blocks, axis=1)
+    img += rng.integers(-noise, noise + 1, size=img.shape, dtype=np.int16)
+    return Image.fromarray(img.clip(0, 255).astype(np.uint8), "RGB")
+
+
+def test_few_colours_are_returned_exactly_by_frequency():
+    img = Image.new("RGBA", (4, 1), (255, 0, 0, 255))
+    img.putpixel((0, 0), (0, 0, 255, 255))
+    img.putpixel((3, 0), (0, 0, 0, 0))  # transparent: ignoriert
+    assert extract_palette([img], n_colors=8).tolist() == snapshot(
+        [[255, 0, 0], [0, 0, 255]]
+    )
+
+
+def test_kmeans_recovers_flat_colours_from_noise():
+    colors = [(211, 211, 211), (200, 40, 40), (30, 60, 160), (240, 200, 170)]
+    palette = extract_palette([_noisy_blocks(colors)], n_colors=4)
+    found = sorted(map(tuple, palette.tolist()))
+    for got, want in zip(found, sorted(colors)):
+        assert np.abs(np.subtract(got, want)).max() <= 2
+
+
+def test_lut_matches_brute_force_nearest_colour():
+    rng = np.random.default_rng(1)
+    palette = Palette(rng.integers(0, 256, size=(24, 3)))
+    rgb = rng.integers(0, 256, size=(200, 300, 3), dtype=np.uint8)
+
+    got = palette.indices(rgb)
+    dist = ((rgb[..., None, :].astype(int) - palette.colors.astype(int)) ** 2).sum(-1)
+    best = np.sqrt(dist.min(axis=-1))
+    chosen = np.sqrt(np.take_along_axis(dist, got[..., None], axis=-1)[..., 0])
+    assert (chosen - best).max() <= 5.5  # halbe Zellendiagonale x 2
+    assert (got == dist.argmin(axis=-1)).mean() > 0.97
+    # Palettenfarben selbst werden exakt getroffen
+    exact = palette.indices(palette.colors[None, :, :])
+    assert (palette.colors[exact[0]] == palette.colors).all()
+
+
+def test_quantize_output_uses_only_palette_colours():
+    colors = [(211, 211, 211), (200, 40, 40), (30, 60, 160)]
+    palette = Palette(colors)
+    out = palette.quantize(_noisy_blocks(colors, noise=20))
+    assert out.mode == "P"
+    assert sorted(c for _, c in out.convert("RGB").getcolors()) == sorted(colors)
+
+    rgba = Image.new("RGBA", (2, 1), (190, 50, 50, 255))
+    rgba.putpixel((1, 0), (0, 0, 0, 0))
+    out = palette.quantize(rgba)
+    assert (out.mode, out.getpixel((0, 0)), out.getpixel((1, 0))[3]) == snapshot(
+        ("RGBA", (200, 40, 40, 255), 0)
+    )
+
+
+def test_denoise_limits_distinct_colours():
+    photo = _noisy_blocks([(10, 20, 30), (200, 180, 160)], noise=30)
+    assert len(photo.getcolors(1 << 24)) > 1000
+    assert len(denoise(photo, n_colors=16).getcolors(1 << 24)) <= 16
+
+
+def test_denoise_maps_exactly_without_a_lookup_table(monkeypatch):
+    monkeypatch.setattr(
+        Palette, "_build_lut", lambda self: pytest.fail("LUT für denoise gebaut")
+    )
+    photo = _noisy_blocks([(10, 20, 30), (200, 180, 160)], noise=30)
+    out = denoise(photo, n_colors=8)
+    colors = extract_palette([photo], n_colors=8).astype(np.int64)
+    rgb = np.asarray(photo.convert("RGB")).reshape(-1, 1, 3).astype(np.int64)
+    exact = colors[((rgb - colors[None]) ** 2).sum(axis=2).argmin(axis=1)]
+    assert np.array_equal(np.asarray(out).reshape(-1, 3), exact)
+
+
+def test_style_palette_is_cached_with_the_references(tmp_path):
+    style_dir = tmp_path / "retro"
+    style_dir.mkdir()
+    _noisy_blocks([(200, 40, 40), (211, 211, 211)]).save(style_dir / "ref1.png")
+    (style_dir / "prompt.txt").write_text("p")
+    registry = StyleRegistry(tmp_path)
+
+    palette = registry.palette("retro", n_colors=2)
+    assert registry.palette("retro", n_colors=2) is palette
+    assert registry.stats()["cache_bytes"] == 64 * 32 * 3 + palette.nbytes
+
+
+def test_process_image_maps_frames_onto_style_palette(
+    tmp_path, monkeypatch, warnings_sink
+):
+    colors = [(211, 211, 211), (200, 40, 40)]
+
+    class FakeRegistry:
+        def palette(self, style, n_colors):
+            return Palette(colors)
+
+    class FakePixelizer:
+        def pixelize(self, target, output_path=None, **kwargs):
+            buf = io.BytesIO()
+            _noisy_blocks(colors, noise=10).save(buf, format="PNG")
+            yield buf.getvalue()
+
+    monkeypatch.setattr(mod, "PALETTE_QUANTIZE", True)
+    monkeypatch.setattr(mod, "style_registry", FakeRegistry())
+    monkeypatch.setattr(mod, "pixelizer", FakePixelizer())
+    src = tmp_path / "in.png"
+    Image.new("RGB", (10, 10), "white").save(src)
+
+    delivered = []
+    for frame in mod.process_image(str(src)):
+        with Image.open(frame) as img:
+            delivered.append(sorted(c for _, c in img.convert("RGB").getcolors()))
+    assert delivered == [sorted(colors)]
@@ -94,7 +94,7 @@ def test_process_image_valid_flow(
     monkeypatch.setattr(mod, "load_and_resize", fake_load_and_resize, raising=True)
 
     class FakePixelizer:
-        def pixelize(self, pil_img, output_path=None):
+        def pixelize(self, pil_img, output_path=None, **kwargs):
             frames = []
             for color in [(255, 0, 0, 255), (0, 255, 0, 255)]:
                 im = Image.new("RGBA", (10, 10), color)
@@ -106,10 +106,14 @@ def test_process_image_valid_flow(
 
     monkeypatch.setattr(mod, "pixelizer", FakePixelizer(), raising=True)
 
-    results = list(mod.process_image(str(src)))
+    # Frames kommen als Dateipfade; nur solange der Generator läuft existieren sie
+    sizes = []
+    for path in mod.process_image(str(src)):
+        with Image.open(path) as im:
+            sizes.append(im.size)
     # zwei Bilder, beide 10x10
-    assert len(results) == snapshot(2)
-    assert [im.size for im in results] == snapshot([(10, 10), (10, 10)])
+    assert len(sizes) == snapshot(2)
+    assert sizes == snapshot([(10, 10), (10, 10)])
     # keine Errors
     assert any(k == "error" for k, _ in warnings_sink) == snapshot(False)
 
@@ -125,7 +129,7 @@ def test_process_image_no_yield_from_model(
     )
 
     class FakePixelizerEmpty:
-        def pixelize(self, pil_img, output_path=None):
+        def pixelize(self, pil_img, output_path=None, **kwargs):
             if False:
                 yield b""
 
@@ -150,7 +154,7 @@ def test_process_image_bad_chunk_then_good(
     )
 
     class FakePixelizerMixed:
-        def pixelize(self, pil_img, output_path=None):
+        def pixelize(self, pil_img, output_path=None, **kwargs):
             yield b"not-a-png"  # kaputt
             b2 = io.BytesIO()
             Image.new("RGBA", (10, 10), (0, 0, 255, 255)).save(b2, format="PNG")
@@ -161,7 +165,7 @@ def test_process_image_bad_chunk_then_good(
     out = list(mod.process_image(str(src)))
     # am Ende genau ein valides Bild
     assert len(out) == snapshot(1)
-    assert isinstance(out[0], Image.Image) == snapshot(True)
+    assert out[0].endswith(".png") == snapshot(True)
     # es gab eine Warning für den schlechten Chunk
     assert any(
         k == "warning" and "Zwischenschritt" in m for k, m in warnings_sink
@@ -184,3 +188,47 @@ def test_process_image_model_not_initialized(
     assert any(
         k == "error" and "nicht initialisiert" in m for k, m in warnings_sink
     ) == snapshot(True)
+
+
+def test_process_image_reports_tier_and_passes_settings(
+    tmp_path, monkeypatch, tiny_rgba_image, tiny_png_bytes, warnings_sink
+):
+    src = tmp_path / "in.png"
+    tiny_rgba_image.save(src, format="PNG")
+    monkeypatch.setattr(
+        mod, "load_and_resize", lambda buf: tiny_rgba_image, raising=True
+    )
+    seen = {}
+
+    class FakePixelizerKwargs:
+        def pixelize(self, pil_img, output_path=None, **kwargs):
+            seen.update(kwargs)
+            yield tiny_png_bytes
+
+    monkeypatch.setattr(mod, "pixelizer", FakePixelizerKwargs(), raising=True)
+    monkeypatch.setattr(mod, "load_policy", mod.LoadPolicy(slo_s=60), raising=True)
+
+    out = list(mod.process_image(str(src)))
+    assert len(out) == snapshot(1)
+    assert seen == snapshot(
+        {"quality": "medium", "partial_images": 3, "ref_count": 7, "size": "1024x1536"}
+    )
+    assert [m for k, m in warnings_sink if k == "info"] == snapshot(
+        ["Qualitätsstufe: voll (Warteschlange: 0, erwartet ~45 s)"]
+    )
+
+
+def test_safe_open_image_as_rgba_rejects_oversized_file(tmp_path, monkeypatch):
+    import util.validation as validation
+
+    p = tmp_path / "big.png"
+    Image.new("RGB", (64, 64), (1, 2, 3)).save(p, format="PNG")
+    monkeypatch.setattr(validation, "MAX_INPUT_BYTES", 10)
+    with pytest.raises(ValueError) as exc:
+        mod._safe_open_image_as_rgba(str(p))
+    assert "zu groß" in str(exc.value)
+
+
+def test_safe_open_image_as_rgba_accepts_file_objects(tiny_png_bytes):
+    img = mod._safe_open_image_as_rgba(io.BytesIO(tiny_png_bytes))
+    assert (img.mode, img.size) == snapshot(("RGBA", (10, 10)))
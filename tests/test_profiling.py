@@ -0,0 +1,102 @@
+import json
+import time
+from types import SimpleNamespace
+
+from inline_snapshot import snapshot
+
+import pixelizer_ci as mod
+import util.profiling as profiling
+
+
+def _burn(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(i * i for i in range(1000))
+
+
+def test_profiling_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("PIXELIZER_PROFILE", raising=False)
+    assert profiling.start_request_profile({}) is profiling.NULL_PROFILER
+    assert profiling.start_request_profile(None) is profiling.NULL_PROFILER
+
+
+def test_env_or_header_enables_profiling(monkeypatch):
+    monkeypatch.delenv("PIXELIZER_PROFILE", raising=False)
+    # Header allein genügt nicht
+    assert profiling.profiling_requested({"x-pixelizer-profile": "1"}) is False
+    monkeypatch.setenv("PIXELIZER_PROFILE", "header")
+    assert profiling.profiling_requested({"x-pixelizer-profile": "1"}) is True
+    assert profiling.profiling_requested({}) is False
+    monkeypatch.setenv("PIXELIZER_PROFILE", "1")
+    assert profiling.profiling_requested(None) is True
+
+
+def test_overlapping_profiles_keep_the_peak(tmp_path, monkeypatch):
+    resets = []
+    monkeypatch.setattr(
+        profiling.tracemalloc, "reset_peak", lambda: resets.append(True)
+    )
+    first = profiling.RequestProfiler("a", out_dir=tmp_path).start()
+    second = profiling.RequestProfiler("b", out_dir=tmp_path).start()
+    assert len(resets) == snapshot(1)
+    second.finish()
+    first.finish()
+    third = profiling.RequestProfiler("c", out_dir=tmp_path).start()
+    third.finish()
+    assert len(resets) == snapshot(2)
+
+    overlapped = {
+        meta["name"]: meta["allocations"]["overlapped"]
+        for meta in (json.loads(p.read_text()) for p in tmp_path.glob("*.json"))
+    }
+    assert overlapped == snapshot({"a": True, "b": True, "c": False})
+
+
+def test_profiled_request_writes_folded_stacks_and_summary(
+    tmp_path, monkeypatch, tiny_rgba_image, tiny_png_bytes, warnings_sink
+):
+    monkeypatch.setenv("PIXELIZER_PROFILE", "header")
+    monkeypatch.setattr(profiling, "PROFILE_DIR", tmp_path / "profiles")
+    src = tmp_path / "in.png"
+    tiny_rgba_image.save(src, format="PNG")
+
+    class SlowPixelizer:
+        def pixelize(self, pil_img, output_path=None, **kwargs):
+            _burn(0.1)
+            yield tiny_png_bytes
+
+    monkeypatch.setattr(mod, "pixelizer", SlowPixelizer())
+    request = SimpleNamespace(headers={"x-pixelizer-profile": "1"})
+    assert len(list(mod.process_image(str(src), request=request))) == 1
+
+    (folded,) = (tmp_path / "profiles").glob("*.folded")
+    lines = folded.read_text().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+    assert any("_burn" in line for line in lines)
+
+    meta = json.loads(folded.with_suffix(".json").read_text())
+    assert sorted(meta["stages_s"]) == snapshot(["generate", "open", "resize"])
+    assert {k: meta["tags"][k] for k in ("format", "mode", "width", "height")} == (
+        snapshot({"format": "PNG", "mode": "RGBA", "width": 10, "height": 10})
+    )
+    assert meta["allocations"]["peak_bytes"] > 0
+    assert meta["allocations"]["scope"] == snapshot("process")
+
+
+def test_unprofiled_request_writes_nothing(
+    tmp_path, monkeypatch, tiny_rgba_image, tiny_png_bytes, warnings_sink
+):
+    monkeypatch.setenv("PIXELIZER_PROFILE", "header")
+    monkeypatch.setattr(profiling, "PROFILE_DIR", tmp_path / "profiles")
+    src = tmp_path / "in.png"
+    tiny_rgba_image.save(src, format="PNG")
+
+    class FakePixelizer:
+        def pixelize(self, pil_img, output_path=None, **kwargs):
+            yield tiny_png_bytes
+
+    monkeypatch.setattr(mod, "pixelizer", FakePixelizer())
+    list(mod.process_image(str(src), request=SimpleNamespace(headers={})))
+    assert not (tmp_path / "profiles").exists()
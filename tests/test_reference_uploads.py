@@ -0,0 +1,199 @@
+import base64
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+from inline_snapshot import snapshot
+from openai import BadRequestError
+
+from gpt_model.pixelizer_model_openAI import Pixelizer
+from util.image_operations import load_and_resize
+
+
+def _png(color, size=(8, 8)):
+    buf = io.BytesIO()
+    Image.new("RGBA", size, color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+FINAL = _png((0, 0, 255, 255))
+
+
+class OpenAIStub(BaseHTTPRequestHandler):
+    """Minimal /files + /images/edits (JSON and multipart) endpoints."""
+
+    files = {}
+    requests = []
+    uploads = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_DELETE(self):
+        type(self).requests.append((f"DELETE {self.path}", 0))
+        file_id = self.path.rsplit("/", 1)[-1]
+        type(self).files.pop(file_id, None)
+        self._json(200, {"id": file_id, "object": "file", "deleted": True})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        type(self).requests.append((self.path, len(body)))
+        if self.path.endswith("/files"):
+            type(self).uploads += 1
+            file_id = f"file-{type(self).uploads}"
+            type(self).files[file_id] = body
+            return self._json(
+                200,
+                {
+                    "id": file_id,
+                    "object": "file",
+                    "bytes": len(body),
+                    "created_at": 1,
+                    "filename": "ref.png",
+                    "purpose": "vision",
+                    "status": "processed",
+                },
+            )
+        if self.headers["Content-Type"].startswith("application/json"):
+            for image in json.loads(body)["images"]:
+                file_id = image.get("file_id")
+                if file_id and file_id not in type(self).files:
+                    return self._json(
+                        404,
+                        {
+                            "error": {
+                                "message": f"No such File object: {file_id}",
+                                "type": "invalid_request_error",
+                            }
+                        },
+                    )
+        self._json(
+            200,
+            {"created": 1, "data": [{"b64_json": base64.b64encode(FINAL).decode()}]},
+        )
+
+
+@pytest.fixture
+def pixelizer(tmp_path, monkeypatch):
+    OpenAIStub.files = {}
+    OpenAIStub.requests = []
+    OpenAIStub.uploads = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OpenAIStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_port}/v1")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    for i in range(3):
+        Image.new("RGBA", (200, 300), (40 * i, 80, 120, 255)).save(
+            tmp_path / f"ref{i + 1}.png"
+        )
+    yield lambda **kwargs: Pixelizer(
+        **{"ref_dir": str(tmp_path), "ref_count": 3, **kwargs}
+    )
+    server.shutdown()
+
+
+def _fail_edits(do_post):
+    def handler(self):
+        if not self.path.endswith("/edits"):
+            return do_post(self)
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self._json(400, {"error": {"message": "moderation_blocked"}})
+
+    return handler
+
+
+def _target():
+    return io.BytesIO(_png((255, 0, 0, 255), (64, 96)))
+
+
+def test_references_are_uploaded_once(pixelizer):
+    px = pixelizer()
+    for _ in range(3):
+        assert px.pixelize(_target()) == FINAL
+    paths = [path for path, _ in OpenAIStub.requests]
+    assert paths == snapshot(
+        [
+            "/v1/files",
+            "/v1/files",
+            "/v1/files",
+            "/v1/files",
+            "/v1/images/edits",
+            "DELETE /v1/files/file-1",
+            "/v1/files",
+            "/v1/images/edits",
+            "DELETE /v1/files/file-5",
+            "/v1/files",
+            "/v1/images/edits",
+            "DELETE /v1/files/file-6",
+        ]
+    )
+    stats = px.stats()
+    ref_bytes = stats["ref_bytes_per_request"]
+    assert {k: stats[k] for k in ("requests", "uploads", "reuploads")} == snapshot(
+        {"requests": 3, "uploads": 3, "reuploads": 0}
+    )
+    assert stats["bytes_uploaded"] == ref_bytes
+    # netto: zweimal die Referenzen, abzüglich der file ids in jeder Anfrage
+    assert 2 * ref_bytes - 300 < stats["bytes_saved"] < 2 * ref_bytes
+
+
+def test_expired_ids_are_uploaded_again(pixelizer):
+    px = pixelizer()
+    px.pixelize(_target())
+    OpenAIStub.files.clear()  # Server hat die Dateien verworfen
+
+    assert px.pixelize(_target()) == FINAL
+    assert px.stats()["reuploads"] == snapshot(1)
+    assert px.stats()["uploads"] == snapshot(6)
+    # nur die neu hochgeladenen Referenzen, das Ziel (file-5) ist gelöscht
+    assert sorted(OpenAIStub.files) == snapshot(["file-6", "file-7", "file-8"])
+
+
+def test_target_is_deleted_when_the_edit_fails(pixelizer, monkeypatch):
+    px = pixelizer()
+    monkeypatch.setattr(OpenAIStub, "do_POST", _fail_edits(OpenAIStub.do_POST))
+
+    with pytest.raises(BadRequestError):
+        px.pixelize(_target())
+    # Referenzen bleiben für die nächste Anfrage, das Ziel nicht
+    assert sorted(OpenAIStub.files) == snapshot(["file-2", "file-3", "file-4"])
+    assert OpenAIStub.requests[-1][0] == "DELETE /v1/files/file-1"
+
+
+def test_target_is_sent_raw_not_as_data_url(pixelizer):
+    px = pixelizer()
+    px.pixelize(_target())
+    edits = [size for path, size in OpenAIStub.requests if path.endswith("/edits")]
+    assert edits[0] < 2000
+
+
+def test_reuse_shrinks_total_request_bytes_for_a_real_photo(pixelizer):
+    """Alle Anfragen eines Aufrufs zusammen, mit den Bildern aus input/."""
+    target = load_and_resize("input/target.jpg").getvalue()
+    legacy = pixelizer(ref_dir="input", ref_count=7, reuse_uploads=False)
+    legacy.pixelize(io.BytesIO(target))
+    ((_, legacy_total),) = OpenAIStub.requests
+
+    px = pixelizer(ref_dir="input", ref_count=7)
+    px.pixelize(io.BytesIO(target))
+    OpenAIStub.requests = []
+    saved_before = px.stats()["bytes_saved"]
+    px.pixelize(io.BytesIO(target))
+    reuse_total = sum(size for _, size in OpenAIStub.requests)
+    saved = px.stats()["bytes_saved"] - saved_before
+
+    # Gespart werden die Referenzen; das Ziel kostet gleich viel
+    assert reuse_total < legacy_total - px.stats()["ref_bytes_per_request"]
+    # der gemeldete Nettowert stimmt bis auf den Formular-Overhead
+    assert abs((legacy_total - reuse_total) - saved) < 0.01 * legacy_total
@@ -0,0 +1,145 @@
+import csv
+import json
+
+import numpy as np
+import pytest
+from PIL import Image
+from inline_snapshot import snapshot
+
+from util.group_photo import assemble_lineup
+from util.sprite_atlas import SkylinePacker, export_atlases, pack
+from util.sprite_export import sprite_png_bytes
+
+
+def _overlaps(a, b):
+    (ax, ay, aw, ah), (bx, by, bw, bh) = a, b
+    return ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_pack_places_rectangles_without_overlap(seed):
+    rng = np.random.default_rng(seed)
+    sizes = [tuple(int(v) for v in rng.integers(5, 60, size=2)) for _ in range(200)]
+    positions = pack(sizes, 256, 256, padding=2)
+
+    by_atlas = {}
+    for (atlas, x, y), (w, h) in zip(positions, sizes):
+        assert 0 <= x and x + w <= 256 and 0 <= y and y + h <= 256
+        by_atlas.setdefault(atlas, []).append((x, y, w + 2, h + 2))
+    for rects in by_atlas.values():
+        for i, a in enumerate(rects):
+            assert not any(_overlaps(a, b) for b in rects[i + 1 :])
+    # Skyline-Packen füllt die Atlanten gut: wenig mehr als die Mindestanzahl
+    area = sum((w + 2) * (h + 2) for w, h in sizes)
+    assert len(by_atlas) <= area // (256 * 256) + 2
+
+
+def test_skyline_packer_fills_rows_bottom_left():
+    packer = SkylinePacker(10, 10)
+    assert packer.insert(4, 5) == (0, 0)
+    assert packer.insert(6, 3) == (4, 0)
+    assert packer.insert(6, 2) == (4, 3)
+    assert packer.insert(4, 5) == (0, 5)
+    assert packer.insert(11, 1) is None
+
+
+def test_pack_rejects_sprites_larger_than_the_atlas():
+    with pytest.raises(ValueError):
+        pack([(300, 10)], 256, 256)
+
+
+def _result(path, color, size, background=(211, 211, 211)):
+    img = Image.new("RGB", (80, 100), background)
+    img.paste(Image.new("RGB", size, color), (20, 30))
+    img.save(path)
+
+
+def test_export_atlases_writes_indexed_pngs_and_indices(tmp_path):
+    src = tmp_path / "output"
+    src.mkdir()
+    colors = [(200, 30, 30), (30, 160, 40), (20, 40, 200)]
+    for i, color in enumerate(colors):
+        _result(src / f"pixelized_{i}.png", color, (10 + 5 * i, 20))
+    (src / "leer.png").write_bytes(b"kein png")
+    # Bereits freigestellter Sprite aus dem Sprite-Export
+    sprite = Image.new("RGBA", (30, 30), (0, 0, 0, 0))
+    sprite.paste(Image.new("RGBA", (8, 9), (250, 220, 0, 255)), (5, 5))
+    sprite.save(src / "sprite.png")
+
+    paths = sorted(src.glob("*.png"))
+    index = export_atlases(paths, tmp_path / "atlas", processes=2, root=src)
+
+    assert [s["source"] for s in index["skipped"]] == [str(src / "leer.png")]
+    assert [a["file"] for a in index["atlases"]] == ["atlas_0.png"]
+    sprites = {s["name"]: s for s in index["atlases"][0]["sprites"]}
+    assert {name: (s["w"], s["h"]) for name, s in sprites.items()} == {
+        "pixelized_0": (10, 20),
+        "pixelized_1": (15, 20),
+        "pixelized_2": (20, 20),
+        "sprite": (8, 9),
+    }
+    assert json.loads((tmp_path / "atlas" / "atlas.json").read_text()) == index
+
+    with open(tmp_path / "atlas" / "atlas.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert {r["name"]: (int(r["x"]), int(r["y"])) for r in rows} == {
+        name: (s["x"], s["y"]) for name, s in sprites.items()
+    }
+
+    atlas = Image.open(tmp_path / "atlas" / "atlas_0.png")
+    assert atlas.mode == "P" and atlas.info["transparency"] == 0
+    rgba = np.asarray(atlas.convert("RGBA"))
+    expected = dict(zip([f"pixelized_{i}" for i in range(3)], colors))
+    expected["sprite"] = (250, 220, 0)
+    for name, color in expected.items():
+        s = sprites[name]
+        block = rgba[s["y"] : s["y"] + s["h"], s["x"] : s["x"] + s["w"]]
+        assert (block[..., 3] == 255).all()
+        assert (block[..., :3] == color).all()
+    # Alles außerhalb der Sprites ist transparent
+    assert (rgba[..., 3] == 255).sum() == sum(s["w"] * s["h"] for s in sprites.values())
+
+
+def test_export_atlases_can_keep_rgba(tmp_path):
+    _result(tmp_path / "a.png", (1, 2, 3), (7, 7))
+    index = export_atlases([tmp_path / "a.png"], tmp_path / "out", n_colors=0)
+    atlas = Image.open(tmp_path / "out" / "atlas_0.png")
+    assert atlas.mode == "RGBA" and atlas.size == (7, 7)
+    assert index["atlases"][0]["sprites"][0]["name"] == str(tmp_path / "a.png")[:-4]
+
+
+def test_export_atlases_leaves_out_keyed_copies_and_lineups(tmp_path):
+    src = tmp_path / "output"
+    src.mkdir()
+    for i in range(4):
+        _result(src / f"pixelized_{i}.png", (200, 30 + 40 * i, 30), (30, 40))
+    (src / "keyed.png").write_bytes(
+        sprite_png_bytes((src / "pixelized_0.png").read_bytes())
+    )
+    (src / "lineup.png").write_bytes(
+        assemble_lineup([(src / f"pixelized_{i}.png").read_bytes() for i in range(2)])
+    )
+
+    paths = sorted(src.glob("*.png"))
+    index = export_atlases(
+        paths,
+        tmp_path / "atlas",
+        max_size=64,
+        processes=2,
+        root=src,
+        kinds={"character"},
+    )
+    assert index["excluded"] == snapshot({"lineup": 1, "sprite": 1})
+    names = sorted(s["name"] for a in index["atlases"] for s in a["sprites"])
+    assert names == [f"pixelized_{i}" for i in range(4)]
+    # vier 30x40-Sprites passen nicht in einen 64x64-Atlas: Rendern im Pool
+    assert len(index["atlases"]) > 1
+    for atlas in index["atlases"]:
+        with Image.open(tmp_path / "atlas" / atlas["file"]) as img:
+            assert img.size == (atlas["width"], atlas["height"])
+
+    everything = export_atlases(paths, tmp_path / "all", processes=1, root=src)
+    kinds = {s["name"]: s["kind"] for a in everything["atlases"] for s in a["sprites"]}
+    assert (kinds["keyed"], kinds["lineup"], kinds["pixelized_0"]) == snapshot(
+        ("sprite", "lineup", "character")
+    )
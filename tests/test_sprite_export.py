@@ -0,0 +1,123 @@
+import io
+from collections import deque
+
+import numpy as np
+import pytest
+from PIL import Image
+from inline_snapshot import snapshot
+
+from util.sprite_export import _edge_connected, extract_sprite, sprite_png_bytes
+
+
+def _flood_fill_reference(candidate):
+    h, w = candidate.shape
+    seen = np.zeros_like(candidate)
+    todo = deque(
+        (y, x)
+        for y in range(h)
+        for x in range(w)
+        if candidate[y, x] and (y in (0, h - 1) or x in (0, w - 1))
+    )
+    while todo:
+        y, x = todo.popleft()
+        if seen[y, x]:
+            continue
+        seen[y, x] = True
+        for ny, nx in ((y + 1, x), (y - 1, x), (y, x + 1), (y, x - 1)):
+            if 0 <= ny < h and 0 <= nx < w and candidate[ny, nx] and not seen[ny, nx]:
+                todo.append((ny, nx))
+    return seen
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_edge_connected_matches_flood_fill(seed):
+    rng = np.random.default_rng(seed)
+    candidate = rng.random((40, 30)) < 0.55
+    assert np.array_equal(_edge_connected(candidate), _flood_fill_reference(candidate))
+
+
+def test_edge_connected_follows_spiral_paths():
+    # Spirale: der Hintergrund muss mehrfach um die Ecke laufen
+    candidate = np.ones((21, 21), dtype=bool)
+    candidate[2:19, 2] = candidate[18, 2:19] = candidate[2:19, 18] = False
+    candidate[2, 6:19] = candidate[6:15, 6] = candidate[14, 6:15] = False
+    candidate[6, 6:15] = False
+    assert np.array_equal(_edge_connected(candidate), _flood_fill_reference(candidate))
+
+
+def _generated(background=(214, 209, 212)):
+    img = np.zeros((60, 40, 3), dtype=np.uint8)
+    img[:] = background
+    img[10:50, 12:28] = (200, 40, 40)  # Figur
+    img[20:25, 16:24] = (211, 211, 211)  # graue Fläche *in* der Figur
+    return Image.fromarray(img, "RGB")
+
+
+def test_extract_sprite_keys_drifted_background_and_crops():
+    sprite = extract_sprite(_generated())
+    arr = np.asarray(sprite)
+    assert (sprite.mode, sprite.size) == snapshot(("RGBA", (16, 40)))
+    # eingeschlossenes Grau bleibt deckend, Rand ist komplett opak (Figur)
+    assert int(arr[12, 6, 3]) == snapshot(255)
+    assert int(arr[..., 3].min()) == snapshot(255)
+
+
+def test_extract_sprite_padding_is_exactly_transparent():
+    arr = np.asarray(extract_sprite(_generated(), padding=2))
+    assert arr.shape == snapshot((44, 20, 4))
+    assert arr[0].tolist() == [[0, 0, 0, 0]] * 20
+
+
+@pytest.mark.parametrize("padding", [0, 1, 3, 50])
+def test_cropped_keying_matches_the_full_frame(padding):
+    # Figur mit Löchern und Hintergrundbuchten, bis an den rechten Rand
+    rng = np.random.default_rng(padding)
+    img = np.full((80, 60, 3), 211, dtype=np.uint8)
+    img[15:70, 20:60] = rng.choice([211, 90], size=(55, 40, 1), p=[0.45, 0.55])
+    image = Image.fromarray(img, "RGB")
+
+    full = np.asarray(extract_sprite(image, crop=False))
+    rows = np.flatnonzero(full[..., 3].any(axis=1))
+    cols = np.flatnonzero(full[..., 3].any(axis=0))
+    top, left = max(rows[0] - padding, 0), max(cols[0] - padding, 0)
+    expected = full[top : rows[-1] + 1 + padding, left : cols[-1] + 1 + padding]
+    assert np.array_equal(np.asarray(extract_sprite(image, padding=padding)), expected)
+
+
+def test_sprite_png_bytes_from_encoded_output():
+    buf = io.BytesIO()
+    _generated().save(buf, format="PNG")
+    sprite = Image.open(io.BytesIO(sprite_png_bytes(buf.getvalue())))
+    assert (sprite.mode, sprite.size) == snapshot(("RGBA", (16, 40)))
+
+
+def test_extract_sprite_without_figure_raises():
+    with pytest.raises(ValueError):
+        extract_sprite(Image.new("RGB", (10, 10), (211, 211, 211)))
+
+
+def test_process_image_exports_sprite_of_final_frame(
+    tmp_path, monkeypatch, tiny_rgba_image, warnings_sink
+):
+    import pixelizer_ci as mod
+
+    src = tmp_path / "in.png"
+    tiny_rgba_image.save(src, format="PNG")
+    frames = []
+    for img in (Image.new("RGB", (40, 60), (211, 211, 211)), _generated()):
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+        frames.append(buf.getvalue())
+
+    class FakePixelizer:
+        def pixelize(self, pil_img, output_path=None, **kwargs):
+            yield from frames
+
+    stored = []
+    monkeypatch.setattr(mod, "load_and_resize", lambda buf: tiny_rgba_image)
+    monkeypatch.setattr(mod, "pixelizer", FakePixelizer())
+    monkeypatch.setattr(mod, "EXPORT_SPRITES", True)
+    monkeypatch.setattr(mod.output_store, "put", stored.append)
+
+    list(mod.process_image(str(src)))
+    assert [Image.open(io.BytesIO(b)).size for b in stored] == snapshot([(16, 40)])
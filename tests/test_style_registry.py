@@ -0,0 +1,134 @@
+import io
+import os
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image, ImageChops
+from inline_snapshot import snapshot
+
+import pixelizer_ci as mod
+from gpt_model.pixelizer_model import Pixelizer
+from util.image_operations import concatenate_images, load_and_resize
+from util.style_registry import StyleRegistry
+
+
+def _make_style(root, name, colors, prompt=None):
+    style_dir = root / name
+    style_dir.mkdir(parents=True, exist_ok=True)
+    for i, color in enumerate(colors):
+        Image.new("RGBA", (40, 60 + 10 * i), color).save(style_dir / f"ref{i + 1}.png")
+    if prompt is not None:
+        (style_dir / "prompt.txt").write_text(prompt)
+    return style_dir
+
+
+def _png(size, color):
+    buf = io.BytesIO()
+    Image.new("RGBA", size, color).save(buf, format="PNG")
+    buf.seek(0)
+    return buf
+
+
+def test_composite_matches_concatenate_images(tmp_path):
+    style_dir = _make_style(
+        tmp_path, "retro", ["red", "green", "blue"], "{ref_count} refs"
+    )
+    registry = StyleRegistry(tmp_path)
+    assert registry.names() == snapshot(["retro"])
+
+    prepared = registry.prepare("retro", ref_count=2)
+    assert prepared.prompt == snapshot("2 refs")
+
+    composite = Image.open(prepared.composite(_png((30, 90), "white")))
+    expected = Image.open(
+        concatenate_images(
+            [_png((30, 90), "white")]
+            + [load_and_resize(str(style_dir / f"ref{i}.png")) for i in (1, 2)]
+        )
+    )
+    assert composite.size == expected.size == snapshot((110, 90))
+    assert ImageChops.difference(composite, expected).getbbox() is None
+
+
+def test_cache_is_lru_within_byte_budget(tmp_path):
+    _make_style(tmp_path, "a", ["red"], "a")
+    _make_style(tmp_path, "b", ["blue"], "b")
+    one_entry = 40 * 60 * 3
+    registry = StyleRegistry(tmp_path, max_bytes=one_entry)
+
+    first = registry.prepare("a")
+    assert registry.prepare("a") is first
+    registry.prepare("b")
+    registry.prepare("a")
+    assert registry.stats() == snapshot(
+        {
+            "styles": 2,
+            "cached": 1,
+            "cache_bytes": 7200,
+            "hits": 1,
+            "misses": 3,
+            "reloads": 0,
+        }
+    )
+
+
+def test_changed_files_are_reloaded(tmp_path):
+    style_dir = _make_style(tmp_path, "retro", ["red"], "alt")
+    registry = StyleRegistry(tmp_path, poll_s=0)
+    old = registry.prepare("retro")
+
+    (style_dir / "prompt.txt").write_text("neu")
+    stat = (style_dir / "prompt.txt").stat()
+    os.utime(style_dir / "prompt.txt", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    _make_style(tmp_path, "mono", ["black"])
+
+    new = registry.prepare("retro")
+    assert new is not old
+    assert new.prompt == snapshot("neu")
+    assert registry.names() == snapshot(["mono", "retro"])
+    assert registry.stats()["reloads"] == snapshot(1)
+
+
+def test_style_without_prompt_uses_default_prompt(tmp_path):
+    _make_style(tmp_path / "styles", "mono", ["black"])
+    registry = StyleRegistry(tmp_path / "styles")
+    with pytest.raises(ValueError):
+        registry.prepare("mono")
+    Image.new("RGBA", (40, 60), "red").save(tmp_path / "ref1.png")
+    registry.register("standard", [tmp_path / "ref1.png"], "Standard {ref_count}")
+    assert registry.prepare("mono").prompt == snapshot("Standard 1")
+
+
+def test_pixelizer_selects_style_per_request(tmp_path, tiny_png_bytes):
+    _make_style(tmp_path / "styles", "retro", ["red", "green"], "retro {ref_count}")
+    for i in range(2):
+        Image.new("RGBA", (40, 60), "blue").save(tmp_path / f"ref{i + 1}.png")
+    calls = []
+
+    class FakeImages:
+        def edit(self, **kwargs):
+            calls.append(kwargs)
+            yield SimpleNamespace(type="image_edit.partial_image", b64_json="")
+
+    class StubPixelizer(Pixelizer):
+        def _create_client(self):
+            return SimpleNamespace(images=FakeImages())
+
+    registry = StyleRegistry(tmp_path / "styles")
+    px = StubPixelizer(ref_dir=str(tmp_path), ref_count=2, styles=registry)
+    assert registry.names() == snapshot(["retro", "standard"])
+
+    list(px.pixelize(_png((30, 90), "white"), style="retro"))
+    list(px.pixelize(_png((30, 90), "white")))
+    assert calls[0]["prompt"] == snapshot("retro 2")
+    assert calls[1]["prompt"] == px.prompt
+    composite = Image.open(calls[0]["image"])
+    assert composite.getpixel((35, 45)) == snapshot((255, 0, 0))
+
+
+def test_process_image_rejects_unknown_style(tmp_path, warnings_sink, monkeypatch):
+    monkeypatch.setattr(mod, "style_registry", StyleRegistry(tmp_path))
+    src = tmp_path / "in.png"
+    Image.new("RGBA", (10, 10), "red").save(src)
+    assert list(mod.process_image(str(src), style="gibtsnicht")) == [None]
+    assert warnings_sink == snapshot([("error", "Unbekannter Stil: gibtsnicht")])
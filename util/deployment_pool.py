@@ -0,0 +1,227 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+AZURE_API_VERSION = "2025-04-01-preview"
+
+
+class AllThrottled(RuntimeError):
+    """Raised by ``DeploymentPool.lease`` when no deployment is available."""
+
+
+@dataclass(frozen=True)
+class Deployment:
+    """One Azure OpenAI endpoint + key + deployment name."""
+
+    endpoint: str
+    api_key: str
+    deployment: str
+    weight: float = 1.0
+    name: str = None
+    api_version: str = AZURE_API_VERSION
+
+    @property
+    def label(self):
+        return self.name or f"{urlparse(self.endpoint).netloc}/{self.deployment}"
+
+
+def load_deployments(spec):
+    """
+    Deployments from a JSON list (env ``AZURE_OPENAI_DEPLOYMENTS``), e.g.
+    ``[{"endpoint": "https://a.openai.azure.com", "api_key_env": "KEY_A",
+    "deployment": "gpt-image-1", "weight": 2}]``. ``api_key_env`` names an
+    environment variable holding the key, so keys stay out of the list.
+    """
+    entries = json.loads(spec)
+    deployments = []
+    for entry in entries:
+        entry = dict(entry)
+        key_env = entry.pop("api_key_env", None)
+        if key_env is not None:
+            entry["api_key"] = os.environ.get(key_env)
+        if not entry.get("api_key"):
+            raise ValueError(f"Kein API-Key für {entry.get('endpoint')}.")
+        deployments.append(Deployment(**entry))
+    return deployments
+
+
+@dataclass
+class Lease:
+    """A deployment handed out for one request."""
+
+    deployment: Deployment
+    client: object
+    succeeded: bool = False
+
+
+class _State:
+    def __init__(self, deployment, client, prior_latency_s):
+        self.deployment = deployment
+        self.client = client
+        self.latency_s = prior_latency_s
+        self.outstanding = 0
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+        self.throttled = 0
+        self.cooldown_until = 0.0
+        self.busy_s = 0.0
+        self.busy_since = None
+
+
+class DeploymentPool:
+    """
+    Weighted least-outstanding-requests balancing over Azure deployments.
+
+    A request goes to the available deployment with the lowest
+    ``(outstanding + 1) * latency / weight``, i.e. the one expected to finish
+    it first; ``latency`` is an EWMA of its successful request times, starting
+    at ``prior_latency_s`` until the first one has been observed. A
+    deployment that answered 429 sits out until its ``Retry-After`` (or
+    ``cooldown_s``) has passed.
+    """
+
+    def __init__(
+        self,
+        deployments,
+        client_factory,
+        cooldown_s=60.0,
+        alpha=0.3,
+        prior_latency_s=45.0,
+    ):
+        if not deployments:
+            raise ValueError("DeploymentPool benötigt mindestens ein Deployment.")
+        self.cooldown_s = cooldown_s
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._states = [
+            _State(d, client_factory(d), prior_latency_s) for d in deployments
+        ]
+        self._created = time.monotonic()
+
+    def __len__(self):
+        return len(self._states)
+
+    def client(self, deployment):
+        """The client created for ``deployment``."""
+        for state in self._states:
+            if state.deployment == deployment:
+                return state.client
+        raise KeyError(deployment.label)
+
+    def _choose(self, exclude, now):
+        best = None
+        for state in self._states:
+            if state.deployment in exclude or state.cooldown_until > now:
+                continue
+            score = (
+                (state.outstanding + 1) * state.latency_s / state.deployment.weight,
+                state.started,
+            )
+            if best is None or score < best[0]:
+                best = (score, state)
+        return best and best[1]
+
+    @contextmanager
+    def lease(self, exclude=()):
+        """
+        Hold the best deployment for one request.
+        Set ``lease.succeeded = True`` to feed its duration into the latency
+        estimate; otherwise it counts as failed.
+        :raises AllThrottled: every deployment is excluded or cooling down.
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._choose(exclude, now)
+            if state is None:
+                waits = [
+                    s.cooldown_until - now
+                    for s in self._states
+                    if s.deployment not in exclude and s.cooldown_until > now
+                ]
+                retry = f", wieder frei in {min(waits):.0f} s" if waits else ""
+                raise AllThrottled(f"Alle Deployments sind ausgelastet{retry}.")
+            if state.outstanding == 0:
+                state.busy_since = now
+            state.outstanding += 1
+            state.started += 1
+        lease = Lease(state.deployment, state.client)
+        try:
+            yield lease
+        finally:
+            end = time.monotonic()
+            with self._lock:
+                state.outstanding -= 1
+                if state.outstanding == 0:
+                    state.busy_s += end - state.busy_since
+                    state.busy_since = None
+                if lease.succeeded:
+                    # Die erste Messung ersetzt den Schätzwert ganz
+                    alpha = self.alpha if state.completed else 1.0
+                    state.completed += 1
+                    state.latency_s = (1 - alpha) * state.latency_s + alpha * (
+                        end - now
+                    )
+                else:
+                    state.failed += 1
+
+    def throttle(self, deployment, retry_after_s=None):
+        """Take ``deployment`` out of rotation after a 429."""
+        cooldown = self.cooldown_s if retry_after_s is None else retry_after_s
+        with self._lock:
+            for state in self._states:
+                if state.deployment == deployment:
+                    state.throttled += 1
+                    state.cooldown_until = time.monotonic() + cooldown
+        logger.warning(
+            "%s: Kontingent erschöpft, Pause %.0f s", deployment.label, cooldown
+        )
+
+    def stats(self):
+        """Per deployment: load, latency estimate, cooldown and utilization."""
+        now = time.monotonic()
+        uptime = max(now - self._created, 1e-9)
+        with self._lock:
+            return [
+                {
+                    "name": s.deployment.label,
+                    "weight": s.deployment.weight,
+                    "outstanding": s.outstanding,
+                    "started": s.started,
+                    "completed": s.completed,
+                    "failed": s.failed,
+                    "throttled": s.throttled,
+                    "latency_s": round(s.latency_s, 3),
+                    "cooldown_s": round(max(s.cooldown_until - now, 0.0), 1),
+                    # Anteil der Laufzeit mit mindestens einer offenen Anfrage
+                    "utilization": round(
+                        (
+                            s.busy_s
+                            + (now - s.busy_since if s.busy_since is not None else 0)
+                        )
+                        / uptime,
+                        3,
+                    ),
+                }
+                for s in self._states
+            ]
+
+
+def retry_after_s(error):
+    """Retry-After of an openai APIStatusError in seconds, or None."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
@@ -0,0 +1,108 @@
+import threading
+from contextlib import contextmanager
+
+
+class FrameBudget:
+    """
+    Per-process cap on the bytes of streamed frames that handlers hold at once.
+
+    A handler reserves the size of a frame before it processes it and releases
+    it once it no longer holds the frame (``reserve`` for one step, ``hold``
+    for frames kept across yields). If the budget is exhausted, the handler
+    waits until other requests release memory. A single
+    frame larger than the whole budget is still admitted when nothing else is
+    in flight, so oversized frames cannot deadlock.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._used = 0
+        self._peak = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def reserve(self, nbytes, timeout=None):
+        """
+        :param nbytes: size of the frame about to be processed.
+        :param timeout: seconds to wait for budget; raises TimeoutError after.
+        """
+        self._acquire(nbytes, timeout)
+        try:
+            yield
+        finally:
+            self._release(nbytes)
+
+    @contextmanager
+    def hold(self):
+        """
+        Reservation whose size follows the frames a handler currently holds;
+        ``held.set(nbytes)`` resizes it, everything is released on exit.
+        """
+        held = _Held(self)
+        try:
+            yield held
+        finally:
+            held.set(0)
+
+    def _acquire(self, nbytes, timeout):
+        with self._cond:
+            fits = self._cond.wait_for(
+                lambda: self._used == 0 or self._used + nbytes <= self.max_bytes,
+                timeout,
+            )
+            if not fits:
+                raise TimeoutError("Speicherbudget für Bildframes erschöpft.")
+            self._used += nbytes
+            self._peak = max(self._peak, self._used)
+
+    def _force(self, nbytes):
+        with self._cond:
+            self._used += nbytes
+            self._peak = max(self._peak, self._used)
+
+    def _release(self, nbytes):
+        with self._cond:
+            self._used -= nbytes
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {"used": self._used, "peak": self._peak, "max": self.max_bytes}
+
+
+class _Held:
+    """Resizable reservation of one handler (see FrameBudget.hold)."""
+
+    def __init__(self, budget):
+        self._budget = budget
+        self.nbytes = 0
+
+    def set(self, nbytes, timeout=None):
+        """
+        Resize to ``nbytes``. Shrinking never waits. Growing first gives back
+        the current reservation and then waits for the full size, so two
+        handlers that both want more cannot block each other forever. On
+        TimeoutError the previous reservation is restored, since the caller
+        still holds those frames.
+        """
+        if nbytes <= self.nbytes:
+            self._budget._release(self.nbytes - nbytes)
+            self.nbytes = nbytes
+            return
+        previous = self.nbytes
+        self._budget._release(previous)
+        self.nbytes = 0
+        try:
+            self._budget._acquire(nbytes, timeout)
+        except TimeoutError:
+            self.force(previous)
+            raise
+        self.nbytes = nbytes
+
+    def force(self, nbytes):
+        """
+        Grow to ``nbytes`` without waiting, even beyond ``max_bytes``; for
+        frames that are already in memory and must not be dropped.
+        """
+        self._budget._force(nbytes - self.nbytes)
+        self.nbytes = nbytes
@@ -0,0 +1,137 @@
+"""
+Group photos: find the people in one input image, generate each of them
+separately and put the resulting characters side by side.
+
+Detection uses OpenCV's frontal face cascade (optional dependency
+``opencv-python-headless``); a person's crop is derived from the face box.
+"""
+
+import io
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+from PIL import Image
+
+from util.sprite_export import extract_sprite, kind_pnginfo
+
+LINEUP_BACKGROUND = (211, 211, 211)  # #d3d3d3 wie im Prompt
+
+
+def detect_faces(image, min_face_px=40):
+    """
+    Face boxes ``(x, y, w, h)`` in a PIL image, left to right.
+    Requires opencv-python-headless.
+    """
+    try:
+        import cv2
+    except ImportError as e:
+        raise RuntimeError(
+            "Gruppenfotos benötigen opencv-python-headless "
+            "(pip install opencv-python-headless)."
+        ) from e
+
+    gray = cv2.cvtColor(np.asarray(image.convert("RGB")), cv2.COLOR_RGB2GRAY)
+    cascade = cv2.CascadeClassifier(
+        cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+    )
+    faces = cascade.detectMultiScale(
+        cv2.equalizeHist(gray),
+        scaleFactor=1.1,
+        minNeighbors=6,
+        minSize=(min_face_px, min_face_px),
+    )
+    return sorted((tuple(int(v) for v in face) for face in faces), key=lambda f: f[0])
+
+
+def person_boxes(faces, image_size, width_factor=3.0, above=0.6, below=7.0):
+    """
+    Crop boxes ``(left, top, right, bottom)`` for the people behind ``faces``.
+
+    Each box is ``width_factor`` face widths wide and reaches from ``above``
+    face heights over the face to ``below`` face heights under it. Neighbours
+    are separated at the midpoint between their faces, so no crop contains
+    half of the next person.
+    """
+    width, height = image_size
+    faces = sorted(faces, key=lambda f: f[0] + f[2] / 2)
+    centers = [x + w / 2 for x, _, w, _ in faces]
+    boxes = []
+    for i, (x, y, w, h) in enumerate(faces):
+        left = centers[i] - width_factor * w / 2
+        right = centers[i] + width_factor * w / 2
+        if i > 0:
+            left = max(left, (centers[i - 1] + centers[i]) / 2)
+        if i < len(faces) - 1:
+            right = min(right, (centers[i] + centers[i + 1]) / 2)
+        boxes.append(
+            (
+                max(int(left), 0),
+                max(int(y - above * h), 0),
+                min(int(right), width),
+                min(int(y + h + below * h), height),
+            )
+        )
+    return boxes
+
+
+def detect_people(image, detector=detect_faces):
+    """Crop boxes of all people in ``image``, left to right."""
+    return person_boxes(detector(image), image.size)
+
+
+def generate_all(items, generate, max_parallel=4):
+    """
+    Run ``generate(item)`` for all items on at most ``max_parallel`` threads.
+
+    Yields ``(index, result, error)`` as each call finishes, so the caller can
+    show progress; total time is about that of the slowest call (as long as
+    ``max_parallel >= len(items)``). Closing the generator cancels calls that
+    have not started yet.
+    """
+    items = list(items)
+    if not items:
+        return
+    executor = ThreadPoolExecutor(
+        max_workers=max(1, min(max_parallel, len(items))),
+        thread_name_prefix="group",
+    )
+    try:
+        pending = {executor.submit(generate, item): i for i, item in enumerate(items)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                error = future.exception()
+                yield index, None if error else future.result(), error
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def assemble_lineup(frames, gap=24, margin=24, background=LINEUP_BACKGROUND):
+    """
+    Place the characters of several generated frames side by side.
+
+    Args:
+        frames: encoded images (Pixelizer output) in lineup order; None
+            entries (not finished yet / failed) are skipped
+        gap: pixels between two characters
+        margin: pixels around the lineup
+        background: RGB colour of the lineup
+
+    Returns:
+        bytes: PNG of the lineup (characters bottom-aligned at equal scale)
+    """
+    sprites = [extract_sprite(frame) for frame in frames if frame is not None]
+    if not sprites:
+        raise ValueError("Keine fertigen Figuren für die Aufstellung.")
+    height = max(sprite.height for sprite in sprites)
+    width = sum(sprite.width for sprite in sprites) + gap * (len(sprites) - 1)
+    lineup = Image.new("RGB", (width + 2 * margin, height + 2 * margin), background)
+    x = margin
+    for sprite in sprites:
+        lineup.paste(sprite, (x, margin + height - sprite.height), sprite)
+        x += sprite.width + gap
+
+    buf = io.BytesIO()
+    lineup.save(buf, format="PNG", pnginfo=kind_pnginfo("lineup"))
+    return buf.getvalue()
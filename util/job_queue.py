@@ -0,0 +1,318 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    target BLOB NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    visible_at REAL NOT NULL,
+    lease_owner TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, visible_at, created_at);
+CREATE TABLE IF NOT EXISTS frames (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    data BLOB NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS frames_job ON frames (job_id, id);
+"""
+
+
+@dataclass
+class Job:
+    id: str
+    status: str
+    params: dict
+    attempts: int
+    max_attempts: int
+    error: str = None
+    target: bytes = None
+
+
+class JobQueue:
+    """
+    Durable generation queue in a single SQLite file (WAL mode), shared by the
+    UI process and any number of worker processes.
+
+    A claimed job is leased for ``visibility_timeout_s``; a worker extends the
+    lease with every frame it adds (or ``heartbeat``). If the worker dies, the
+    lease expires and another worker claims the job again, until
+    ``max_attempts`` is reached. Frames get ids that grow across attempts, so
+    readers can poll with ``after=<last seen id>``.
+    """
+
+    def __init__(
+        self, path, visibility_timeout_s=120, max_attempts=3, retry_delay_s=2.0
+    ):
+        self.path = str(path)
+        self.visibility_timeout_s = visibility_timeout_s
+        self.max_attempts = max_attempts
+        self.retry_delay_s = retry_delay_s
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        # Neue Verbindung nach fork(): SQLite-Verbindungen nicht teilen
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return _Transaction(conn)
+
+    # --- producer side ---
+
+    def submit(self, target, params=None, max_attempts=None):
+        """
+        :param target: preprocessed target image (PNG bytes).
+        :param params: keyword arguments for Pixelizer.pixelize.
+        :return: job id
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, params, target, max_attempts,"
+                " visible_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    QUEUED,
+                    json.dumps(params or {}),
+                    sqlite3.Binary(target),
+                    max_attempts or self.max_attempts,
+                    now,
+                    now,
+                    now,
+                ),
+            )
+        return job_id
+
+    def get(self, job_id):
+        with self._conn() as conn:
+            row = conn.execute(
+                "SELECT id, status, params, attempts, max_attempts, error"
+                " FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            raise KeyError(job_id)
+        return Job(row[0], row[1], json.loads(row[2]), row[3], row[4], row[5])
+
+    def frames(self, job_id, after=0):
+        """Frames newer than frame id ``after`` as ``[(frame_id, bytes)]``."""
+        with self._conn() as conn:
+            rows = conn.execute(
+                "SELECT id, data FROM frames WHERE job_id = ? AND id > ? ORDER BY id",
+                (job_id, after),
+            ).fetchall()
+        return [(frame_id, bytes(data)) for frame_id, data in rows]
+
+    def stream(self, job_id, poll_s=0.25, timeout_s=None):
+        """
+        Yield frame bytes of a job as they arrive until it is done.
+        Raises RuntimeError if the job failed, TimeoutError after ``timeout_s``.
+        """
+        deadline = None if timeout_s is None else time.monotonic() + timeout_s
+        last = 0
+        while True:
+            job = self.get(job_id)
+            for last, data in self.frames(job_id, after=last):
+                yield data
+            if job.status == DONE:
+                # Frames, die zwischen get() und frames() dazukamen, nachreichen
+                for last, data in self.frames(job_id, after=last):
+                    yield data
+                return
+            if job.status == FAILED:
+                raise RuntimeError(job.error or "Auftrag fehlgeschlagen.")
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"Auftrag {job_id} nicht rechtzeitig fertig.")
+            time.sleep(poll_s)
+
+    def depth(self):
+        """Number of queued + running jobs."""
+        with self._conn() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchone()[0]
+
+    # --- worker side ---
+
+    def claim(self, worker_id):
+        """
+        Lease the oldest visible job (queued, or running with expired lease).
+        :return: Job including the target bytes, or None if nothing is due.
+        """
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            while True:
+                row = conn.execute(
+                    "SELECT id, params, attempts, max_attempts, target FROM jobs"
+                    " WHERE status IN (?, ?) AND visible_at <= ?"
+                    " ORDER BY created_at LIMIT 1",
+                    (QUEUED, RUNNING, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                job_id, params, attempts, max_attempts, target = row
+                if attempts >= max_attempts:
+                    # Lease abgelaufen und keine Versuche mehr übrig
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, error = ?, lease_owner = NULL,"
+                        " target = X'', updated_at = ? WHERE id = ?",
+                        (FAILED, "Worker-Lease abgelaufen.", now, job_id),
+                    )
+                    continue
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1,"
+                    " lease_owner = ?, visible_at = ?, updated_at = ? WHERE id = ?",
+                    (
+                        RUNNING,
+                        worker_id,
+                        now + self.visibility_timeout_s,
+                        now,
+                        job_id,
+                    ),
+                )
+                # Ein neuer Versuch streamt von vorn
+                conn.execute("DELETE FROM frames WHERE job_id = ?", (job_id,))
+                return Job(
+                    job_id,
+                    RUNNING,
+                    json.loads(params),
+                    attempts + 1,
+                    max_attempts,
+                    target=bytes(target),
+                )
+
+    def heartbeat(self, job_id, worker_id):
+        """Extend the lease. Returns False if the worker no longer owns the job."""
+        now = time.time()
+        with self._conn() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET visible_at = ?, updated_at = ?"
+                " WHERE id = ? AND lease_owner = ? AND status = ?",
+                (now + self.visibility_timeout_s, now, job_id, worker_id, RUNNING),
+            )
+            return cur.rowcount == 1
+
+    def add_frame(self, job_id, worker_id, data):
+        """Append a frame and extend the lease. Returns False if the lease is lost."""
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cur = conn.execute(
+                "UPDATE jobs SET visible_at = ?, updated_at = ?"
+                " WHERE id = ? AND lease_owner = ? AND status = ?",
+                (now + self.visibility_timeout_s, now, job_id, worker_id, RUNNING),
+            )
+            if cur.rowcount != 1:
+                return False
+            conn.execute(
+                "INSERT INTO frames (job_id, data, created_at) VALUES (?, ?, ?)",
+                (job_id, sqlite3.Binary(data), now),
+            )
+            return True
+
+    def complete(self, job_id, worker_id):
+        """Mark done; only the last (final) frame is kept, the target is dropped."""
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cur = conn.execute(
+                "UPDATE jobs SET status = ?, lease_owner = NULL, target = X'',"
+                " updated_at = ?"
+                " WHERE id = ? AND lease_owner = ? AND status = ?",
+                (DONE, now, job_id, worker_id, RUNNING),
+            )
+            if cur.rowcount != 1:
+                return False
+            conn.execute(
+                "DELETE FROM frames WHERE job_id = ? AND id < "
+                "(SELECT MAX(id) FROM frames WHERE job_id = ?)",
+                (job_id, job_id),
+            )
+            return True
+
+    def fail(self, job_id, worker_id, error):
+        """Release the job for a retry, or fail it for good after max_attempts."""
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM jobs"
+                " WHERE id = ? AND lease_owner = ? AND status = ?",
+                (job_id, worker_id, RUNNING),
+            ).fetchone()
+            if row is None:
+                return False
+            attempts, max_attempts = row
+            if attempts >= max_attempts:
+                status, visible_at = FAILED, now
+            else:
+                status, visible_at = QUEUED, now + self.retry_delay_s * attempts
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_owner = NULL,"
+                " visible_at = ?, updated_at = ? WHERE id = ?",
+                (status, str(error), visible_at, now, job_id),
+            )
+            if status == FAILED:
+                # Kein weiterer Versuch: Zielbild wird nicht mehr gebraucht
+                conn.execute("UPDATE jobs SET target = X'' WHERE id = ?", (job_id,))
+            return True
+
+    def purge(self, older_than_s):
+        """Delete finished jobs (and their frames) older than ``older_than_s``."""
+        cutoff = time.time() - older_than_s
+        with self._conn() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "DELETE FROM frames WHERE job_id IN (SELECT id FROM jobs"
+                " WHERE status IN (?, ?) AND updated_at < ?)",
+                (DONE, FAILED, cutoff),
+            )
+            cur = conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (DONE, FAILED, cutoff),
+            )
+            return cur.rowcount
+
+
+class _Transaction:
+    """Context manager: commit explicit transactions on success, roll back on error."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.conn.in_transaction:
+            if exc_type is None:
+                self.conn.execute("COMMIT")
+            else:
+                self.conn.execute("ROLLBACK")
+        return False
@@ -0,0 +1,193 @@
+import logging
+import signal
+import threading
+import time
+from contextlib import contextmanager
+
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+STARTING = "starting"
+READY = "ready"
+DRAINING = "draining"
+STOPPED = "stopped"
+
+
+class Draining(RuntimeError):
+    """Raised by ``Lifecycle.track`` once the process no longer accepts work."""
+
+
+class Lifecycle:
+    """
+    Readiness, liveness and graceful drain of one server process.
+
+    ``readiness()`` is True once ``mark_ready`` was called and all registered
+    checks pass (backend constructed, references loaded, ...), and False
+    again as soon as a drain starts, so the load balancer stops routing here.
+
+    Requests run inside ``track()``. ``drain`` rejects new ones and waits up to
+    ``drain_timeout_s`` for the running ones (typically open ``pixelize``
+    streams) to finish; whatever is still running then counts as dropped.
+    """
+
+    def __init__(self, drain_timeout_s=90.0):
+        self.drain_timeout_s = drain_timeout_s
+        self.state = STARTING
+        self._checks = {}
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self.started = 0
+        self.completed = 0
+        self.rejected = 0
+        self.last_drain = None
+
+    # --- readiness / liveness ---
+
+    def add_check(self, name, check):
+        """``check()`` returns True/False or raises; all must pass for readiness."""
+        self._checks[name] = check
+
+    def mark_ready(self):
+        with self._cond:
+            if self.state == STARTING:
+                self.state = READY
+
+    def accepting(self):
+        return self.state not in (DRAINING, STOPPED)
+
+    def readiness(self):
+        """(ready, {check name: "ok" or reason})"""
+        results = {}
+        for name, check in self._checks.items():
+            try:
+                results[name] = "ok" if check() else "nicht bereit"
+            except Exception as e:
+                results[name] = f"Fehler: {e}"
+        ready = self.state == READY and all(r == "ok" for r in results.values())
+        return ready, results
+
+    def stats(self):
+        with self._cond:
+            return {
+                "state": self.state,
+                "in_flight": self._in_flight,
+                "started": self.started,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "last_drain": self.last_drain,
+            }
+
+    # --- requests ---
+
+    @contextmanager
+    def track(self):
+        """Count a request as in flight; raises Draining during shutdown."""
+        with self._cond:
+            if not self.accepting():
+                self.rejected += 1
+                raise Draining("Der Server fährt herunter.")
+            self._in_flight += 1
+            self.started += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self.completed += 1
+                self._cond.notify_all()
+
+    # --- shutdown ---
+
+    def stop_accepting(self):
+        """Readiness turns False and ``track`` rejects new requests."""
+        with self._cond:
+            if self.state != STOPPED:
+                self.state = DRAINING
+
+    def drain(self, timeout_s=None):
+        """
+        Stop accepting requests and wait for the running ones.
+        :return: report dict (drain_s, completed, dropped, rejected)
+        """
+        if self.state == STOPPED:
+            return self.last_drain
+        timeout_s = self.drain_timeout_s if timeout_s is None else timeout_s
+        start = time.monotonic()
+        self.stop_accepting()
+        with self._cond:
+            in_flight = self._in_flight
+            completed_before = self.completed
+            rejected_before = self.rejected
+            logger.info("Drain gestartet: %d laufende Anfragen", in_flight)
+            self._cond.wait_for(lambda: self._in_flight == 0, timeout_s)
+            self.state = STOPPED
+            self.last_drain = {
+                "drain_s": round(time.monotonic() - start, 3),
+                "in_flight_at_start": in_flight,
+                "completed": self.completed - completed_before,
+                "dropped": self._in_flight,
+                "rejected": self.rejected - rejected_before,
+            }
+        logger.info(
+            "Drain beendet nach %.1f s: %d abgeschlossen, %d abgebrochen, "
+            "%d abgewiesen",
+            self.last_drain["drain_s"],
+            self.last_drain["completed"],
+            self.last_drain["dropped"],
+            self.last_drain["rejected"],
+        )
+        return self.last_drain
+
+
+def add_health_routes(app, lifecycle):
+    """
+    GET /healthz (liveness): 200 while the process serves HTTP, also during
+    a drain. GET /readyz (readiness): 200 only when ready for new requests.
+    """
+
+    @app.get("/healthz")
+    def healthz():
+        return lifecycle.stats()
+
+    @app.get("/readyz")
+    def readyz():
+        ready, checks = lifecycle.readiness()
+        return JSONResponse(
+            {"ready": ready, "state": lifecycle.state, "checks": checks},
+            status_code=200 if ready else 503,
+        )
+
+
+def serve(app, lifecycle, host="0.0.0.0", port=8000, **config):
+    """
+    Run ``app`` with uvicorn; SIGTERM/SIGINT first drain ``lifecycle`` and
+    only then stop the server. A second signal exits immediately.
+    """
+    import uvicorn
+
+    class DrainingServer(uvicorn.Server):
+        def handle_exit(self, sig, frame):
+            if not lifecycle.accepting():
+                self.force_exit = True
+                super().handle_exit(sig, frame)
+                return
+            logger.info("Signal %s: beginne Drain", signal.Signals(sig).name)
+            # Readiness sofort auf 503, HTTP bleibt für laufende Streams offen
+            lifecycle.stop_accepting()
+            threading.Thread(
+                target=self._drain_then_exit, args=(sig, frame), daemon=True
+            ).start()
+
+        def _drain_then_exit(self, sig, frame):
+            lifecycle.drain()
+            # Nicht über handle_exit: uvicorn würde das Signal danach erneut
+            # auslösen, der Prozess soll nach dem Drain aber regulär enden.
+            self.should_exit = True
+
+    # Nach dem Drain verbliebene Verbindungen nicht weiter abwarten
+    config.setdefault("timeout_graceful_shutdown", 1)
+    server = DrainingServer(uvicorn.Config(app, host=host, port=port, **config))
+    lifecycle.mark_ready()
+    server.run()
+    return lifecycle.last_drain
@@ -0,0 +1,173 @@
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class QualityTier:
+    """One set of generation settings, from best to cheapest."""
+
+    name: str
+    quality: str
+    partial_images: int
+    ref_count: int
+    size: str
+    # Prior for the generation latency before we have observed any requests.
+    expected_latency_s: float
+
+    def pixelize_kwargs(self):
+        return {
+            "quality": self.quality,
+            "partial_images": self.partial_images,
+            "ref_count": self.ref_count,
+            "size": self.size,
+        }
+
+
+DEFAULT_TIERS = (
+    QualityTier("voll", "medium", 3, 7, "1024x1536", 45.0),
+    QualityTier("reduziert", "low", 2, 5, "1024x1536", 25.0),
+    QualityTier("schnell", "low", 1, 3, "1024x1024", 15.0),
+)
+
+
+@dataclass
+class Ticket:
+    """Admission of one request: the chosen tier and the queue it saw."""
+
+    tier: QualityTier
+    queue_depth: int
+    predicted_s: float
+    succeeded: bool = False
+
+
+class LoadPolicy:
+    """
+    Picks generation settings per request so that queueing + generation stays
+    within a latency SLO.
+
+    At most ``concurrency`` generations run at once; further requests wait in
+    ``admit``. For a new request the expected completion time of each tier is
+    ``(queue_depth // concurrency + 1) * latency(tier)``, where ``latency`` is an
+    EWMA of observed generation times. The best tier that meets the SLO wins;
+    if none does, the cheapest tier is used.
+
+    A tier that is not picked is not measured either, so without new
+    observations its estimate decays back toward ``expected_latency_s`` with
+    a half-life of ``recovery_half_life_s``. One slow outlier therefore
+    keeps a tier off only for a while, not until restart.
+    """
+
+    def __init__(
+        self,
+        tiers=DEFAULT_TIERS,
+        slo_s=60.0,
+        concurrency=4,
+        alpha=0.3,
+        recovery_half_life_s=300.0,
+        clock=time.monotonic,
+    ):
+        if not tiers:
+            raise ValueError("LoadPolicy benötigt mindestens eine Qualitätsstufe.")
+        self.tiers = tuple(tiers)
+        self.slo_s = slo_s
+        self.concurrency = concurrency
+        self.alpha = alpha
+        self.recovery_half_life_s = recovery_half_life_s
+        self._clock = clock
+        # tier name -> (estimate, time of the last observation)
+        self._latency = {t.name: (t.expected_latency_s, clock()) for t in self.tiers}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._waiting = 0
+        self._active = 0
+
+    def latency(self, tier):
+        with self._lock:
+            return self._current(tier)
+
+    def _current(self, tier):
+        """Estimate of ``tier``, decayed toward its prior since the last update."""
+        estimate, updated = self._latency[tier.name]
+        if not self.recovery_half_life_s:
+            return estimate
+        age = max(self._clock() - updated, 0.0)
+        weight = 0.5 ** (age / self.recovery_half_life_s)
+        return tier.expected_latency_s + (estimate - tier.expected_latency_s) * weight
+
+    def select(self, queue_depth):
+        """Return ``(tier, predicted_s)`` for a request with ``queue_depth`` ahead."""
+        with self._lock:
+            return self._select(queue_depth)
+
+    def select_batch(self, count, queue_depth=None):
+        """
+        One tier for ``count`` requests submitted together (e.g. the persons
+        of a group photo), chosen for the last of them so all meet the SLO.
+        ``queue_depth`` defaults to the requests waiting and running in
+        ``admit``. Returns ``(tier, predicted_s)``; pass the tier to ``admit``.
+        """
+        with self._lock:
+            if queue_depth is None:
+                queue_depth = self._waiting + self._active
+            return self._select(queue_depth + count - 1)
+
+    def _select(self, queue_depth):
+        rounds = queue_depth // self.concurrency + 1
+        predicted = 0.0
+        for tier in self.tiers:
+            predicted = rounds * self._current(tier)
+            if predicted <= self.slo_s:
+                return tier, predicted
+        return self.tiers[-1], predicted
+
+    def record(self, tier, latency_s):
+        with self._lock:
+            old = self._current(tier)
+            self._latency[tier.name] = (
+                (1 - self.alpha) * old + self.alpha * latency_s,
+                self._clock(),
+            )
+
+    @contextmanager
+    def admit(self, tier=None):
+        """
+        Choose a tier (unless ``tier`` is given), wait for a free generation
+        slot and hold it.
+        Set ``ticket.succeeded = True`` to feed the generation time back into
+        the latency estimate.
+        """
+        with self._lock:
+            depth = self._waiting + self._active
+            if tier is None:
+                tier, predicted = self._select(depth)
+            else:
+                predicted = (depth // self.concurrency + 1) * self._current(tier)
+            self._waiting += 1
+        ticket = Ticket(tier=tier, queue_depth=depth, predicted_s=predicted)
+        try:
+            self._slots.acquire()
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        with self._lock:
+            self._active += 1
+        start = time.monotonic()
+        try:
+            yield ticket
+        finally:
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self._active -= 1
+            self._slots.release()
+            if ticket.succeeded:
+                self.record(tier, elapsed)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "waiting": self._waiting,
+                "active": self._active,
+                "latency_s": {t.name: self._current(t) for t in self.tiers},
+            }
@@ -0,0 +1,214 @@
+"""
+Micro-batching for non-streaming backends: requests arriving within a short
+window share one model call. Several targets go into one composite, the
+model draws one character per target side by side, and the output row is
+split back into one image per request. A row with a different number of
+figures than requests raises ``FigureCountMismatch``, so the caller can
+generate those targets one by one instead of handing out wrong cut-outs.
+"""
+
+import io
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from util.sprite_export import background_mask, estimate_background
+
+logger = logging.getLogger(__name__)
+
+
+class FigureCountMismatch(ValueError):
+    """The model drew a different number of figures than requested."""
+
+
+class MicroBatcher:
+    """
+    Collects submitted items into batches for ``process_batch(items)``, which
+    returns one result per item (same order).
+
+    A batch is dispatched when it holds ``max_batch`` items or ``window_s``
+    after its first item arrived, whichever comes first; so a single request
+    waits at most ``window_s`` longer than without batching. Up to
+    ``max_parallel`` batches run at once.
+    """
+
+    def __init__(self, process_batch, max_batch=4, window_s=0.25, max_parallel=4):
+        if max_batch < 1:
+            raise ValueError("max_batch muss mindestens 1 sein.")
+        self.process_batch = process_batch
+        self.max_batch = max_batch
+        self.window_s = window_s
+        self._cond = threading.Condition()
+        # (item, future, submitted_at)
+        self._pending = []
+        self._closed = False
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_parallel, thread_name_prefix="batch"
+        )
+        self.batches = 0
+        self.items = 0
+        self.wait_s = 0.0
+        self._thread = threading.Thread(
+            target=self._run, name="micro-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, item):
+        """Queue ``item``; the returned Future resolves to its result."""
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher ist geschlossen.")
+            self._pending.append((item, future, time.monotonic()))
+            self._cond.notify()
+        return future
+
+    def close(self):
+        """Dispatch what is still pending, then stop."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch": (
+                    round(self.items / self.batches, 2) if self.batches else 0
+                ),
+                "calls_saved": self.items - self.batches,
+                "mean_wait_s": round(self.wait_s / self.items, 3) if self.items else 0,
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                deadline = self._pending[0][2] + self.window_s
+                while len(self._pending) < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[: self.max_batch]
+                del self._pending[: self.max_batch]
+                now = time.monotonic()
+                self.batches += 1
+                self.items += len(batch)
+                self.wait_s += sum(now - submitted for _, _, submitted in batch)
+            self._executor.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch):
+        try:
+            results = self.process_batch([item for item, _, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(
+                    f"{len(results)} Ergebnisse für {len(batch)} Anfragen."
+                )
+        except Exception as e:
+            logger.exception("Batch mit %d Anfragen fehlgeschlagen", len(batch))
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
+
+
+def figure_spans(rgb, min_column_fraction=0.02, min_width_fraction=0.01):
+    """
+    Horizontal extent of every figure in a row image, left to right.
+
+    A column belongs to a figure if at least ``min_column_fraction`` of its
+    pixels are not background (``background_mask``); neighbouring such
+    columns form one figure, so detached parts (hair, shoes) still count
+    once. Runs narrower than ``min_width_fraction`` of the width are noise.
+
+    Returns:
+        list: ``(left, right)`` column ranges, right exclusive
+    """
+    height, width = rgb.shape[:2]
+    foreground = (~background_mask(rgb)).sum(axis=0) >= max(
+        1, min_column_fraction * height
+    )
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], foreground, [0]))))
+    return [
+        (int(left), int(right))
+        for left, right in zip(edges[::2], edges[1::2])
+        if right - left >= max(1, min_width_fraction * width)
+    ]
+
+
+def fit_frame(image, size):
+    """
+    Pad ``image`` with its background colour to the aspect ratio of ``size``
+    and scale it there (nearest neighbour, the output is pixel art).
+    """
+    width, height = size
+    background = estimate_background(np.asarray(image))
+    # Kleinste Fläche im Zielformat, die das Bild ganz enthält
+    scale = max(image.width / width, image.height / height)
+    canvas_size = (round(width * scale), round(height * scale))
+    canvas = Image.new("RGB", canvas_size, background)
+    # Horizontal zentriert, unten bündig wie im unbatched Bild
+    canvas.paste(
+        image,
+        ((canvas_size[0] - image.width) // 2, canvas_size[1] - image.height),
+    )
+    return canvas.resize(size, Image.NEAREST)
+
+
+def split_row(image_bytes, count, frame_size=None):
+    """
+    Split a generated row of ``count`` characters into one PNG per character.
+
+    The figures are found with ``figure_spans``; the cuts lie halfway in the
+    background gap between neighbouring figures.
+
+    Args:
+        image_bytes: encoded row image
+        count: expected number of figures
+        frame_size: ``(width, height)`` each panel is fitted to (see
+            ``fit_frame``); None keeps the cut-out size
+
+    Returns:
+        list: PNG bytes per panel, left to right
+
+    Raises:
+        FigureCountMismatch: the row holds a different number of figures
+    """
+    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    if count == 1:
+        panels = [image]
+    else:
+        spans = figure_spans(np.asarray(image))
+        if len(spans) != count:
+            raise FigureCountMismatch(
+                f"{len(spans)} Figuren im Bild, {count} erwartet."
+            )
+        cuts = (
+            [0]
+            + [(right + left) // 2 for (_, right), (left, _) in zip(spans, spans[1:])]
+            + [image.width]
+        )
+        panels = [
+            image.crop((left, 0, right, image.height))
+            for left, right in zip(cuts, cuts[1:])
+        ]
+
+    result = []
+    for panel_image in panels:
+        if frame_size is not None:
+            panel_image = fit_frame(panel_image, frame_size)
+        buf = io.BytesIO()
+        panel_image.save(buf, format="PNG")
+        result.append(buf.getvalue())
+    return result
@@ -0,0 +1,227 @@
+import atexit
+import hashlib
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+# Temporärdateien von atomic_write; ältere stammen von abgebrochenen Prozessen
+TMP_PREFIX = ".tmp-"
+STALE_TMP_S = 3600
+
+
+def atomic_write(path, data):
+    """
+    Write bytes to ``path`` atomically (temp file in the same directory + rename).
+
+    Readers either see the previous file or the complete new one, never a
+    half-written PNG.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(
+        dir=path.parent, prefix=TMP_PREFIX, suffix=path.suffix
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+    return path
+
+
+class OutputStore:
+    """
+    Content-addressed, sharded store for generated images.
+
+    Files are named after the SHA-256 of their content and sharded into two
+    directory levels (``ab/cd/abcd....png``), so identical results are stored
+    once and no directory grows unbounded. All disk I/O runs on a single
+    background writer thread; ``put`` only hashes the bytes and enqueues them.
+
+    Retention: entries older than ``max_age_s`` and, if the total exceeds
+    ``max_bytes``, the least recently stored entries are evicted.
+    """
+
+    def __init__(
+        self, root, max_bytes=2 * 1024**3, max_age_s=7 * 24 * 3600, suffix=".png"
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.suffix = suffix
+
+        self._lock = threading.Lock()
+        # key -> (size, stored_at), ordered from oldest to newest
+        self._index = OrderedDict()
+        self._total_bytes = 0
+        # keys whose write is still queued; never evicted before they land
+        self._pending = set()
+        self._scan()
+
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="output-store-writer", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+        # Apply retention to whatever was left over from previous runs.
+        self._enqueue(self._evict)
+
+    # --- public API ---
+
+    def path_for(self, key):
+        return self.root / key[:2] / key[2:4] / f"{key}{self.suffix}"
+
+    def put(self, data):
+        """
+        Store ``data`` asynchronously and return its (future) path.
+
+        :param data: encoded image bytes.
+        :return: Path under which the content will be available once written.
+        """
+        key = hashlib.sha256(data).hexdigest()
+        now = time.time()
+        with self._lock:
+            if key in self._index:
+                # Same content already stored: only refresh its retention.
+                size, _ = self._index.pop(key)
+                self._index[key] = (size, now)
+                self._enqueue(self._touch, key)
+                return self.path_for(key)
+            self._index[key] = (len(data), now)
+            self._total_bytes += len(data)
+            self._pending.add(key)
+        self._enqueue(self._write_entry, key, data)
+        return self.path_for(key)
+
+    def write_file(self, path, data):
+        """
+        Atomically write ``data`` to an explicit path on the writer thread.
+        Not content-addressed and not part of the byte budget (debug dumps).
+        """
+        self._enqueue(atomic_write, path, data)
+
+    def flush(self):
+        """Block until all queued writes and evictions are done."""
+        self._queue.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put((_STOP, (), {}))
+        self._thread.join()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "pending_writes": self._queue.qsize(),
+            }
+
+    # --- internals ---
+
+    def _enqueue(self, fn, *args, **kwargs):
+        if self._closed:
+            # Late writes during interpreter shutdown: do them synchronously.
+            fn(*args, **kwargs)
+            return
+        self._queue.put((fn, args, kwargs))
+
+    def _run(self):
+        while True:
+            fn, args, kwargs = self._queue.get()
+            try:
+                if fn is _STOP:
+                    return
+                fn(*args, **kwargs)
+            except Exception:
+                logger.exception("OutputStore: background write failed")
+            finally:
+                self._queue.task_done()
+
+    def _write_entry(self, key, data):
+        path = self.path_for(key)
+        try:
+            if not path.exists():
+                atomic_write(path, data)
+        except Exception:
+            # Keep the accounting honest if the disk write fails.
+            with self._lock:
+                self._pending.discard(key)
+                entry = self._index.pop(key, None)
+                if entry is not None:
+                    self._total_bytes -= entry[0]
+            raise
+        with self._lock:
+            self._pending.discard(key)
+        self._evict()
+
+    def _touch(self, key):
+        try:
+            os.utime(self.path_for(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        cutoff = time.time() - self.max_age_s if self.max_age_s else None
+        victims = []
+        with self._lock:
+            while self._index:
+                key, (size, stored_at) = next(iter(self._index.items()))
+                if key in self._pending:
+                    break
+                too_old = cutoff is not None and stored_at < cutoff
+                over_budget = (
+                    self.max_bytes is not None and self._total_bytes > self.max_bytes
+                )
+                if not (too_old or over_budget):
+                    break
+                self._index.popitem(last=False)
+                self._total_bytes -= size
+                victims.append(key)
+        for key in victims:
+            try:
+                self.path_for(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def _scan(self):
+        """
+        Rebuild the index from disk so retention survives restarts. Leftover
+        temp files of atomic_write are not indexed; stale ones are deleted
+        (fresh ones may belong to another process still writing).
+        """
+        entries = []
+        stale_before = time.time() - STALE_TMP_S
+        for path in self.root.glob(f"??/??/*{self.suffix}"):
+            try:
+                st = path.stat()
+                if path.name.startswith(TMP_PREFIX):
+                    if st.st_mtime < stale_before:
+                        path.unlink()
+                    continue
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, path.stem, st.st_size))
+        for mtime, key, size in sorted(entries):
+            self._index[key] = (size, mtime)
+            self._total_bytes += size
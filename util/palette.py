@@ -0,0 +1,230 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+# Suchraster für die nächste Farbe: 6 Bit pro Kanal (64³ Zellen)
+LUT_BITS = 6
+# Mehr verschiedene Farben werden vor dem k-means auf 5 Bit/Kanal gebündelt
+MAX_DISTINCT_COLORS = 32768
+# Zeilen je Block bei der exakten Suche der nächsten Farbe
+NEAREST_CHUNK = 65536
+
+
+def _opaque_pixels(image):
+    """(N, 3) uint8 array of the pixels of a PIL image that are not transparent."""
+    if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+        rgba = np.asarray(image.convert("RGBA")).reshape(-1, 4)
+        return rgba[rgba[:, 3] > 0, :3]
+    return np.asarray(image.convert("RGB")).reshape(-1, 3)
+
+
+def _pack(pixels):
+    """(N, 3) uint8 pixels as uint32 ``r << 16 | g << 8 | b``."""
+    return (
+        pixels[:, 0].astype(np.uint32) << 16
+        | pixels[:, 1].astype(np.uint32) << 8
+        | pixels[:, 2]
+    )
+
+
+def _unpack(keys):
+    return np.stack([keys >> 16, (keys >> 8) & 255, keys & 255], axis=1)
+
+
+def _distinct_colors(pixels):
+    """Distinct colours and their pixel counts (float32, float64)."""
+    keys, counts = np.unique(_pack(pixels), return_counts=True)
+    if keys.size > MAX_DISTINCT_COLORS:
+        # Photos: weighted mean colour per 5-bit cell instead of every value
+        colors = _unpack(keys)
+        cells = (colors >> 3).astype(np.int64)
+        cell = cells[:, 0] << 10 | cells[:, 1] << 5 | cells[:, 2]
+        _, inverse = np.unique(cell, return_inverse=True)
+        weights = np.bincount(inverse, weights=counts)
+        sums = np.stack(
+            [np.bincount(inverse, weights=colors[:, c] * counts) for c in range(3)],
+            axis=1,
+        )
+        return (sums / weights[:, None]).astype(np.float32), weights
+    colors = _unpack(keys)
+    return colors.astype(np.float32), counts.astype(np.float64)
+
+
+def _sq_distances(points, centers):
+    """(N, K) squared distances via |p|² - 2 p·c + |c|² (one matmul)."""
+    return (
+        (points * points).sum(axis=1)[:, None]
+        - 2.0 * points @ centers.T
+        + (centers * centers).sum(axis=1)[None, :]
+    )
+
+
+def _nearest(points, centers):
+    """Index of the nearest centre per point, in blocks of NEAREST_CHUNK rows."""
+    result = np.empty(len(points), dtype=np.intp)
+    for start in range(0, len(points), NEAREST_CHUNK):
+        block = points[start : start + NEAREST_CHUNK]
+        result[start : start + NEAREST_CHUNK] = _sq_distances(block, centers).argmin(
+            axis=1
+        )
+    return result
+
+
+def extract_palette(images, n_colors=32, iterations=30, seed=0):
+    """
+    Palette of the given images by weighted k-means over their distinct colours.
+
+    Args:
+        images: PIL images (e.g. the reference set); transparent pixels are ignored
+        n_colors: palette size (at most 256)
+        iterations: max. k-means iterations
+        seed: seed of the k-means++ initialisation (deterministic palettes)
+
+    Returns:
+        np.ndarray: uint8 (K, 3), most frequent colour first. Images with at
+        most ``n_colors`` distinct colours return exactly those colours.
+    """
+    if not 1 <= n_colors <= 256:
+        raise ValueError("Die Palette muss 1 bis 256 Farben haben.")
+    pixels = np.concatenate([_opaque_pixels(image) for image in images])
+    if pixels.size == 0:
+        raise ValueError("Keine deckenden Pixel für die Palette.")
+    colors, weights = _distinct_colors(pixels)
+
+    if len(colors) <= n_colors:
+        order = np.argsort(-weights, kind="stable")
+        return np.rint(colors[order]).astype(np.uint8)
+
+    # Greedy k-means++: je Schritt mehrere Kandidaten gewichtet nach Abstand
+    # ziehen und den nehmen, der die Gesamtabweichung am stärksten senkt.
+    rng = np.random.default_rng(seed)
+    candidates_per_step = 2 + int(np.log(n_colors))
+    centers = np.empty((n_colors, 3), dtype=np.float32)
+    centers[0] = colors[np.argmax(weights)]
+    nearest = np.maximum(_sq_distances(colors, centers[:1])[:, 0], 0)
+    for k in range(1, n_colors):
+        p = weights * nearest
+        picks = rng.choice(len(colors), size=candidates_per_step, p=p / p.sum())
+        trial = np.minimum(nearest[:, None], _sq_distances(colors, colors[picks]))
+        best = np.argmin(weights @ np.maximum(trial, 0))
+        centers[k] = colors[picks[best]]
+        nearest = np.maximum(trial[:, best], 0)
+
+    labels = None
+    for _ in range(iterations):
+        new_labels = _sq_distances(colors, centers).argmin(axis=1)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        totals = np.bincount(labels, weights=weights, minlength=n_colors)
+        for c in range(3):
+            sums = np.bincount(
+                labels, weights=colors[:, c] * weights, minlength=n_colors
+            )
+            np.divide(sums, totals, out=centers[:, c], where=totals > 0)
+
+    totals = np.bincount(labels, weights=weights, minlength=n_colors)
+    order = np.argsort(-totals, kind="stable")
+    return np.rint(centers[order]).clip(0, 255).astype(np.uint8)
+
+
+class Palette:
+    """
+    Fixed colour palette with a precomputed 3D lookup table over all 256³
+    RGB values (16 MiB).
+
+    The table is laid out so that the little-endian uint32 of an RGBX pixel,
+    masked to 24 bits, is its flat index: mapping an image onto the palette is
+    one fancy-indexing operation. Nearest colours are searched at the centres
+    of a ``lut_bits``-per-channel grid and expanded to the full table.
+    """
+
+    def __init__(self, colors, lut_bits=LUT_BITS):
+        self.colors = np.asarray(colors, dtype=np.uint8).reshape(-1, 3)
+        if not 1 <= len(self.colors) <= 256:
+            raise ValueError("Die Palette muss 1 bis 256 Farben haben.")
+        self.lut_bits = lut_bits
+        self.lut = self._build_lut()
+
+    @classmethod
+    def from_images(cls, images, n_colors=32, lut_bits=LUT_BITS, **kwargs):
+        """Palette extracted from ``images`` (see extract_palette)."""
+        return cls(extract_palette(images, n_colors, **kwargs), lut_bits)
+
+    def _build_lut(self):
+        cell = 1 << (8 - self.lut_bits)
+        centers = (
+            np.arange(1 << self.lut_bits, dtype=np.float32) * cell + (cell - 1) / 2
+        )
+        # Achsenreihenfolge b, g, r: Index = b << 16 | g << 8 | r (RGBX little endian)
+        b, g, r = np.meshgrid(centers, centers, centers, indexing="ij")
+        grid = np.stack([r.ravel(), g.ravel(), b.ravel()], axis=1)
+        nearest = _sq_distances(grid, self.colors.astype(np.float32)).argmin(axis=1)
+        coarse = nearest.astype(np.uint8).reshape((1 << self.lut_bits,) * 3)
+        for axis in range(3):
+            coarse = np.repeat(coarse, cell, axis=axis)
+        return coarse.ravel()
+
+    @property
+    def nbytes(self):
+        return self.lut.nbytes
+
+    def indices(self, image):
+        """
+        Palette index per pixel (uint8 (H, W)) of a PIL image, an (H, W, 3)
+        RGB or an (H, W, 4) RGBA array (alpha is ignored).
+        """
+        if isinstance(image, np.ndarray) and image.shape[-1] == 4:
+            rgba = image
+        else:
+            if isinstance(image, np.ndarray):
+                image = Image.fromarray(image, "RGB")
+            # RGBA hat dasselbe Speicherlayout wie RGBX: ohne Konvertierung
+            rgba = np.asarray(image if image.mode == "RGBA" else image.convert("RGBX"))
+        packed = np.ascontiguousarray(rgba).view("<u4")[..., 0]
+        return self.lut[packed & 0xFFFFFF]
+
+    def quantize(self, image):
+        """
+        Map a PIL image (or encoded image bytes) onto the palette.
+
+        Returns:
+            PIL Image: mode "P" with this palette; images with transparency
+            come back as "RGBA" with their alpha channel unchanged.
+        """
+        if isinstance(image, (bytes, bytearray)):
+            image = Image.open(io.BytesIO(image))
+        indexed = Image.fromarray(self.indices(image), "P")
+        indexed.putpalette(self.colors.tobytes())
+        if not (image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info):
+            return indexed
+        result = indexed.convert("RGBA")
+        result.putalpha(image.convert("RGBA").getchannel("A"))
+        return result
+
+    def quantize_png_bytes(self, image):
+        """quantize + PNG encoding."""
+        buf = io.BytesIO()
+        self.quantize(image).save(buf, format="PNG")
+        return buf.getvalue()
+
+
+def denoise(image, n_colors=64):
+    """
+    Reduce a photo to its own ``n_colors`` dominant colours before upload:
+    removes sensor noise and JPEG artefacts, keeps edges sharp, and shrinks
+    the PNG. Returns an RGB (or RGBA) image.
+
+    The palette is used once, so instead of building a ``Palette`` lookup
+    table each distinct colour of the photo is matched to its exact nearest
+    palette colour.
+    """
+    colors = extract_palette([image], n_colors=n_colors)
+    rgb = np.asarray(image.convert("RGB"))
+    keys, inverse = np.unique(_pack(rgb.reshape(-1, 3)), return_inverse=True)
+    nearest = _nearest(_unpack(keys).astype(np.float32), colors.astype(np.float32))
+    result = Image.fromarray(colors[nearest[inverse.ravel()]].reshape(rgb.shape), "RGB")
+    if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+        result.putalpha(image.convert("RGBA").getchannel("A"))
+    return result
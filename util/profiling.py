@@ -0,0 +1,218 @@
+"""
+On-demand profiling of single requests.
+
+PIXELIZER_PROFILE=1 profiles every request. With PIXELIZER_PROFILE=header
+only requests sending ``X-Pixelizer-Profile: 1`` are profiled; without that
+setting the header is ignored, so clients cannot switch on tracing (and its
+overhead) in production. A profiled request produces, in PROFILE_DIR:
+
+- ``<id>.folded``: sampled CPU stacks in collapsed format
+  (``frame;frame;frame count``), accepted by flamegraph.pl, inferno and
+  speedscope;
+- ``<id>.json``: input tags (file size, dimensions, mode, ...), stage
+  timings and an allocation summary (tracemalloc top lines and peak).
+
+tracemalloc cannot attribute allocations to threads, so the allocation
+summary is process-wide: it includes whatever other requests allocated at
+the same time. ``allocations.overlapped`` says whether another profiled
+request ran concurrently; the peak is only reset when a profile starts
+alone, so an overlapping profile reports the peak since the earliest one.
+
+When profiling is off, handlers get ``NULL_PROFILER`` whose methods do
+nothing, so no sampler thread, tracing or timing is involved.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+PROFILE_HEADER = "x-pixelizer-profile"
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", "profiles"))
+SAMPLE_INTERVAL_S = 0.002
+TOP_ALLOCATIONS = 25
+
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+# Zählt gestartete Profile, um Überschneidungen zu erkennen
+_profile_starts = 0
+
+
+def profiling_requested(headers=None):
+    """True if the environment asks for a profile (for these headers)."""
+    mode = os.environ.get("PIXELIZER_PROFILE")
+    if mode == "1":
+        return True
+    if mode != "header" or headers is None:
+        return False
+    return str(headers.get(PROFILE_HEADER, "")).lower() in ("1", "true", "yes")
+
+
+def start_request_profile(headers=None, name="process_image"):
+    """RequestProfiler if requested, otherwise the shared no-op NULL_PROFILER."""
+    if not profiling_requested(headers):
+        return NULL_PROFILER
+    return RequestProfiler(name).start()
+
+
+class _NullProfiler:
+    enabled = False
+    _null = nullcontext()
+
+    def stage(self, name):
+        return self._null
+
+    def iterate(self, name, iterable):
+        return iterable
+
+    def tag(self, **tags):
+        pass
+
+    def finish(self):
+        return None
+
+
+NULL_PROFILER = _NullProfiler()
+
+
+class RequestProfiler:
+    """Statistical CPU profile + allocation summary for one request."""
+
+    enabled = True
+
+    def __init__(self, name, interval_s=SAMPLE_INTERVAL_S, out_dir=None):
+        self.name = name
+        self.interval_s = interval_s
+        self.out_dir = Path(out_dir or PROFILE_DIR)
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.tags = {}
+        self.stages = {}
+        self.samples = Counter()
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(
+            target=self._sample, name=f"profiler-{self.id}", daemon=True
+        )
+        self._started = None
+        self._start_count = None
+        self._overlapped = False
+
+    # --- lifecycle ---
+
+    def start(self):
+        global _tracemalloc_users, _profile_starts
+        with _tracemalloc_lock:
+            if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+            # Den Peak eines laufenden Profils nicht zurücksetzen
+            if _tracemalloc_users == 0:
+                tracemalloc.reset_peak()
+            else:
+                self._overlapped = True
+            _tracemalloc_users += 1
+            _profile_starts += 1
+            self._start_count = _profile_starts
+        self._started = time.perf_counter()
+        self._sampler.start()
+        return self
+
+    def finish(self):
+        """Stop sampling and write the dump. Returns the path of the .folded file."""
+        global _tracemalloc_users
+        total_s = time.perf_counter() - self._started
+        self._stop.set()
+        self._sampler.join()
+
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        with _tracemalloc_lock:
+            if _profile_starts != self._start_count or _tracemalloc_users > 1:
+                self._overlapped = True
+            _tracemalloc_users -= 1
+            if _tracemalloc_users == 0:
+                tracemalloc.stop()
+        top = snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        folded_path = self.out_dir / f"{self.id}.folded"
+        folded_path.write_text(
+            "".join(f"{stack} {count}\n" for stack, count in self.samples.items())
+        )
+        meta = {
+            "id": self.id,
+            "name": self.name,
+            "total_s": round(total_s, 6),
+            "tags": self.tags,
+            "stages_s": {k: round(v, 6) for k, v in self.stages.items()},
+            "sample_interval_s": self.interval_s,
+            "samples": sum(self.samples.values()),
+            "allocations": {
+                "scope": "process",
+                "overlapped": self._overlapped,
+                "peak_bytes": peak,
+                "top": [
+                    {
+                        "where": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                        "bytes": stat.size,
+                        "count": stat.count,
+                    }
+                    for stat in top
+                ],
+            },
+        }
+        (self.out_dir / f"{self.id}.json").write_text(json.dumps(meta, indent=2))
+        return folded_path
+
+    # --- instrumentation ---
+
+    def tag(self, **tags):
+        self.tags.update(tags)
+
+    @contextmanager
+    def stage(self, name):
+        """Time a stage and sample the thread running it."""
+        self._thread_id = threading.get_ident()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + (
+                time.perf_counter() - start
+            )
+
+    def iterate(self, name, iterable):
+        """
+        Time the production of each item as stage ``name``. Generators may be
+        resumed on different worker threads, so the sampled thread follows.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    # --- sampler ---
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None or self._thread_id == own:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
@@ -0,0 +1,388 @@
+"""
+Bulk export of generated characters into sprite-sheet atlases.
+
+Every result is cropped to its figure (``extract_sprite``) in a process
+pool, the sprites are packed into as few atlases as possible with a skyline
+bottom-left packer and each atlas is composed, indexed and PNG-encoded in
+the pool as well, with one shared palette. A JSON and a CSV index give each
+sprite's position and kind (see ``entry_kind``).
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from util.output_store import atomic_write
+from util.palette import Palette
+from util.sprite_export import entry_kind, extract_sprite
+
+logger = logging.getLogger(__name__)
+
+MAX_ATLAS_SIZE = 4096
+# Deckende Pixel je Sprite, aus denen die gemeinsame Palette bestimmt wird
+PALETTE_SAMPLE = 4096
+
+
+@dataclass
+class Placement:
+    """Position of one sprite in an atlas."""
+
+    name: str
+    source: str
+    atlas: int
+    x: int
+    y: int
+    w: int
+    h: int
+    kind: str = "character"
+
+
+class SkylinePacker:
+    """
+    Skyline bottom-left rectangle packer for one ``width`` x ``height`` bin.
+
+    The skyline is a list of ``[x, y, w]`` segments over the full width;
+    each rectangle goes where its top edge ends up lowest (leftmost on ties).
+    Fed with rectangles sorted by decreasing height, this wastes little space
+    at O(segments) per rectangle.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.skyline = [[0, 0, width]]
+
+    def _fit(self, index, w, h):
+        """y at which a w x h rectangle fits starting at segment ``index``, or None."""
+        x = self.skyline[index][0]
+        if x + w > self.width:
+            return None
+        y = 0
+        remaining = w
+        i = index
+        while remaining > 0:
+            seg_x, seg_y, seg_w = self.skyline[i]
+            y = max(y, seg_y)
+            if y + h > self.height:
+                return None
+            remaining -= seg_w - (x - seg_x if i == index else 0)
+            i += 1
+        return y
+
+    def insert(self, w, h):
+        """Place a rectangle; returns ``(x, y)`` or None if it does not fit."""
+        best = None
+        for i in range(len(self.skyline)):
+            y = self._fit(i, w, h)
+            if y is not None and (
+                best is None or (y + h, self.skyline[i][0]) < best[0]
+            ):
+                best = ((y + h, self.skyline[i][0]), i, y)
+        if best is None:
+            return None
+        _, index, y = best
+        x = self.skyline[index][0]
+        self._raise(index, x, y + h, w)
+        return x, y
+
+    def _raise(self, index, x, top, w):
+        self.skyline.insert(index, [x, top, w])
+        # Von der neuen Kante überdeckte Segmente kürzen oder entfernen
+        i = index + 1
+        while i < len(self.skyline):
+            seg = self.skyline[i]
+            overlap = x + w - seg[0]
+            if overlap <= 0:
+                break
+            if overlap < seg[2]:
+                seg[0] += overlap
+                seg[2] -= overlap
+                break
+            del self.skyline[i]
+        # Gleich hohe Nachbarn zusammenfassen
+        i = 0
+        while i < len(self.skyline) - 1:
+            if self.skyline[i][1] == self.skyline[i + 1][1]:
+                self.skyline[i][2] += self.skyline.pop(i + 1)[2]
+            else:
+                i += 1
+
+
+def pack(sizes, max_width=MAX_ATLAS_SIZE, max_height=MAX_ATLAS_SIZE, padding=2):
+    """
+    Distribute rectangles over as few atlases as needed.
+
+    Args:
+        sizes: ``(w, h)`` per rectangle
+        max_width, max_height: size limit of one atlas
+        padding: empty pixels between neighbouring rectangles
+
+    Returns:
+        list: ``(atlas, x, y)`` per rectangle, in input order
+    """
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    packers = []
+    result = [None] * len(sizes)
+    for i in order:
+        w, h = sizes[i][0] + padding, sizes[i][1] + padding
+        if w > max_width + padding or h > max_height + padding:
+            raise ValueError(
+                f"Sprite {sizes[i][0]}x{sizes[i][1]} ist größer als der Atlas "
+                f"({max_width}x{max_height})."
+            )
+        for atlas, packer in enumerate(packers):
+            pos = packer.insert(w, h)
+            if pos is not None:
+                break
+        else:
+            # Padding nur zwischen Sprites, nicht am rechten/unteren Rand
+            packers.append(SkylinePacker(max_width + padding, max_height + padding))
+            atlas = len(packers) - 1
+            pos = packers[atlas].insert(w, h)
+        result[i] = (atlas, *pos)
+    return result
+
+
+def _pool_map(fn, items, processes=None):
+    """
+    ``fn`` over ``items`` in input order, ``processes`` at a time (default:
+    CPU count; 1 = in this process). Yields the results.
+    """
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(items) < 2:
+        yield from map(fn, items)
+        return
+    workers = min(processes, len(items))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunksize = max(1, len(items) // (4 * workers))
+        yield from executor.map(fn, items, chunksize=chunksize)
+
+
+def _load_sprite(path, kinds=None):
+    """
+    Process-pool worker: cropped RGBA sprite of one result file plus a sample
+    of its opaque pixels for the palette. Returns ``(path, kind, sprite,
+    sample, error)``; sprite is None for kinds not in ``kinds``.
+    """
+    try:
+        with Image.open(path) as image:
+            image.load()
+        kind = entry_kind(image)
+        if kinds is not None and kind not in kinds:
+            return path, kind, None, None, None
+        if kind == "sprite":
+            # Bereits freigestellt (z. B. Sprite-Export): nur zuschneiden
+            bbox = image.getchannel("A").getbbox()
+            if bbox is None:
+                raise ValueError("Kein Motiv im Bild gefunden.")
+            sprite = image.crop(bbox).convert("RGBA")
+        else:
+            sprite = extract_sprite(image)
+    except (OSError, ValueError) as e:
+        return path, None, None, None, str(e)
+    rgba = np.asarray(sprite).reshape(-1, 4)
+    opaque = np.flatnonzero(rgba[:, 3])
+    step = max(1, len(opaque) // PALETTE_SAMPLE)
+    return path, kind, sprite, rgba[opaque[::step], :3], None
+
+
+def load_sprites(paths, processes=None, kinds=None):
+    """
+    Crop all result files to their figures, ``processes`` at a time
+    (default: CPU count; 1 = in this process).
+
+    Args:
+        kinds: entry kinds to load (e.g. ``{"character"}``); None loads all
+
+    Returns:
+        tuple: ``[(path, kind, sprite, sample)]`` in input order,
+        ``[(path, error)]``, ``[(path, kind)]`` of the excluded kinds
+    """
+    paths = [str(p) for p in paths]
+    worker = _load_sprite if kinds is None else partial(_load_sprite, kinds=kinds)
+    loaded, failed, excluded = [], [], []
+    for path, kind, sprite, sample, error in _pool_map(worker, paths, processes):
+        if error is not None:
+            logger.warning("%s übersprungen: %s", path, error)
+            failed.append((path, error))
+        elif sprite is None:
+            excluded.append((path, kind))
+        else:
+            loaded.append((path, kind, sprite, sample))
+    return loaded, failed, excluded
+
+
+def render_indexed(canvas, palette):
+    """
+    RGBA atlas (PIL image or (H, W, 4) array) as mode "P": index 0 is
+    transparent, 1..n the palette colours.
+    """
+    rgba = np.asarray(canvas)
+    indices = palette.indices(rgba)
+    indices += 1
+    indices[rgba[..., 3] == 0] = 0
+    atlas = Image.fromarray(indices, "P")
+    atlas.putpalette(b"\x00\x00\x00" + palette.colors.tobytes())
+    atlas.info["transparency"] = 0
+    return atlas
+
+
+def _render_atlas(task):
+    """Process-pool worker: compose one atlas, index it and encode it as PNG."""
+    (width, height), placed, palette = task
+    # In NumPy zusammensetzen: das Array geht ohne Kopie an die Palette
+    canvas = np.zeros((height, width, 4), dtype=np.uint8)
+    for image, x, y in placed:
+        canvas[y : y + image.height, x : x + image.width] = np.asarray(image)
+    if palette is not None:
+        atlas = render_indexed(canvas, palette)
+    else:
+        atlas = Image.fromarray(canvas, "RGBA")
+    buf = io.BytesIO()
+    atlas.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def build_atlases(
+    sprites,
+    max_size=MAX_ATLAS_SIZE,
+    padding=2,
+    palette=None,
+    processes=None,
+):
+    """
+    Pack sprites into atlases and encode them, one atlas per pool task.
+
+    Args:
+        sprites: ``(name, image)`` pairs, images RGBA and already cropped
+        max_size: maximal atlas width and height
+        padding: empty pixels between sprites
+        palette: ``Palette`` for indexed atlases (at most 255 colours, index 0
+            is transparent); None keeps the atlases RGBA
+        processes: worker processes (default: CPU count; 1 = in this process)
+
+    Returns:
+        tuple: PNG bytes per atlas, ``(width, height)`` per atlas, list of
+        ``(name, atlas, x, y, w, h)``
+    """
+    sizes = [image.size for _, image in sprites]
+    positions = pack(sizes, max_size, max_size, padding)
+    count = max((atlas for atlas, _, _ in positions), default=-1) + 1
+    extents = [[0, 0] for _ in range(count)]
+    placed = [[] for _ in range(count)]
+    entries = []
+    for (name, image), (atlas, x, y) in zip(sprites, positions):
+        extents[atlas][0] = max(extents[atlas][0], x + image.width)
+        extents[atlas][1] = max(extents[atlas][1], y + image.height)
+        placed[atlas].append((image, x, y))
+        entries.append((name, atlas, x, y, image.width, image.height))
+
+    extents = [tuple(size) for size in extents]
+    tasks = [(size, items, palette) for size, items in zip(extents, placed)]
+    return list(_pool_map(_render_atlas, tasks, processes)), extents, entries
+
+
+def _sprite_name(path, root):
+    path = Path(path)
+    try:
+        relative = path.relative_to(root) if root else path
+    except ValueError:
+        relative = path
+    return relative.with_suffix("").as_posix()
+
+
+def export_atlases(
+    paths,
+    out_dir,
+    prefix="atlas",
+    max_size=MAX_ATLAS_SIZE,
+    padding=2,
+    n_colors=255,
+    processes=None,
+    root=None,
+    kinds=None,
+):
+    """
+    Export result files as sprite-sheet atlases.
+
+    Args:
+        paths: result images (raw Pixelizer output or already keyed sprites)
+        out_dir: target directory for ``<prefix>_<n>.png``, ``<prefix>.json``
+            and ``<prefix>.csv``
+        prefix: file name prefix
+        max_size: maximal atlas width and height
+        padding: empty pixels between sprites
+        n_colors: size of the shared palette (1..255); 0 writes RGBA atlases
+        processes: worker processes for cropping and encoding (default: CPU
+            count)
+        root: sprite names are paths relative to this directory
+        kinds: entry kinds to export (see ``entry_kind``), e.g.
+            ``{"character"}`` to leave out the keyed copies and group
+            lineups of an output store; None exports everything
+
+    Returns:
+        dict: the JSON index (atlases with their sprites, skipped files,
+        number of excluded files per kind)
+    """
+    if not 0 <= n_colors <= 255:
+        raise ValueError("Die Atlas-Palette kann höchstens 255 Farben haben.")
+    loaded, failed, excluded = load_sprites(paths, processes, kinds)
+    palette = None
+    if n_colors and loaded:
+        samples = np.concatenate([sample for _, _, _, sample in loaded])
+        palette = Palette.from_images(
+            [Image.fromarray(samples[None], "RGB")], n_colors=n_colors
+        )
+
+    sprites = [(_sprite_name(path, root), sprite) for path, _, sprite, _ in loaded]
+    atlases, extents, entries = build_atlases(
+        sprites, max_size, padding, palette, processes
+    )
+
+    out_dir = Path(out_dir)
+    files = []
+    for i, data in enumerate(atlases):
+        files.append(f"{prefix}_{i}.png")
+        atomic_write(out_dir / files[-1], data)
+
+    placements = [
+        Placement(name, path, atlas, x, y, w, h, kind)
+        for (path, kind, _, _), (name, atlas, x, y, w, h) in zip(loaded, entries)
+    ]
+    excluded_kinds = {}
+    for _, kind in excluded:
+        excluded_kinds[kind] = excluded_kinds.get(kind, 0) + 1
+    index = {
+        "atlases": [
+            {
+                "file": file,
+                "width": width,
+                "height": height,
+                "sprites": [asdict(p) for p in placements if p.atlas == i],
+            }
+            for i, (file, (width, height)) in enumerate(zip(files, extents))
+        ],
+        "skipped": [{"source": str(path), "error": error} for path, error in failed],
+        "excluded": excluded_kinds,
+    }
+    atomic_write(
+        out_dir / f"{prefix}.json",
+        json.dumps(index, indent=2, ensure_ascii=False).encode("utf-8"),
+    )
+
+    csv_buf = io.StringIO()
+    writer = csv.writer(csv_buf, lineterminator="\n")
+    writer.writerow(["name", "file", "x", "y", "w", "h", "source", "kind"])
+    for p in placements:
+        writer.writerow([p.name, files[p.atlas], p.x, p.y, p.w, p.h, p.source, p.kind])
+    atomic_write(out_dir / f"{prefix}.csv", csv_buf.getvalue().encode("utf-8"))
+    return index
@@ -0,0 +1,180 @@
+import io
+import itertools
+
+import numpy as np
+from PIL import Image, ImageChops, PngImagePlugin
+
+# Hintergrundfarbe laut Prompt (#d3d3d3)
+BACKGROUND_RGB = (211, 211, 211)
+# PNG-Textfeld mit der Art abgeleiteter Store-Einträge ("sprite", "lineup")
+KIND_KEY = "pixelizer-kind"
+
+
+def background_mask(rgb, background=None, tolerance=24):
+    """
+    Boolean mask of background pixels that are connected to the image border.
+
+    Args:
+        rgb: uint8 array of shape (H, W, 3)
+        background: RGB key colour; None estimates it from the border pixels,
+            since model outputs drift away from the exact #d3d3d3.
+        tolerance: max. per-channel distance to the key colour
+
+    Returns:
+        np.ndarray: bool array (H, W), True = background
+    """
+    if background is None:
+        background = estimate_background(rgb)
+    return _edge_connected(_key_candidates(rgb, background, tolerance))
+
+
+def _key_candidates(rgb, background, tolerance):
+    """Pixels within ``tolerance`` of the key colour in every channel."""
+    # Image.point mit einer 0/1-Tabelle je Kanal ist deutlich schneller als
+    # Lookups je Kanal in NumPy; das Minimum der Kanäle ist ihr UND.
+    table = []
+    for key in background:
+        table += [int(abs(level - int(key)) <= tolerance) for level in range(256)]
+    r, g, b = Image.fromarray(rgb, "RGB").point(table).split()
+    within = ImageChops.darker(ImageChops.darker(r, g), b)
+    return np.asarray(within).view(bool)
+
+
+def estimate_background(rgb):
+    """Median colour of the outermost pixel ring."""
+    border = np.concatenate([rgb[0], rgb[-1], rgb[1:-1, 0], rgb[1:-1, -1]])
+    return tuple(int(c) for c in np.median(border, axis=0))
+
+
+def _edge_connected(candidate):
+    """
+    Keep only candidate pixels 4-connected to the border.
+
+    Instead of a per-pixel flood fill, reachability is spread along whole
+    horizontal and vertical runs of candidates with array operations,
+    alternating directions until a pass adds nothing. The number of passes is
+    bounded by the number of turns a background path needs, not its length.
+    """
+    reached = np.zeros_like(candidate)
+    reached[0, :] = candidate[0, :]
+    reached[-1, :] = candidate[-1, :]
+    reached[:, 0] = candidate[:, 0]
+    reached[:, -1] = candidate[:, -1]
+    # Run labels for both orientations, each on a C-contiguous array
+    row_runs = _run_labels(candidate)
+    col_runs = _run_labels(np.ascontiguousarray(candidate.T))
+    count = int(np.count_nonzero(reached))
+    for step in itertools.count():
+        if step % 2:
+            reached = _spread(col_runs, np.ascontiguousarray(reached.T)).T
+        else:
+            reached = _spread(row_runs, reached)
+        new_count = int(np.count_nonzero(reached))
+        # Closed under the previous direction and this one added nothing: done
+        if step and new_count == count:
+            return reached
+        count = new_count
+
+
+def _run_labels(candidate):
+    """
+    Label horizontal candidate runs 1..n (0 = not a candidate).
+
+    Returns the labels and the flat index where each run starts.
+    """
+    previous = np.zeros_like(candidate)
+    previous[:, 1:] = candidate[:, :-1]
+    starts = (candidate & ~previous).ravel()
+    labels = np.cumsum(starts, dtype=np.int32).reshape(candidate.shape)
+    labels *= candidate
+    return labels, np.flatnonzero(starts)
+
+
+def _spread(runs, reached):
+    """Mark every run that contains a reached pixel."""
+    labels, starts = runs
+    hit = np.zeros(starts.size + 1, dtype=bool)
+    if starts.size:
+        # Segment i spans run i plus the non-candidates up to the next run;
+        # those are never reached, so OR over the segment == run is reached.
+        hit[1:] = np.logical_or.reduceat(reached.ravel(), starts)
+    return hit.take(labels)
+
+
+def extract_sprite(image, background=None, tolerance=24, crop=True, padding=0):
+    """
+    Key out the background of a generated character.
+
+    Args:
+        image: PIL Image or encoded image bytes (output of Pixelizer.pixelize)
+        background: RGB key colour, None = estimate from the border
+        tolerance: max. per-channel distance to the key colour
+        crop: crop to the bounding box of the figure
+        padding: transparent pixels kept around the bounding box
+
+    Returns:
+        PIL Image (RGBA): figure opaque, background fully transparent
+    """
+    if isinstance(image, (bytes, bytearray)):
+        image = Image.open(io.BytesIO(image))
+    rgb = np.asarray(image.convert("RGB"))
+    if background is None:
+        background = estimate_background(rgb)
+    candidate = _key_candidates(rgb, background, tolerance)
+
+    if crop:
+        # Alles außerhalb der Bounding Box der Nicht-Kandidaten ist mit dem
+        # Rand verbundener Hintergrund: die Randverbindung genügt für den
+        # Ausschnitt plus einem Ring Hintergrund, statt für das ganze Bild.
+        rows = np.flatnonzero(~candidate.all(axis=1))
+        cols = np.flatnonzero(~candidate.all(axis=0))
+        if rows.size == 0:
+            raise ValueError("Kein Motiv vor dem Hintergrund gefunden.")
+        height, width = candidate.shape
+        margin = max(padding, 1)
+        top, left = max(rows[0] - margin, 0), max(cols[0] - margin, 0)
+        bottom = min(rows[-1] + 1 + margin, height)
+        right = min(cols[-1] + 1 + margin, width)
+        mask = _edge_connected(candidate[top:bottom, left:right])
+        # Ausgabe: Bounding Box plus padding, ohne den zusätzlichen Ring
+        y0, x0 = max(rows[0] - padding, 0) - top, max(cols[0] - padding, 0) - left
+        y1 = min(rows[-1] + 1 + padding, height) - top
+        x1 = min(cols[-1] + 1 + padding, width) - left
+        rgb = rgb[top:bottom, left:right][y0:y1, x0:x1]
+        mask = mask[y0:y1, x0:x1]
+    else:
+        mask = _edge_connected(candidate)
+
+    # Transparente Pixel einheitlich schwarz: exakte Transparenz, kleinere PNGs
+    sprite = Image.new("RGBA", (rgb.shape[1], rgb.shape[0]), (0, 0, 0, 0))
+    sprite.paste(Image.fromarray(rgb, "RGB"), (0, 0), Image.fromarray(~mask))
+    return sprite
+
+
+def kind_pnginfo(kind):
+    """PNG text chunk that marks an encoded image as ``kind``."""
+    info = PngImagePlugin.PngInfo()
+    info.add_text(KIND_KEY, kind)
+    return info
+
+
+def entry_kind(image):
+    """
+    Kind of a stored image: its ``KIND_KEY`` tag, else "sprite" for images
+    with a transparent background and "character" for plain model output.
+    """
+    kind = image.info.get(KIND_KEY)
+    if kind:
+        return kind
+    if image.mode == "RGBA" and image.getextrema()[3][0] == 0:
+        return "sprite"
+    return "character"
+
+
+def sprite_png_bytes(image, **kwargs):
+    """extract_sprite + PNG encoding; kwargs go to extract_sprite."""
+    buf = io.BytesIO()
+    extract_sprite(image, **kwargs).save(
+        buf, format="PNG", optimize=True, pnginfo=kind_pnginfo("sprite")
+    )
+    return buf.getvalue()
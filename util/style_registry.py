@@ -0,0 +1,288 @@
+import io
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+from PIL import Image
+
+from util.palette import Palette
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STYLE = "standard"
+PROMPT_FILE = "prompt.txt"
+_REF_PATTERN = re.compile(r"ref(\d+)\.png$", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class StylePreset:
+    """
+    A named style: reference images plus a prompt template (``{ref_count}`` is
+    filled in per request). ``prompt_template=None`` falls back to the prompt
+    of the registry's default style.
+    """
+
+    name: str
+    ref_paths: tuple
+    prompt_template: str = None
+    # (path, mtime_ns, size) of every file the preset was built from
+    signature: tuple = ()
+
+
+@dataclass
+class PreparedStyle:
+    """Decoded references and prompt for one (style, ref_count), ready to composite."""
+
+    name: str
+    ref_count: int
+    prompt: str
+    refs: list
+    nbytes: int
+
+    def composite(self, target_image):
+        """
+        Target + references side by side, vertically centered, as PNG BytesIO.
+        Same layout as ``concatenate_images([target] + refs)``, but the
+        references are already decoded, resized and converted to RGB.
+        """
+        images = [Image.open(target_image).convert("RGB")] + self.refs
+        width = sum(img.width for img in images)
+        height = max(img.height for img in images)
+        canvas = Image.new("RGB", (width, height), (255, 255, 255))
+        x_offset = 0
+        for img in images:
+            canvas.paste(img, (x_offset, (height - img.height) // 2))
+            x_offset += img.width
+
+        buf = io.BytesIO()
+        canvas.save(buf, format="PNG")
+        buf.seek(0)
+        buf.name = "input.png"
+        buf.content_type = "image/png"
+        return buf
+
+
+def _load_ref(path, max_width=400, max_height=765):
+    """Same pixels as ``load_and_resize``, without the PNG round trip."""
+    with Image.open(path) as img:
+        img = img.convert("RGBA")
+    img.thumbnail((max_width, max_height), Image.LANCZOS)
+    return img.convert("RGB")
+
+
+def _signature(paths):
+    sig = []
+    for path in paths:
+        try:
+            st = Path(path).stat()
+            sig.append((str(path), st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            sig.append((str(path), None, None))
+    return tuple(sig)
+
+
+def load_style_dir(path):
+    """
+    Preset from a directory ``<name>/`` with ``ref1.png``, ``ref2.png``, ...
+    and an optional ``prompt.txt``. Returns None if it has no references.
+    """
+    path = Path(path)
+    refs = sorted(
+        (p for p in path.iterdir() if _REF_PATTERN.match(p.name)),
+        key=lambda p: int(_REF_PATTERN.match(p.name).group(1)),
+    )
+    if not refs:
+        return None
+    prompt_path = path / PROMPT_FILE
+    prompt = prompt_path.read_text(encoding="utf-8") if prompt_path.exists() else None
+    watched = refs + [prompt_path]
+    return StylePreset(path.name, tuple(map(str, refs)), prompt, _signature(watched))
+
+
+class StyleRegistry:
+    """
+    Named style presets, selectable per request.
+
+    Presets come from subdirectories of ``root`` (see ``load_style_dir``) or
+    from ``register``. Their files are polled for changes at most every
+    ``poll_s`` seconds on access, so styles can be added, edited or removed
+    while the app is running.
+
+    Decoded references per (style, ref_count) and style palettes are kept in
+    an LRU cache bounded by ``max_bytes`` (decoded RGB size, lookup tables);
+    the most recently used entry is kept even if it alone exceeds the budget.
+    """
+
+    def __init__(
+        self, root="styles", default=DEFAULT_STYLE, max_bytes=256 * 1024**2, poll_s=2.0
+    ):
+        self.root = Path(root) if root else None
+        self.default = default
+        self.max_bytes = max_bytes
+        self.poll_s = poll_s
+        self._lock = threading.RLock()
+        self._registered = {}
+        self._presets = {}
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self._last_poll = None
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    # --- presets ---
+
+    def register(self, name, ref_paths, prompt_template=None, replace=True):
+        """Add a preset from explicit files (watched like directory presets)."""
+        with self._lock:
+            if not replace and name in self._registered:
+                return
+            ref_paths = tuple(map(str, ref_paths))
+            self._registered[name] = StylePreset(
+                name, ref_paths, prompt_template, _signature(ref_paths)
+            )
+            self._last_poll = None
+
+    def names(self):
+        self._maybe_refresh()
+        with self._lock:
+            return sorted(self._presets)
+
+    def __contains__(self, name):
+        self._maybe_refresh()
+        with self._lock:
+            return name in self._presets
+
+    def preset(self, name):
+        self._maybe_refresh()
+        with self._lock:
+            try:
+                return self._presets[name]
+            except KeyError:
+                raise KeyError(f"Unbekannter Stil: {name}") from None
+
+    def refresh(self):
+        """Re-read all presets; cached data of changed or removed styles is dropped."""
+        presets = {}
+        for name, preset in list(self._registered.items()):
+            presets[name] = StylePreset(
+                name,
+                preset.ref_paths,
+                preset.prompt_template,
+                _signature(preset.ref_paths),
+            )
+        if self.root is not None and self.root.is_dir():
+            for path in sorted(p for p in self.root.iterdir() if p.is_dir()):
+                try:
+                    preset = load_style_dir(path)
+                except OSError as e:
+                    logger.warning("Stil %s nicht lesbar: %s", path, e)
+                    continue
+                if preset is not None:
+                    presets[preset.name] = preset
+
+        with self._lock:
+            changed = {
+                name
+                for name in set(self._presets) | set(presets)
+                if self._presets.get(name) != presets.get(name)
+            }
+            if self._presets and changed:
+                self.reloads += 1
+                logger.info("Stile neu geladen: %s", ", ".join(sorted(changed)))
+            for key in [k for k in self._cache if k[0] in changed]:
+                self._cache_bytes -= self._cache.pop(key).nbytes
+            self._presets = presets
+            self._last_poll = time.monotonic()
+
+    def _maybe_refresh(self):
+        last = self._last_poll
+        if last is None or time.monotonic() - last >= self.poll_s:
+            self.refresh()
+
+    # --- prepared references ---
+
+    def prepare(self, name=None, ref_count=None):
+        """
+        :param name: style name (default style if None).
+        :param ref_count: use only the first n references.
+        :return: PreparedStyle, from the cache if possible.
+        """
+        preset = self.preset(name or self.default)
+        count = len(preset.ref_paths)
+        if ref_count is not None:
+            count = max(1, min(ref_count, count))
+        key = (preset.name, count)
+        with self._lock:
+            prepared = self._cache.get(key)
+            if prepared is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return prepared
+            self.misses += 1
+
+        prepared = self._load(preset, count)
+        with self._lock:
+            if self._presets.get(preset.name) != preset:
+                return prepared  # Während des Ladens geändert – nicht cachen
+            self._store(key, prepared)
+        return prepared
+
+    def _store(self, key, entry):
+        """Insert into the LRU (lock held) and evict down to max_bytes."""
+        old = self._cache.pop(key, None)
+        if old is not None:
+            self._cache_bytes -= old.nbytes
+        self._cache[key] = entry
+        self._cache_bytes += entry.nbytes
+        while self._cache_bytes > self.max_bytes and len(self._cache) > 1:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_bytes -= evicted.nbytes
+
+    def palette(self, name=None, n_colors=32):
+        """
+        Palette extracted from all references of a style (see util.palette),
+        cached and invalidated together with the style's references.
+        """
+        prepared = self.prepare(name)
+        key = (prepared.name, f"palette-{n_colors}")
+        with self._lock:
+            palette = self._cache.get(key)
+            if palette is not None:
+                self._cache.move_to_end(key)
+                return palette
+        palette = Palette.from_images(prepared.refs, n_colors=n_colors)
+        with self._lock:
+            self._store(key, palette)
+        return palette
+
+    def _load(self, preset, count):
+        template = preset.prompt_template
+        if template is None:
+            default = self._presets.get(self.default)
+            template = default.prompt_template if default is not None else None
+        if template is None:
+            raise ValueError(f"Stil {preset.name} hat keinen Prompt.")
+        refs = [_load_ref(path) for path in preset.ref_paths[:count]]
+        return PreparedStyle(
+            name=preset.name,
+            ref_count=count,
+            prompt=template.format(ref_count=count),
+            refs=refs,
+            nbytes=sum(img.width * img.height * 3 for img in refs),
+        )
+
+    def stats(self):
+        with self._lock:
+            return {
+                "styles": len(self._presets),
+                "cached": len(self._cache),
+                "cache_bytes": self._cache_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+            }
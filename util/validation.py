@@ -0,0 +1,133 @@
+"""
+Validierung von Eingabebildern und generierten Frames, gemeinsam genutzt von
+der Gradio‑Oberfläche (pixelizer_ci.py) und der HTTP‑API (pixelizer_api.py).
+"""
+
+import io
+import os
+from pathlib import Path
+from typing import IO, Union
+
+from PIL import Image, UnidentifiedImageError
+
+ALLOWED_EXTS = {".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tiff"}
+MAX_INPUT_BYTES = 25 * 1024 * 1024  # 25 MB, optional
+MAX_OUTPUT_BYTES = 50 * 1024 * 1024  # 50 MB, optional
+
+
+def is_pathlike_image(path_str: str) -> bool:
+    if not path_str or not isinstance(path_str, str):
+        return False
+    ext = Path(path_str).suffix.lower()
+    return ext in ALLOWED_EXTS and Path(path_str).exists()
+
+
+def describe_input(path_str: str) -> dict:
+    """
+    Eckdaten einer Eingabedatei (nur Header wird gelesen), z. B. für Profile.
+    """
+    info = {"path_suffix": Path(str(path_str)).suffix.lower()}
+    try:
+        info["file_bytes"] = os.path.getsize(path_str)
+        with Image.open(path_str) as img:
+            info.update(
+                format=img.format,
+                mode=img.mode,
+                width=img.width,
+                height=img.height,
+                frames=getattr(img, "n_frames", 1),
+            )
+    except (OSError, UnidentifiedImageError, TypeError) as e:
+        info["error"] = str(e)
+    return info
+
+
+def check_input_size(size: int) -> None:
+    """
+    Raises ValueError, wenn eine Eingabe das Upload‑Limit überschreitet.
+    """
+    if size > MAX_INPUT_BYTES:
+        raise ValueError(
+            f"Die Datei ist zu groß ({size // (1024 * 1024)} MB). "
+            f"Maximal erlaubt sind {MAX_INPUT_BYTES // (1024 * 1024)} MB."
+        )
+
+
+def safe_open_image_as_rgba(source: Union[str, IO[bytes]]) -> Image.Image:
+    """
+    Öffnet Bild robust, verifiziert es und konvertiert nach RGBA.
+    Akzeptiert einen Pfad oder ein file‑like Objekt (z. B. HTTP‑Upload).
+    Raises Exception bei Problemen.
+    """
+    # Optional: Größe prüfen (nur bei lokalen Pfaden sinnvoll)
+    if isinstance(source, str):
+        try:
+            size = os.path.getsize(source) if os.path.isfile(source) else 0
+        except OSError:
+            # Bei Zugriffsfehlern nicht hart abbrechen – wir versuchen trotzdem zu öffnen.
+            size = 0
+        check_input_size(size)
+
+    try:
+        with Image.open(source) as img_probe:
+            # Korrupte Dateien früh erkennen
+            img_probe.verify()
+        # verify() schließt die Datei; neu öffnen zum eigentlichen Laden
+        if hasattr(source, "seek"):
+            source.seek(0)
+        img = Image.open(source).convert("RGBA")
+        return img
+    except UnidentifiedImageError:
+        raise ValueError("Die angegebene Datei ist kein gültiges Bild.")
+    except OSError:
+        raise ValueError("Das Bild konnte nicht gelesen werden (I/O-Fehler).")
+
+
+def safe_save_bytes_to_rgba_image(image_bytes: bytes) -> Image.Image:
+    """
+    Bytes -> PIL Image (RGBA) mit defensiver Prüfung.
+    """
+    try:
+        if image_bytes is None:
+            raise ValueError("Leerer Bild-Chunk vom Modell erhalten.")
+        if len(image_bytes) > MAX_OUTPUT_BYTES:
+            raise ValueError(
+                "Generiertes Bild ist unerwartet groß. Vorgang wird abgebrochen."
+            )
+        bio = io.BytesIO(image_bytes)
+        img = Image.open(bio).convert("RGBA")
+        return img
+    except UnidentifiedImageError:
+        raise ValueError("Ungültige Bilddaten vom Modell erhalten.")
+    except OSError:
+        raise ValueError("Fehler beim Dekodieren der generierten Bilddaten.")
+
+
+def validate_image_bytes(image_bytes: bytes) -> None:
+    """
+    Prüft generierte Bilddaten, ohne die Pixel zu dekodieren
+    (nur Header und Chunk‑Prüfsummen).
+    """
+    if not image_bytes:
+        raise ValueError("Leerer Bild-Chunk vom Modell erhalten.")
+    if len(image_bytes) > MAX_OUTPUT_BYTES:
+        raise ValueError(
+            "Generiertes Bild ist unerwartet groß. Vorgang wird abgebrochen."
+        )
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as probe:
+            probe.verify()
+    except UnidentifiedImageError:
+        raise ValueError("Ungültige Bilddaten vom Modell erhalten.")
+    except (OSError, SyntaxError):
+        raise ValueError("Fehler beim Dekodieren der generierten Bilddaten.")
+
+
+def prepare_resized_png_bytes(pil_img_rgba: Image.Image) -> io.BytesIO:
+    """
+    Speichert ein PIL‑Bild als PNG in BytesIO (z. B. für load_and_resize).
+    """
+    buf = io.BytesIO()
+    pil_img_rgba.save(buf, format="PNG")
+    buf.seek(0)
+    return buf